@@ -0,0 +1,115 @@
+"""
+接口请求基类：同步请求统一经过熔断器和进程级限流器
+"""
+
+import time
+from typing import Tuple
+import requests
+from breaker import breakers, CircuitOpenError
+from requests.adapters import BaseAdapter
+from urllib3.util.retry import Retry
+from metrics import (TimedHTTPAdapter, request_metrics, classify_exception, classify_status, reset_connect_time,
+                     take_connect_time)
+from ratelimit import Priority, RateLimiter, RequestCancelled, rate_limiter
+from config import Config
+
+
+def pool_adapter_kwargs() -> dict:
+    """连接池适配器参数：池大小、阻塞策略，以及只针对建立连接失败的重试"""
+    retries = Retry(
+        total=Config.POOL_CONNECT_RETRIES,
+        connect=Config.POOL_CONNECT_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        redirect=False,
+        backoff_factor=Config.POOL_RETRY_BACKOFF,
+        raise_on_status=False
+    )
+    return {
+        "pool_connections": Config.POOL_CONNECTIONS,
+        "pool_maxsize": Config.POOL_MAXSIZE,
+        "pool_block": Config.POOL_BLOCK,
+        "max_retries": retries
+    }
+
+
+def mount_adapter(session: requests.Session, adapter: BaseAdapter) -> BaseAdapter:
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return adapter
+
+
+def create_session() -> requests.Session:
+    """创建使用连接池配置并记录连接耗时的会话"""
+    session = requests.Session()
+    mount_adapter(session, TimedHTTPAdapter(**pool_adapter_kwargs()))
+    return session
+
+
+def request_timeout(endpoint: str) -> Tuple[float, float]:
+    """接口类别对应的 (连接超时, 读取超时)；选课热路径使用更短的超时"""
+    if endpoint in Config.HOT_PATH_ENDPOINTS:
+        return Config.HOT_CONNECT_TIMEOUT, Config.HOT_READ_TIMEOUT
+    return Config.CONNECT_TIMEOUT, Config.REQUEST_TIMEOUT
+
+
+class ApiManager:
+    """接口管理器基类"""
+    
+    def __init__(self, session: requests.Session, limiter: RateLimiter = None):
+        self.session = session
+        self.limiter = limiter or rate_limiter
+    
+    def _request(self, method: str, url: str, endpoint: str, priority: Priority = None, **kwargs) -> requests.Response:
+        """经过熔断器和限流器发送请求；endpoint为接口类别
+        
+        熔断中直接抛出 CircuitOpenError，不会发出请求；等待限流令牌时调用方已停止（见 RateLimiter.stopping）
+        则抛出 RequestCancelled。每次请求的连接、首字节和总耗时记入 request_metrics。
+        """
+        breaker = breakers.get(endpoint)
+        if Config.BREAKER_ENABLED:
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                request_metrics.record(endpoint, "circuit_open")
+                raise
+        
+        kwargs.setdefault("timeout", request_timeout(endpoint))
+        try:
+            if not self.limiter.acquire(endpoint, priority):
+                raise RequestCancelled("已停止，请求未发出")
+            reset_connect_time()
+            started = time.perf_counter()
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            breaker.record_failure()
+            request_metrics.record(endpoint, classify_exception(e), connect=take_connect_time())
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        
+        # elapsed 从发出请求算起，包含新建连接的耗时；回放的响应带的是录制时的耗时，不计首字节
+        connect = take_connect_time()
+        response.connect_time = connect  # 新建连接的耗时，复用连接时为None
+        ttfb = None
+        if getattr(response, "recorded_elapsed", None) is None:
+            ttfb = max(0.0, response.elapsed.total_seconds() - (connect or 0.0))
+        request_metrics.record(
+            endpoint,
+            classify_status(response.status_code),
+            total=time.perf_counter() - started,
+            ttfb=ttfb,
+            connect=connect,
+            status_code=response.status_code
+        )
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+    
+    def ping(self, priority: Priority = Priority.LOW) -> requests.Response:
+        """向时钟同步地址发送一次轻量请求（用于保持连接），响应的connect_time表示是否新建了连接"""
+        return self._request("GET", Config.CLOCK_SYNC_URL, "clock", priority)
@@ -0,0 +1,693 @@
+"""
+异步客户端：在一个事件循环中驱动多门课程的选课、心跳和时钟采样
+
+传输层基于 asyncio 流实现 HTTP/1.1 keep-alive 连接池，每个请求都有独立的截止时间；
+响应解析与同步客户端共用 auth.py / course.py 中的函数，两者的行为保持一致。
+"""
+
+import asyncio
+import json
+import ssl
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple, AsyncIterator
+from urllib.parse import urlencode, urlsplit
+from auth import check_response, parse_captcha, parse_login
+from course import (Course, ClassNumberCache, SelectOutcome, SelectStatus, classify_select_response,
+                    course_page_params, parse_class_number, parse_course_page)
+from clock import ServerClock, SyncRound
+from ratelimit import RequestCancelled, rate_limiter
+from breaker import CircuitOpenError, breakers
+from api import request_timeout
+from metrics import request_metrics, classify_status
+from pacing import AimdController, Pacer, create_pacer
+from config import Config
+
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+class HTTPTransportError(Exception):
+    """连接或协议错误（请求未得到有效响应）"""
+
+
+@dataclass
+class AsyncResponse:
+    """HTTP响应"""
+    status_code: int
+    headers: Dict[str, str]  # 头部名称统一为小写
+    content: bytes
+    elapsed: float = 0.0  # 从发出请求到读完响应的耗时（秒）
+    ttfb: float = 0.0  # 从发出请求到收到状态行的耗时（秒）
+    connect_time: Optional[float] = None  # 新建连接的耗时（秒），复用连接时为None
+    
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+    
+    def header(self, name: str, default: str = None) -> Optional[str]:
+        """按名称读取响应头（不区分大小写）"""
+        return self.headers.get(name.lower(), default)
+    
+    def json(self):
+        """把响应体解析为JSON"""
+        return json.loads(self.content.decode('utf-8'))
+    
+    def raise_for_status(self):
+        """状态码表示错误时抛出异常"""
+        if not self.ok:
+            raise HTTPTransportError(f"HTTP {self.status_code}")
+
+
+@dataclass
+class _Connection:
+    """连接池中的一条连接"""
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    requests: int = 0  # 已在此连接上完成的请求数
+    
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHTTPTransport:
+    """基于asyncio的HTTP/1.1连接池
+    
+    同一主机的空闲连接会被复用；并发连接数由信号量限制。复用的空闲连接若已被服务器关闭，
+    在没有收到任何响应字节的情况下会自动换一条新连接重发一次。
+    """
+    
+    def __init__(self, max_connections: int = None, timeout: float = None):
+        self.max_connections = max_connections or Config.ASYNC_MAX_CONNECTIONS
+        self.timeout = timeout or Config.REQUEST_TIMEOUT
+        self.idle: Dict[Tuple[str, str, int], List[_Connection]] = {}
+        self.opened = 0  # 累计新建连接数
+        self.reused = 0  # 累计复用连接次数
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ssl_context: Optional[ssl.SSLContext] = None
+    
+    async def request(self, method: str, url: str, params: dict = None, json_body=None,
+                      headers: Dict[str, str] = None, timeout: float = None,
+                      connect_timeout: float = None) -> AsyncResponse:
+        """发送请求；整个请求超过timeout或建立连接超过connect_timeout时抛出 asyncio.TimeoutError"""
+        if self._semaphore is None:
+            # 信号量需在事件循环中创建
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        
+        timeout = self.timeout if timeout is None else timeout
+        connect_timeout = timeout if connect_timeout is None else min(connect_timeout, timeout)
+        async with self._semaphore:
+            return await asyncio.wait_for(
+                self._request(method, url, params, json_body, headers or {}, connect_timeout), timeout)
+    
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("GET", url, **kwargs)
+    
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("POST", url, **kwargs)
+    
+    async def put(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("PUT", url, **kwargs)
+    
+    async def _request(self, method: str, url: str, params: Optional[dict], json_body,
+                       headers: Dict[str, str], connect_timeout: float) -> AsyncResponse:
+        """在池中的连接上完成一次请求"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, host, port)
+        
+        target = parts.path or "/"
+        query = parts.query
+        if params:
+            query = f"{query}&{urlencode(params)}" if query else urlencode(params)
+        if query:
+            target = f"{target}?{query}"
+        
+        body = b""
+        request_headers = {
+            "Host": parts.netloc,
+            "Connection": "keep-alive",
+            "Accept": "*/*",
+            "Accept-Encoding": "identity"
+        }
+        request_headers.update(headers)
+        if json_body is not None:
+            body = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+            request_headers["Content-Type"] = "application/json;charset=utf-8"
+        if body or method in ("POST", "PUT"):
+            request_headers["Content-Length"] = str(len(body))
+        
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + "\r\n"
+        payload = head.encode('latin-1') + body
+        
+        while True:
+            connect_start = time.perf_counter()
+            connection, reused = await self._acquire(key, connect_timeout)
+            start = time.perf_counter()
+            try:
+                connection.writer.write(payload)
+                await connection.writer.drain()
+                response, keep_alive, first_byte = await self._read_response(connection.reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError, HTTPTransportError) as e:
+                connection.close()
+                if reused and _is_stale_error(e):
+                    # 空闲连接已被服务器关闭，换新连接重发
+                    continue
+                raise HTTPTransportError(f"连接异常: {e}")
+            except OSError as e:
+                connection.close()
+                raise HTTPTransportError(f"连接异常: {e}")
+            except BaseException:
+                # 超时取消等情况下连接状态未知，不能放回池中
+                connection.close()
+                raise
+            
+            response.elapsed = time.perf_counter() - start
+            response.ttfb = first_byte - start
+            response.connect_time = None if reused else start - connect_start
+            connection.requests += 1
+            if keep_alive:
+                self.idle.setdefault(key, []).append(connection)
+            else:
+                connection.close()
+            return response
+    
+    async def _acquire(self, key: Tuple[str, str, int], connect_timeout: float) -> Tuple[_Connection, bool]:
+        """取一条空闲连接，没有则新建；返回 (连接, 是否为复用)"""
+        idle = self.idle.get(key)
+        while idle:
+            connection = idle.pop()
+            if connection.reader.at_eof() or connection.writer.is_closing():
+                connection.close()
+                continue
+            self.reused += 1
+            return connection, True
+        
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl_context),
+                                                    connect_timeout)
+        except OSError as e:
+            raise HTTPTransportError(f"无法连接到 {host}:{port}: {e}")
+        self.opened += 1
+        return _Connection(reader, writer), False
+    
+    async def _read_response(self, reader: asyncio.StreamReader, method: str) -> Tuple[AsyncResponse, bool, float]:
+        """读取一个完整响应，返回 (响应, 连接是否可复用, 收到状态行的时刻)"""
+        status_line = await reader.readline()
+        first_byte = time.perf_counter()
+        if not status_line:
+            raise HTTPTransportError("服务器关闭了连接")
+        try:
+            version, status_text = status_line.decode('latin-1').split(" ", 1)
+            status_code = int(status_text[:3])
+        except ValueError:
+            raise HTTPTransportError(f"无效的状态行: {status_line!r}")
+        
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        connection_header = headers.get("connection", "").lower()
+        keep_alive = version.upper() == "HTTP/1.1" and connection_header != "close"
+        
+        if method == "HEAD" or status_code in (204, 304) or 100 <= status_code < 200:
+            content = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            content = await self._read_chunked(reader)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            # 没有长度信息时读到连接关闭
+            content = await reader.read()
+            keep_alive = False
+        
+        return AsyncResponse(status_code, headers, content), keep_alive, first_byte
+    
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        """读取分块传输的响应体"""
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPTransportError("无效的分块长度")
+            if size == 0:
+                # 跳过尾部头字段
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    
+    async def close(self):
+        """关闭所有空闲连接"""
+        for connections in self.idle.values():
+            for connection in connections:
+                connection.close()
+        self.idle.clear()
+
+
+def _is_stale_error(error: Exception) -> bool:
+    """判断错误是否由复用已关闭的空闲连接导致（尚未收到任何响应字节）"""
+    if isinstance(error, asyncio.IncompleteReadError):
+        return not error.partial
+    if isinstance(error, HTTPTransportError):
+        return str(error) == "服务器关闭了连接"
+    return isinstance(error, ConnectionError)
+
+
+@dataclass
+class GrabResult:
+    """多课程抢课中单门课程的结果"""
+    course: Course
+    success: bool = False
+    attempts: int = 0
+    last_outcome: Optional[SelectOutcome] = None
+    pacer: Optional[Pacer] = None
+
+
+class AsyncHUSTCourseClient:
+    """NCC选课异步客户端
+    
+    接口与 HUSTCourseClient 一一对应，方法均为协程。可通过 HUSTCourseClient.create_async_client()
+    创建，以共享令牌、课堂编号缓存和服务器时钟。
+    """
+    
+    def __init__(self, transport: AsyncHTTPTransport = None, class_cache: ClassNumberCache = None,
+                 clock: ServerClock = None, user_agent: str = None):
+        self.transport = transport or AsyncHTTPTransport()
+        self.class_cache = class_cache or ClassNumberCache()
+        self.clock = clock
+        self.headers = {"User-Agent": user_agent or DEFAULT_USER_AGENT}
+        self.token: Optional[str] = None
+    
+    async def _send(self, method: str, url: str, endpoint: str, **kwargs) -> AsyncResponse:
+        """经过熔断器和限流器发送请求；endpoint为接口类别"""
+        breaker = breakers.get(endpoint)
+        if Config.BREAKER_ENABLED:
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                request_metrics.record(endpoint, "circuit_open")
+                raise
+        
+        connect_timeout, read_timeout = request_timeout(endpoint)
+        try:
+            if not await rate_limiter.acquire_async(endpoint):
+                raise RequestCancelled("已停止，请求未发出")
+            response = await self.transport.request(method, url, headers=self.headers,
+                                                    timeout=connect_timeout + read_timeout,
+                                                    connect_timeout=connect_timeout, **kwargs)
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            request_metrics.record(endpoint, "timeout")
+            raise
+        except HTTPTransportError:
+            breaker.record_failure()
+            request_metrics.record(endpoint, "network_error")
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        
+        request_metrics.record(endpoint, classify_status(response.status_code), total=response.elapsed,
+                               ttfb=response.ttfb, connect=response.connect_time, status_code=response.status_code)
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+    
+    async def _get_json(self, url: str, endpoint: str, **kwargs) -> dict:
+        """GET请求并解析JSON；endpoint为接口类别"""
+        try:
+            response = await self._send("GET", url, endpoint, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except asyncio.TimeoutError:
+            raise Exception("网络请求失败: 请求超时")
+        except HTTPTransportError as e:
+            raise Exception(f"网络请求失败: {str(e)}")
+        except ValueError:
+            raise Exception("响应数据格式错误")
+    
+    async def get_captcha(self) -> Tuple[bytes, str]:
+        """获取验证码图片和UUID"""
+        return parse_captcha(await self._get_json(Config.CAPTCHA_URL, "auth"))
+    
+    async def login(self, username: str, password: str, code: str, uuid: str) -> str:
+        """用户登录"""
+        login_data = {
+            "username": username,
+            "password": password,
+            "code": code,
+            "uuid": uuid
+        }
+        
+        try:
+            response = await self._send("POST", Config.LOGIN_URL, "auth", json_body=login_data)
+            response.raise_for_status()
+            token = parse_login(response.json())
+        except asyncio.TimeoutError:
+            raise Exception("网络请求失败: 请求超时")
+        except HTTPTransportError as e:
+            raise Exception(f"网络请求失败: {str(e)}")
+        except ValueError:
+            raise Exception("响应数据格式错误")
+        
+        self.set_token(token)
+        return token
+    
+    def set_token(self, token: str):
+        """设置令牌"""
+        self.token = token
+        self.headers["Authorization"] = f"Bearer {token}"
+    
+    def is_logged_in(self) -> bool:
+        """检查是否已登录"""
+        return self.token is not None
+    
+    async def get_profile(self) -> dict:
+        """获取用户信息"""
+        if not self.token:
+            raise Exception("请先登录")
+        return check_response(await self._get_json(Config.PROFILE_URL, "profile"), "获取用户信息失败")
+    
+    async def get_user_info(self) -> dict:
+        """获取详细用户信息"""
+        if not self.token:
+            raise Exception("请先登录")
+        return check_response(await self._get_json(Config.USER_INFO_URL, "profile"), "获取用户信息失败")
+    
+    async def logout(self) -> bool:
+        """注销登录（无论请求是否成功都清除本地令牌）"""
+        if not self.token:
+            return True
+        
+        try:
+            response = await self._send("POST", Config.LOGOUT_URL, "auth")
+            response.raise_for_status()
+            return True
+        except (asyncio.TimeoutError, HTTPTransportError) as e:
+            raise Exception(f"网络请求失败: {str(e) or '请求超时'}")
+        finally:
+            self.token = None
+            self.headers.pop("Authorization", None)
+    
+    async def get_courses(self, page_size: int = None) -> List[Course]:
+        """获取课程列表"""
+        courses = []
+        async for page in self.iter_course_pages(page_size):
+            courses.extend(page)
+        return courses
+    
+    async def iter_course_pages(self, page_size: int = None) -> AsyncIterator[List[Course]]:
+        """按页获取课程列表；处理当前页时后续页面已在并发请求，最多提前 COURSE_PREFETCH_WORKERS 页"""
+        page_size = page_size or Config.COURSE_PAGE_SIZE
+        courses, total = await self._fetch_course_page(1, page_size)
+        yield courses
+        
+        page_count = (total + page_size - 1) // page_size
+        if page_count <= 1:
+            return
+        
+        pages = iter(range(2, page_count + 1))
+        pending: Deque[asyncio.Future] = deque()
+        
+        def schedule_next():
+            page_num = next(pages, None)
+            if page_num is not None:
+                pending.append(asyncio.ensure_future(self._fetch_course_page(page_num, page_size)))
+        
+        for _ in range(max(1, Config.COURSE_PREFETCH_WORKERS)):
+            schedule_next()
+        try:
+            while pending:
+                courses, _ = await pending.popleft()
+                if not courses:
+                    break
+                schedule_next()
+                yield courses
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _fetch_course_page(self, page_num: int, page_size: int) -> Tuple[List[Course], int]:
+        """获取一页课程"""
+        data = await self._get_json(Config.COURSES_URL, "courses", params=course_page_params(page_num, page_size))
+        return parse_course_page(data)
+    
+    async def get_course_class_number(self, course: Course) -> str:
+        """获取课程班级编号（请求服务器并写入缓存）"""
+        data = await self._get_json(f"{Config.CLASS_URL}/{course.course_id}/student", "class")
+        class_number = parse_class_number(data)
+        course.course_class_number = class_number
+        self.class_cache.put(course.course_id, class_number)
+        return class_number
+    
+    async def resolve_class_number(self, course: Course, refresh: bool = False) -> str:
+        """获取课堂编号，优先使用缓存"""
+        if not refresh:
+            class_number = self.class_cache.get(course.course_id)
+            if class_number:
+                course.course_class_number = class_number
+                return class_number
+        
+        return await self.get_course_class_number(course)
+    
+    async def prefetch_class_numbers(self, courses: List[Course]) -> Dict[int, str]:
+        """并发解析一批课程的课堂编号，返回获取失败的 {course_id: 错误信息}"""
+        results = await asyncio.gather(*(self.resolve_class_number(course) for course in courses),
+                                       return_exceptions=True)
+        return {course.course_id: str(result) for course, result in zip(courses, results)
+                if isinstance(result, Exception)}
+    
+    def invalidate_class_number(self, course: Course):
+        """丢弃课程的课堂编号缓存"""
+        self.class_cache.invalidate(course.course_id)
+        course.course_class_number = ""
+    
+    async def select_course(self, course: Course) -> bool:
+        """选课（失败时抛出异常）"""
+        outcome = await self.try_select_course(course)
+        if not outcome.ok:
+            raise Exception(str(outcome))
+        return True
+    
+    async def try_select_course(self, course: Course) -> SelectOutcome:
+        """选课，不抛出异常，返回结构化结果"""
+        if course.course_id <= 0:
+            return SelectOutcome(SelectStatus.INVALID_COURSE, msg="课程ID无效")
+        
+        try:
+            await self.resolve_class_number(course)
+        except CircuitOpenError as e:
+            return SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            return SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except Exception as e:
+            return SelectOutcome(SelectStatus.CLASS_UNRESOLVED, msg=str(e))
+        
+        outcome = await self._put_select(course)
+        if outcome.status != SelectStatus.CLASS_REJECTED:
+            return outcome
+        
+        # 缓存的课堂编号被服务器拒绝，丢弃后重新获取一次
+        self.invalidate_class_number(course)
+        try:
+            await self.resolve_class_number(course, refresh=True)
+        except CircuitOpenError as e:
+            return SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            return SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except Exception as e:
+            return SelectOutcome(SelectStatus.CLASS_UNRESOLVED, msg=str(e))
+        return await self._put_select(course)
+    
+    async def _put_select(self, course: Course) -> SelectOutcome:
+        """发送选课请求"""
+        url = f"{Config.SELECT_URL}/{course.course_id}/select"
+        params = {"classNumber": course.course_class_number}
+        
+        start_time = time.perf_counter()
+        try:
+            response = await self._send("PUT", url, "select", params=params)
+        except CircuitOpenError as e:
+            outcome = SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            outcome = SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except asyncio.TimeoutError:
+            outcome = SelectOutcome(SelectStatus.TIMEOUT, msg="请求超时", latency=time.perf_counter() - start_time)
+        except HTTPTransportError as e:
+            outcome = SelectOutcome(SelectStatus.NETWORK_ERROR, msg=str(e), latency=time.perf_counter() - start_time)
+        else:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            outcome = classify_select_response(response.status_code, data, response.elapsed)
+        
+        request_metrics.record_result("select", outcome.status.value)
+        return outcome
+    
+    async def sample_clock(self):
+        """采样一次服务器Date头
+        
+        与其他请求一样经过熔断器、限流器并记入 request_metrics。往返耗时取响应的 elapsed
+        （从发出请求到读完响应），不含限流等待和新建连接的耗时。
+        """
+        response = await self._send("GET", self.clock.url, "clock")
+        rtt = response.elapsed
+        return self.clock.make_sample(time.time() - rtt, rtt, response.header('Date'))
+    
+    async def sync_clock(self, samples: int = None) -> Tuple[float, float]:
+        """多次采样估计服务器时钟偏移，返回 (偏移量, 区间半宽)"""
+        if self.clock is None:
+            raise Exception("未配置服务器时钟")
+        
+        samples = samples or Config.CLOCK_SYNC_SAMPLES
+        sync_round = SyncRound(self.clock)
+        try:
+            for i in range(samples):
+                if i > 0:
+                    await asyncio.sleep(sync_round.next_delay())
+                sync_round.add(await self.sample_clock())
+        except (asyncio.TimeoutError, HTTPTransportError, CircuitOpenError) as e:
+            if sync_round.is_empty:
+                raise Exception(f"网络请求失败: {str(e) or '请求超时'}")
+        return sync_round.finish()
+    
+    async def grab_many(self, courses: List[Course], interval: float = None,
+                        callback: Callable[[Course, str], None] = None,
+                        on_outcome: Callable[[Course, SelectOutcome], None] = None,
+                        stop_flag: Callable[[], bool] = None,
+                        heartbeat_interval: float = None,
+                        clock_sync_interval: float = None,
+                        adaptive: bool = None) -> List[GrabResult]:
+        """在一个事件循环中同时抢多门课程
+        
+        每门课程一个协程，由各自的Pacer按绝对计划时刻重试；另有心跳协程保持登录状态、时钟协程定期重新同步。
+        任一课程遇到登录失效时全部停止。
+        """
+        interval = Config.TIME_INTERVAL if interval is None else interval
+        heartbeat_interval = heartbeat_interval or Config.ASYNC_HEARTBEAT_INTERVAL
+        clock_sync_interval = clock_sync_interval or Config.ASYNC_CLOCK_SYNC_INTERVAL
+        adaptive = Config.ADAPTIVE_PACING if adaptive is None else adaptive
+        results = [GrabResult(course) for course in courses]
+        halt = asyncio.Event()
+        # 所有课程共用一个自适应控制器：拥塞是服务器整体的状态
+        controller = AimdController(interval, on_change=lambda text: log(None, text)) if adaptive else None
+        
+        def log(course: Optional[Course], message: str):
+            if callback:
+                callback(course, message)
+        
+        # 每门课程各自按interval重试，总速率随课程数增加
+        notice = rate_limiter.fit_rate("select", len(courses) / max(interval, 0.01))
+        if notice:
+            log(None, notice)
+        
+        def stopped() -> bool:
+            return halt.is_set() or (stop_flag is not None and stop_flag())
+        
+        async def pause(seconds: float) -> bool:
+            """等待指定秒数，期间被停止返回True"""
+            deadline = time.monotonic() + seconds
+            while not stopped():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(halt.wait(), min(remaining, Config.STOP_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+            return True
+        
+        async def grab(result: GrabResult):
+            course = result.course
+            pacer = result.pacer = create_pacer(interval, adaptive, controller=controller)
+            # 每门课程是独立的任务，停止标志只作用于本任务的上下文
+            rate_limiter.set_stop_flag(stopped)
+            while await pacer.begin_async(stopped):
+                result.attempts += 1
+                outcome = await self.try_select_course(course)
+                pacer.end(outcome)
+                if outcome.status == SelectStatus.CANCELLED:
+                    continue
+                result.last_outcome = outcome
+                if on_outcome:
+                    on_outcome(course, outcome)
+                
+                if outcome.ok:
+                    result.success = True
+                    log(course, f"选课成功！尝试次数: {result.attempts}")
+                    return
+                
+                log(course, f"第{result.attempts}次尝试失败: {outcome}, 耗时: {outcome.latency:.3f}s")
+                if outcome.status == SelectStatus.TOKEN_EXPIRED:
+                    log(course, "登录已失效，停止全部课程")
+                    halt.set()
+                    return
+                if outcome.should_stop:
+                    return
+        
+        async def heartbeat():
+            while not await pause(heartbeat_interval):
+                try:
+                    await self.get_profile()
+                except Exception as e:
+                    log(None, f"心跳失败: {str(e)}")
+        
+        async def resync_clock():
+            while not await pause(clock_sync_interval):
+                try:
+                    await self.sync_clock()
+                    log(None, f"服务器时钟: {self.clock.describe()}")
+                except Exception as e:
+                    log(None, f"时钟同步失败: {str(e)}")
+        
+        def log_breaker(text: str):
+            log(None, text)
+        
+        breakers.add_listener(log_breaker)
+        await self.prefetch_class_numbers(courses)
+        
+        background = []
+        if self.token:
+            background.append(asyncio.ensure_future(heartbeat()))
+        if self.clock is not None:
+            background.append(asyncio.ensure_future(resync_clock()))
+        try:
+            await asyncio.gather(*(grab(result) for result in results))
+        finally:
+            breakers.remove_listener(log_breaker)
+            halt.set()
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+        
+        if stop_flag is not None and stop_flag():
+            log(None, "用户停止了自动选课")
+        return results
+    
+    async def close(self):
+        """关闭连接池"""
+        await self.transport.close()
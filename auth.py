@@ -6,34 +6,54 @@ import json
 import base64
 import requests
 from typing import Tuple, Optional
+from api import ApiManager
 from config import Config
 
 
-class AuthManager:
+def check_response(data: dict, error_prefix: str) -> dict:
+    """检查响应code，不为200时抛出异常"""
+    if data.get("code") != 200:
+        raise Exception(f"{error_prefix}: {data.get('msg', '未知错误')}")
+    return data
+
+
+def parse_captcha(data: dict) -> Tuple[bytes, str]:
+    """解析验证码响应，返回图片字节和UUID"""
+    check_response(data, "获取验证码失败")
+    
+    img_base64 = data.get("img", "")
+    uuid = data.get("uuid", "")
+    
+    if not img_base64 or not uuid:
+        raise Exception("验证码数据不完整")
+    
+    return base64.b64decode(img_base64), uuid
+
+
+def parse_login(data: dict) -> str:
+    """解析登录响应，返回令牌"""
+    check_response(data, "登录失败")
+    
+    token = data.get("token", "")
+    if not token:
+        raise Exception("未获取到有效的令牌")
+    return token
+
+
+class AuthManager(ApiManager):
     """认证管理器"""
     
     def __init__(self, session: requests.Session):
-        self.session = session
+        super().__init__(session)
         self.token: Optional[str] = None
     
     def get_captcha(self) -> Tuple[bytes, str]:
         """获取验证码图片和UUID"""
         try:
-            response = self.session.get(Config.CAPTCHA_URL, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("GET", Config.CAPTCHA_URL, "auth")
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"获取验证码失败: {data.get('msg', '未知错误')}")
-            
-            img_base64 = data.get("img", "")
-            uuid = data.get("uuid", "")
-            
-            if not img_base64 or not uuid:
-                raise Exception("验证码数据不完整")
-            
-            img_bytes = base64.b64decode(img_base64)
-            return img_bytes, uuid
+            return parse_captcha(response.json())
             
         except requests.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
@@ -52,20 +72,10 @@ class AuthManager:
         }
         
         try:
-            response = self.session.post(
-                Config.LOGIN_URL, 
-                json=login_data, 
-                timeout=Config.REQUEST_TIMEOUT
-            )
+            response = self._request("POST", Config.LOGIN_URL, "auth", json=login_data)
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"登录失败: {data.get('msg', '未知错误')}")
-            
-            token = data.get("token", "")
-            if not token:
-                raise Exception("未获取到有效的令牌")
+            token = parse_login(response.json())
             
             self.token = token
             self.session.headers.update({"Authorization": f"Bearer {token}"})
@@ -87,14 +97,10 @@ class AuthManager:
             raise Exception("请先登录")
         
         try:
-            response = self.session.get(Config.PROFILE_URL, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("GET", Config.PROFILE_URL, "profile")
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"获取用户信息失败: {data.get('msg', '未知错误')}")
-            
-            return data
+            return check_response(response.json(), "获取用户信息失败")
             
         except requests.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
@@ -107,14 +113,10 @@ class AuthManager:
             raise Exception("请先登录")
         
         try:
-            response = self.session.get(Config.USER_INFO_URL, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("GET", Config.USER_INFO_URL, "profile")
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"获取用户信息失败: {data.get('msg', '未知错误')}")
-            
-            return data
+            return check_response(response.json(), "获取用户信息失败")
             
         except requests.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
@@ -127,7 +129,7 @@ class AuthManager:
             return True
         
         try:
-            response = self.session.post(Config.LOGOUT_URL, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("POST", Config.LOGOUT_URL, "auth")
             response.raise_for_status()
             
             # 清除本地token和session header
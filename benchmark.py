@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+端到端抢课基准测试
+
+在本地模拟服务器（mock_server.py）上运行 select_course、auto_select_course 和 ScheduledCourseGrabber，
+测量请求速率、单次尝试延迟分位数、定时器触发误差和竞争下的抢到时间。
+结果写入JSON文件，可与之前的结果对比，用数字判断节奏、传输或持久化方面的改动。
+    
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import requests
+
+from config import Config
+from mock_server import MockNCCServer, MockNCCState, LatencyModel
+
+
+# 数值越大越好的指标，其余指标越小越好
+HIGHER_IS_BETTER = ("rps", "success_rate")
+# 描述运行参数的字段，不参与对比
+NOT_COMPARED = ("count", "rounds", "courses", "wall_s")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """线性插值分位数，p取0-100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float], prefix: str) -> Dict[str, float]:
+    """秒 -> 毫秒分位数"""
+    return {
+        f"{prefix}_p50_ms": percentile(values, 50) * 1000,
+        f"{prefix}_p95_ms": percentile(values, 95) * 1000,
+        f"{prefix}_p99_ms": percentile(values, 99) * 1000,
+        f"{prefix}_mean_ms": (statistics.mean(values) if values else 0.0) * 1000
+    }
+
+
+class BenchmarkEnv:
+    """基准测试环境：一个模拟服务器加一个指向它的客户端"""
+    
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.server = MockNCCServer(
+            state=self.new_state(),
+            latency=LatencyModel(args.latency),
+            select_latency=LatencyModel(args.select_latency) if args.select_latency else None,
+            error_rate=args.error_rate
+        ).start()
+        Config.set_base_url(self.server.base_url)
+        
+        from client import HUSTCourseClient
+        self.client = HUSTCourseClient()
+    
+    @property
+    def state(self) -> MockNCCState:
+        return self.server.state
+    
+    def new_state(self, window_open: float = 0.0, **kwargs) -> MockNCCState:
+        return MockNCCState.generate(self.args.courses, seed=self.args.seed, window_open=window_open,
+                                     clock_offset=self.args.clock_offset, **kwargs)
+    
+    def reset(self, window_open: float = 0.0, **kwargs):
+        """换一份新的服务器状态并重新登录"""
+        self.server.state = self.new_state(window_open, **kwargs)
+        self.client.set_token(self.state.issue_token("BENCH0001"))
+    
+    def server_to_local(self, server_time: float) -> float:
+        return server_time - self.state.clock_offset
+    
+    def close(self):
+        self.client.close()
+        self.server.stop()
+
+
+def bench_select(env: BenchmarkEnv) -> Dict[str, float]:
+    """连续选课，分别测量请求本身的延迟（SelectOutcome.latency）、限流等待和整次调用耗时
+    
+    rps 是包含限流在内的实际速率，受 Config.RATE_LIMITS["select"] 约束；服务器性能看 latency。
+    """
+    from ratelimit import rate_limiter
+    
+    args = env.args
+    env.reset()
+    courses = env.client.get_courses()
+    full = [course for course in courses if course.selected >= course.optional] or courses
+    env.client.prefetch_class_numbers(full)
+    
+    latencies = []
+    limiter_waits = []
+    calls = []
+    started = time.perf_counter()
+    with rate_limiter.subsystem("基准测试"):
+        for index in range(args.select_count):
+            course = full[index % len(full)]
+            waited = rate_limiter.waited["基准测试"]
+            begin = time.perf_counter()
+            outcome = env.client.try_select_course(course)  # 课程已满，失败是预期结果
+            calls.append(time.perf_counter() - begin)
+            latencies.append(outcome.latency)
+            limiter_waits.append(rate_limiter.waited["基准测试"] - waited)
+    elapsed = time.perf_counter() - started
+    
+    result = {"count": len(latencies), "rps": len(latencies) / elapsed if elapsed > 0 else 0.0}
+    result.update(summarize(latencies, "latency"))
+    result.update(summarize(limiter_waits, "limiter_wait"))
+    result.update(summarize(calls, "call"))
+    return result
+
+
+def compete(base_url: str, token: str, course_id: int, class_number: str, interval: float,
+            stop_event: threading.Event):
+    """竞争者：按固定间隔（带抖动）抢同一门课，抢到即停"""
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    url = f"{base_url}/dev-api/xuanke/course/{course_id}/select"
+    while not stop_event.is_set():
+        try:
+            data = session.put(url, params={"classNumber": class_number}, timeout=5).json()
+            if data.get("code") == 200:
+                break
+        except (requests.RequestException, ValueError):
+            pass
+        stop_event.wait(interval * random.uniform(0.5, 1.5))
+    session.close()
+
+
+def bench_auto_select(env: BenchmarkEnv) -> Dict[str, float]:
+    """选课时段开放前启动 auto_select_course，与其他竞争者抢有限名额，测量抢到所需时间"""
+    args = env.args
+    times = []
+    attempts = []
+    wins = 0
+    
+    for _ in range(args.rounds):
+        env.reset(window_open=args.lead)
+        state = env.state
+        course = min(state.courses.values(), key=lambda c: c.course_id)
+        course.selected = course.capacity - args.seats
+        
+        target = next(c for c in env.client.get_courses() if c.course_id == course.course_id)
+        env.client.resolve_class_number(target)
+        
+        stop_event = threading.Event()
+        competitors = [
+            threading.Thread(target=compete, args=(env.server.base_url, state.issue_token(f"RIVAL{i:04d}"),
+                                                   course.course_id, course.class_number,
+                                                   args.competitor_interval, stop_event), daemon=True)
+            for i in range(args.competitors)
+        ]
+        # 竞争者在开放前一刻开始
+        wait = env.server_to_local(state.window_open_at) - time.time() - 0.05
+        for thread in competitors:
+            if wait <= 0:
+                thread.start()
+            else:
+                threading.Timer(wait, thread.start).start()
+        
+        deadline = time.time() + args.lead + args.timeout
+        messages = []
+        success = env.client.auto_select_course(target, messages.append, stop_flag=lambda: time.time() > deadline)
+        stop_event.set()
+        
+        attempts.append(sum(1 for msg in messages if msg.startswith("第")) + (1 if success else 0))
+        if success:
+            wins += 1
+            won_at = next(t for user, course_id, t in state.successes if user == "BENCH0001")
+            times.append(won_at - state.window_open_at)
+    
+    result = {
+        "rounds": args.rounds,
+        "success_rate": wins / args.rounds,
+        "attempts_mean": statistics.mean(attempts) if attempts else 0.0
+    }
+    result.update(summarize(times, "time_to_success"))
+    return result
+
+
+def bench_scheduler(env: BenchmarkEnv) -> Dict[str, float]:
+    """用 ScheduledCourseGrabber 定时抢多门课，测量定时器触发误差和全部抢到所需时间"""
+    from scheduler import CourseQueue, ScheduledCourseGrabber
+    from clock import BEIJING_TZ
+    
+    args = env.args
+    fire_errors = []
+    first_request = []
+    all_done = []
+    completed = 0
+    
+    env.reset()
+    env.client.sync_clock()
+    
+    for index in range(args.rounds):
+        env.reset(window_open=args.lead)
+        state = env.state
+        courses = [c for c in env.client.get_courses() if c.selected < c.optional][:args.scheduler_courses]
+        
+        queue = CourseQueue(os.path.join(env.workdir, f"bench_queue_{index}.json"))
+        for course in courses:
+            queue.add_course(course)
+        
+        grabber = ScheduledCourseGrabber(env.client, queue)
+        grabber.set_callbacks(lambda message: None, lambda status: None)
+        grabber.warmup_lead = 0
+        grabber.worker_mode = args.scheduler_mode == "worker"
+        grabber.async_mode = args.scheduler_mode == "async"
+        
+        target_server_time = state.window_open_at
+        target_time = datetime.fromtimestamp(target_server_time, BEIJING_TZ).replace(tzinfo=None)
+        grabber.schedule_grab(target_time, args.interval)
+        
+        deadline = time.time() + args.lead + args.timeout
+        while time.time() < deadline and queue.count_by_status().get("success", 0) < len(courses):
+            time.sleep(0.01)
+        timer = grabber.timer
+        grabber.stop_grab()
+        grabber.cancel_schedule()
+        queue.close()
+        
+        if timer is not None and timer.fire_error is not None:
+            fire_errors.append(abs(timer.fire_error))
+        if "select" in state.first_request_at:
+            first_request.append(state.first_request_at["select"] - target_server_time)
+        mine = [t for user, _, t in state.successes if user == "BENCH0001"]
+        if len(mine) == len(courses):
+            completed += 1
+            all_done.append(max(mine) - target_server_time)
+    
+    result = {
+        "rounds": args.rounds,
+        "courses": args.scheduler_courses,
+        "success_rate": completed / args.rounds,
+        "fire_error_abs_max_ms": max(fire_errors, default=0.0) * 1000
+    }
+    result.update(summarize(fire_errors, "fire_error_abs"))
+    result.update(summarize(first_request, "first_select_after_target"))
+    result.update(summarize(all_done, "time_to_all_success"))
+    return result
+
+
+def bench_limiter(env: BenchmarkEnv) -> Dict[str, float]:
+    """选课线程持续占满自己接口的令牌时，后台请求（心跳、时钟同步）的取令牌等待时间
+    
+    只使用独立的限流器，不发请求。任何一次等待超过 --starvation-timeout 即判定为饿死并报错。
+    """
+    import asyncio
+    from ratelimit import RateLimiter
+    
+    args = env.args
+    limiter = RateLimiter(global_rate=8.0, global_burst=8, limits={"select": (4.0, 4), "clock": (4.0, 4),
+                                                                   "profile": (4.0, 4)})
+    stop_event = threading.Event()
+    
+    def hammer():
+        while not stop_event.is_set():
+            limiter.acquire("select", stop_event=stop_event)
+    
+    hammers = [threading.Thread(target=hammer, daemon=True) for _ in range(2)]
+    for thread in hammers:
+        thread.start()
+    time.sleep(0.5)  # 让选课线程先把令牌用完
+    
+    waits = []
+    try:
+        for index in range(args.limiter_samples):
+            endpoint = "profile" if index % 2 else "clock"
+            give_up = threading.Event()
+            timer = threading.Timer(args.starvation_timeout, give_up.set)
+            timer.start()
+            begin = time.perf_counter()
+            if index % 4 == 3:
+                async def acquire():
+                    await asyncio.wait_for(limiter.acquire_async(endpoint), args.starvation_timeout)
+                try:
+                    asyncio.run(acquire())
+                    acquired = True
+                except asyncio.TimeoutError:
+                    acquired = False
+            else:
+                acquired = limiter.acquire(endpoint, stop_event=give_up)
+            timer.cancel()
+            if not acquired:
+                raise Exception(f"后台请求 {endpoint} 等待 {args.starvation_timeout:.0f} 秒仍未取得令牌，被选课请求饿死")
+            waits.append(time.perf_counter() - begin)
+    finally:
+        stop_event.set()
+        for thread in hammers:
+            thread.join()
+    
+    result = {"count": len(waits)}
+    result.update(summarize(waits, "background_wait"))
+    return result
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkEnv], Dict[str, float]]] = {
+    "select": bench_select,
+    "auto_select": bench_auto_select,
+    "scheduler": bench_scheduler,
+    "limiter": bench_limiter
+}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """对比两次结果，打印变化，返回退步的指标"""
+    regressions = []
+    for name, metrics in current["results"].items():
+        base_metrics = baseline.get("results", {}).get(name)
+        if not base_metrics:
+            print(f"[{name}] 基准中没有此项")
+            continue
+        print(f"[{name}]")
+        for key, value in metrics.items():
+            base = base_metrics.get(key)
+            if key in NOT_COMPARED or not isinstance(base, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            change = (value - base) / abs(base) if base else 0.0
+            worse = -change if key in HIGHER_IS_BETTER else change
+            mark = ""
+            if worse > threshold:
+                mark = "  ⚠️ 退步"
+                regressions.append(f"{name}.{key}")
+            elif worse < -threshold:
+                mark = "  ✅ 改善"
+            print(f"  {key:<36} {base:>12.3f} -> {value:>12.3f}  ({change:+.1%}){mark}")
+    return regressions
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="端到端抢课基准测试（使用本地模拟服务器）")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="只运行指定项目")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果文件")
+    parser.add_argument("--baseline", help="与之前的结果文件对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定退步的相对变化阈值")
+    parser.add_argument("--courses", type=int, default=20, help="模拟课程数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--latency", default="lognormal:-4.0,0.5", help="模拟服务器延迟分布")
+    parser.add_argument("--select-latency", help="选课接口延迟分布，默认同--latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务器随机5xx比例")
+    parser.add_argument("--clock-offset", type=float, default=0.0, help="模拟服务器时钟偏差（秒）")
+    parser.add_argument("--interval", type=float, default=0.2, help="抢课间隔（秒）")
+    parser.add_argument("--select-count", type=int, default=200, help="select项目的请求次数")
+    parser.add_argument("--rounds", type=int, default=5, help="auto_select/scheduler项目的轮数")
+    parser.add_argument("--lead", type=float, default=1.0, help="每轮开始到选课时段开放的秒数")
+    parser.add_argument("--timeout", type=float, default=10.0, help="每轮开放后的最长等待秒数")
+    parser.add_argument("--seats", type=int, default=3, help="竞争项目中剩余名额")
+    parser.add_argument("--competitors", type=int, default=10, help="竞争者数量")
+    parser.add_argument("--competitor-interval", type=float, default=0.2, help="竞争者请求间隔（秒）")
+    parser.add_argument("--scheduler-courses", type=int, default=3, help="scheduler项目每轮的课程数")
+    parser.add_argument("--scheduler-mode", choices=["serial", "worker", "async"], default="serial",
+                        help="调度器抢课模式")
+    parser.add_argument("--no-rate-limit", action="store_true", help="关闭客户端限流")
+    parser.add_argument("--limiter-samples", type=int, default=20, help="limiter项目的后台请求次数")
+    parser.add_argument("--starvation-timeout", type=float, default=5.0, help="后台请求判定为饿死的等待秒数")
+    args = parser.parse_args()
+    
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    
+    # 缓存和队列文件放到临时目录，不影响真实数据
+    workdir = tempfile.mkdtemp(prefix="ncc_bench_")
+    Config.CLASS_NUMBER_CACHE_FILE = os.path.join(workdir, Config.CLASS_NUMBER_CACHE_FILE)
+    Config.QUEUE_FILE = os.path.join(workdir, Config.QUEUE_FILE)
+    Config.TIME_INTERVAL = args.interval
+    
+    from ratelimit import rate_limiter
+    if args.no_rate_limit:
+        rate_limiter.enabled = False
+    
+    env = BenchmarkEnv(args, workdir)
+    results = {}
+    try:
+        for name in args.only or list(BENCHMARKS):
+            print(f"运行 {name} ...")
+            started = time.perf_counter()
+            results[name] = BENCHMARKS[name](env)
+            results[name]["wall_s"] = time.perf_counter() - started
+            for key, value in results[name].items():
+                print(f"  {key:<36} {value:.3f}")
+    finally:
+        env.close()
+    
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+    
+    if baseline is not None:
+        print(f"\n与基准 {args.baseline} 对比（阈值 {args.threshold:.0%}）:")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"退步的指标: {', '.join(regressions)}")
+            sys.exit(1)
+        print("没有明显退步")
+
+
+if __name__ == "__main__":
+    main()
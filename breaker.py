@@ -0,0 +1,186 @@
+"""
+熔断器：服务器整体不可用时暂停请求，按退避时间发出探测请求
+
+每个接口类别一个熔断器。关闭状态下统计最近若干次请求的失败率，超过阈值后打开；
+打开期间请求直接被拒绝（不再排队等待超时），到期后进入半开状态，只放行一个探测请求，
+成功则关闭，失败则以加倍的时长重新打开。打开时长带随机抖动，避免多个客户端同时探测。
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求未发出"""
+    
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"服务器暂不可用（{endpoint}），{retry_after:.1f}秒后重试")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """单个接口类别的熔断器（线程安全）"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    STATE_NAMES = {CLOSED: "正常", OPEN: "熔断", HALF_OPEN: "探测中"}
+    
+    def __init__(self, endpoint: str, failure_rate: float = None, window: int = None, min_calls: int = None,
+                 open_time: float = None, max_open_time: float = None, jitter: float = None,
+                 on_change: Callable[[str, str], None] = None):
+        self.endpoint = endpoint
+        self.failure_rate = Config.BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.min_calls = min_calls or Config.BREAKER_MIN_CALLS
+        self.base_open_time = open_time or Config.BREAKER_OPEN_TIME
+        self.max_open_time = max_open_time or Config.BREAKER_MAX_OPEN_TIME
+        self.jitter = Config.BREAKER_JITTER if jitter is None else jitter
+        self.on_change = on_change  # 状态变化回调，参数为 (接口类别, 状态描述)
+        
+        self.lock = threading.Lock()
+        self.results = deque(maxlen=window or Config.BREAKER_WINDOW)  # 最近的请求结果，True表示失败
+        self.state = self.CLOSED
+        self.open_time = self.base_open_time  # 下一次打开的基础时长，连续探测失败时加倍
+        self.open_until = 0.0  # 打开状态的结束时刻（monotonic）
+        self.probe_in_flight = False
+        self.trips = 0  # 累计打开次数
+    
+    def _set_state(self, state: str):
+        """切换状态（调用方持有锁），返回需要通知的描述"""
+        if state == self.state:
+            return None
+        self.state = state
+        return self._describe_locked()
+    
+    def _trip(self):
+        """打开熔断器（调用方持有锁）"""
+        duration = self.open_time * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.open_until = time.monotonic() + duration
+        self.open_time = min(self.max_open_time, self.open_time * 2)
+        self.probe_in_flight = False
+        self.results.clear()
+        self.trips += 1
+        # 即使已是打开状态（半开探测失败）也通知，便于看到新的重试时间
+        self.state = self.OPEN
+        return self._describe_locked()
+    
+    def _notify(self, text: Optional[str]):
+        if text and self.on_change:
+            self.on_change(self.endpoint, text)
+    
+    def allow(self):
+        """请求前调用；熔断中抛出 CircuitOpenError"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now < self.open_until:
+                    raise CircuitOpenError(self.endpoint, self.open_until - now)
+                text = self._set_state(self.HALF_OPEN)
+                self.probe_in_flight = True
+            elif self.probe_in_flight:
+                # 半开状态只放行一个探测请求
+                raise CircuitOpenError(self.endpoint, Config.BREAKER_PROBE_WAIT)
+            else:
+                self.probe_in_flight = True
+                text = None
+        self._notify(text)
+    
+    def record_success(self):
+        """请求得到了服务器的正常响应"""
+        with self.lock:
+            self.results.append(False)
+            text = None
+            if self.state != self.CLOSED:
+                self.results.clear()
+                self.open_time = self.base_open_time
+                self.probe_in_flight = False
+                text = self._set_state(self.CLOSED)
+        self._notify(text)
+    
+    def record_failure(self):
+        """请求超时、连接失败或服务器5xx"""
+        with self.lock:
+            text = None
+            if self.state == self.HALF_OPEN:
+                text = self._trip()
+            elif self.state == self.CLOSED:
+                self.results.append(True)
+                if len(self.results) >= self.min_calls and sum(self.results) / len(self.results) >= self.failure_rate:
+                    text = self._trip()
+        self._notify(text)
+    
+    def release(self):
+        """请求因其他原因未发出时归还探测名额"""
+        with self.lock:
+            self.probe_in_flight = False
+    
+    def retry_after(self) -> float:
+        """距离可以发出请求还有多少秒"""
+        with self.lock:
+            if self.state == self.OPEN:
+                return max(0.0, self.open_until - time.monotonic())
+            return 0.0
+    
+    def _describe_locked(self) -> str:
+        text = f"{self.endpoint}: {self.STATE_NAMES[self.state]}"
+        if self.state == self.OPEN:
+            text += f"，{max(0.0, self.open_until - time.monotonic()):.1f}秒后探测"
+        elif self.results:
+            text += f"，最近失败率 {sum(self.results) / len(self.results):.0%}"
+        return text
+    
+    def describe(self) -> str:
+        """状态描述"""
+        with self.lock:
+            return self._describe_locked()
+
+
+class BreakerRegistry:
+    """按接口类别管理熔断器"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.listeners = []  # 状态变化回调列表
+    
+    def get(self, endpoint: str) -> CircuitBreaker:
+        """取得接口类别对应的熔断器"""
+        with self.lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, on_change=self._on_change)
+                self.breakers[endpoint] = breaker
+            return breaker
+    
+    def add_listener(self, callback: Callable[[str], None]):
+        """注册状态变化回调，参数为状态描述"""
+        self.listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[str], None]):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def _on_change(self, endpoint: str, text: str):
+        for callback in list(self.listeners):
+            callback(f"熔断器 {text}")
+    
+    def describe(self) -> str:
+        """所有熔断器的状态"""
+        with self.lock:
+            breakers = list(self.breakers.values())
+        if not breakers:
+            return "无请求记录"
+        return "; ".join(breaker.describe() for breaker in breakers)
+
+
+# 进程内共享的熔断器
+breakers = BreakerRegistry()
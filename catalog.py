@@ -0,0 +1,165 @@
+"""
+课程搜索索引
+
+课程加载后建立一次：预先规范化课程ID、代码、名称、专业和名称的拼音首字母，
+对这些字段的单字和二元组建立倒排索引。查询时先用索引求候选集合，再逐条核对并按匹配位置打分排序。
+"""
+
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from course import Course
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装pypinyin时使用GB2312编码顺序估算常用汉字的首字母
+    lazy_pinyin = None
+
+
+# GB2312一级汉字按拼音排序，各首字母的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z")
+]
+_GB2312_LEVEL1_END = 0xD7F9
+
+# 字段 -> (前缀匹配分, 包含匹配分)
+FIELD_WEIGHTS = {
+    "id": (100, 30),
+    "code": (80, 35),
+    "name": (60, 40),
+    "initials": (50, 15),
+    "major": (20, 10)
+}
+
+
+def normalize(text) -> str:
+    """全角转半角、转小写、去除空白"""
+    return "".join(unicodedata.normalize("NFKC", str(text or "")).lower().split())
+
+
+def _initial(char: str) -> str:
+    if char.isascii():
+        return char if char.isalnum() else ""
+    try:
+        encoded = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(encoded) != 2:
+        return ""
+    code = (encoded[0] << 8) | encoded[1]
+    if not _GB2312_INITIALS[0][0] <= code < _GB2312_LEVEL1_END:
+        return ""
+    letter = ""
+    for start, initial in _GB2312_INITIALS:
+        if code < start:
+            break
+        letter = initial
+    return letter
+
+
+def pinyin_initials(text: str) -> str:
+    """拼音首字母，如"数据结构" -> "sjjg"；字母和数字原样保留"""
+    if lazy_pinyin is not None:
+        return "".join(item[:1] for item in lazy_pinyin(text, style=Style.FIRST_LETTER, errors="default")).lower()
+    return "".join(_initial(char) for char in text).lower()
+
+
+def _grams(text: str) -> Set[str]:
+    """单字和二元组"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class CourseCatalog:
+    """课程搜索索引（构建后只读，可在多个线程中查询）"""
+    
+    def __init__(self, courses: Iterable[Course] = ()):
+        self.courses: List[Course] = []
+        self.by_id: Dict[int, Course] = {}
+        self.fields: List[Dict[str, str]] = []  # 与courses对应的规范化字段
+        self.postings: Dict[str, Set[int]] = defaultdict(set)  # 单字/二元组 -> 课程下标
+        self.build(courses)
+    
+    def build(self, courses: Iterable[Course]):
+        """重建索引"""
+        self.courses = list(courses)
+        self.by_id = {course.course_id: course for course in self.courses}
+        self.fields = []
+        self.postings = defaultdict(set)
+        for index, course in enumerate(self.courses):
+            fields = {
+                "id": str(course.course_id),
+                "code": normalize(course.course_code),
+                "name": normalize(course.course_name),
+                "initials": pinyin_initials(normalize(course.course_name)),
+                "major": normalize(course.major)
+            }
+            self.fields.append(fields)
+            for value in fields.values():
+                for gram in _grams(value):
+                    self.postings[gram].add(index)
+    
+    def __len__(self) -> int:
+        return len(self.courses)
+    
+    def get(self, course_id: int) -> Optional[Course]:
+        return self.by_id.get(course_id)
+    
+    def _candidates(self, term: str) -> Set[int]:
+        """包含term所有二元组的课程下标（可能有误报，由打分时核对）"""
+        grams = [term] if len(term) == 1 else [term[i:i + 2] for i in range(len(term) - 1)]
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+    
+    def _score(self, index: int, term: str) -> int:
+        """term在各字段中的最高得分，0表示不匹配"""
+        best = 0
+        for field, value in self.fields[index].items():
+            position = value.find(term)
+            if position < 0:
+                continue
+            prefix_score, contains_score = FIELD_WEIGHTS[field]
+            if position == 0:
+                score = prefix_score + (20 if value == term else 0)
+            else:
+                score = contains_score
+            best = max(best, score)
+        return best
+    
+    def search(self, query: str, limit: int = None) -> List[Course]:
+        """按相关度排序的匹配课程；空格分隔的多个词需全部匹配，空查询返回全部课程"""
+        terms = [normalize(term) for term in query.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return self.courses[:limit] if limit else list(self.courses)
+        
+        candidates = None
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._candidates(term)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+        
+        scored: List[Tuple[int, int]] = []
+        for index in candidates:
+            total = 0
+            for term in terms:
+                score = self._score(index, term)
+                if not score:
+                    break
+                total += score
+            else:
+                scored.append((-total, index))
+        scored.sort()
+        if limit:
+            scored = scored[:limit]
+        return [self.courses[index] for _, index in scored]
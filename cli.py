@@ -4,13 +4,21 @@
 """
 
 import sys
+import json
 import time
+import asyncio
 import argparse
 from typing import List
 from client import HUSTCourseClient
 from course import Course
+from catalog import CourseCatalog
 from config import Config
 from utils import Logger
+from watcher import SeatWatcher
+from pacing import Pacer, create_pacer
+from ratelimit import rate_limiter
+from breaker import breakers
+from metrics import request_metrics
 
 
 def get_input(prompt: str, required: bool = True) -> str:
@@ -29,12 +37,22 @@ def print_courses(courses: List[Course]):
         return
     
     print(f"\\n共找到 {len(courses)} 门课程:")
+    print_course_header()
+    
+    for course in courses:
+        print_course_row(course)
+
+
+def print_course_header():
+    """打印课程表头"""
     print("-" * 100)
     print(f"{'ID':<8} {'代码':<12} {'课程名称':<30} {'学分':<6} {'已选/可选':<10}")
     print("-" * 100)
-    
-    for course in courses:
-        print(f"{course.course_id:<8} {course.course_code:<12} {course.course_name[:28]:<30} {course.credit:<6} {course.selected}/{course.optional:<10}")
+
+
+def print_course_row(course: Course):
+    """打印单行课程"""
+    print(f"{course.course_id:<8} {course.course_code:<12} {course.course_name[:28]:<30} {course.credit:<6} {course.selected}/{course.optional:<10}")
 
 
 def login_flow(client: HUSTCourseClient) -> bool:
@@ -89,12 +107,23 @@ def login_flow(client: HUSTCourseClient) -> bool:
 
 
 def get_courses_flow(client: HUSTCourseClient) -> List[Course]:
-    """获取课程流程"""
+    """获取课程流程（边下载边打印）"""
     print("\\n=== 获取课程列表 ===")
     
+    courses = []
     try:
         print("正在获取课程列表...")
-        courses = client.get_courses()
+        for page in client.iter_course_pages():
+            if not courses and page:
+                print_course_header()
+            for course in page:
+                print_course_row(course)
+            courses.extend(page)
+        
+        if courses:
+            print(f"\\n共找到 {len(courses)} 门课程")
+        else:
+            print("没有找到课程。")
         
         # 保存到文件
         client.save_courses_to_file(courses)
@@ -104,7 +133,7 @@ def get_courses_flow(client: HUSTCourseClient) -> List[Course]:
         
     except Exception as e:
         print(f"获取课程列表失败: {e}")
-        return []
+        return courses
 
 
 def select_course_flow(client: HUSTCourseClient, courses: List[Course]):
@@ -115,26 +144,32 @@ def select_course_flow(client: HUSTCourseClient, courses: List[Course]):
     print("\\n请选择操作:")
     print("1. 从列表选择课程")
     print("2. 直接输入课程ID")
+    print("3. 搜索课程（课程ID、代码、名称、专业或名称拼音首字母）")
     
-    choice = get_input("请输入选择 (1/2): ")
+    choice = get_input("请输入选择 (1/2/3): ")
     
     target_course = None
     
-    if choice == "1":
+    if choice in ("1", "3"):
         if not courses:
             print("没有可用的课程列表，请先获取课程。")
             return
         
-        # 显示课程列表
-        print_courses(courses)
+        catalog = CourseCatalog(courses)
+        if choice == "3":
+            # 按相关度显示匹配的课程
+            matches = catalog.search(get_input("请输入搜索内容: "))
+            print_courses(matches)
+            if not matches:
+                return
+        else:
+            # 显示课程列表
+            print_courses(courses)
         
         while True:
             try:
                 course_id = int(get_input("\\n请输入要选择的课程ID: "))
-                for course in courses:
-                    if course.course_id == course_id:
-                        target_course = course
-                        break
+                target_course = catalog.get(course_id)
                 
                 if target_course:
                     break
@@ -204,30 +239,137 @@ def select_course_flow(client: HUSTCourseClient, courses: List[Course]):
         
         print(f"\\n开始自动选课...")
         print(f"目标课程: {target_course.course_name} (ID: {target_course.course_id})")
-        print(f"选课间隔: {Config.TIME_INTERVAL}秒")
+        print(f"选课间隔: {Config.TIME_INTERVAL}秒" + ("（自适应）" if Config.ADAPTIVE_PACING else ""))
         print("按 Ctrl+C 停止\\n")
         
         attempt_count = 0
+        pacer = create_pacer(Config.TIME_INTERVAL, Config.ADAPTIVE_PACING, on_change=print)
+        notice = rate_limiter.fit_rate("select", 1.0 / max(Config.TIME_INTERVAL, 0.01))
+        if notice:
+            print(notice)
         
         try:
-            while True:
+            while pacer.begin():
                 attempt_count += 1
-                start_time = time.time()
+                outcome = client.try_select_course(target_course)
+                pacer.end(outcome)
                 
-                try:
-                    success = client.select_course(target_course)
-                    if success:
-                        print(f"\\n选课成功！尝试次数: {attempt_count}")
-                        break
-                except Exception as e:
-                    end_time = time.time()
-                    elapsed = end_time - start_time
-                    print(f"第{attempt_count}次尝试失败: {e}, 耗时: {elapsed:.3f}s")
+                if outcome.ok:
+                    print(f"\\n选课成功！尝试次数: {attempt_count}")
+                    break
                 
-                time.sleep(Config.TIME_INTERVAL)
+                print(f"第{attempt_count}次尝试失败: {outcome}, 耗时: {outcome.latency:.3f}s")
+                if outcome.should_stop:
+                    print("无法继续选课，已停止。")
+                    break
                 
         except KeyboardInterrupt:
             print(f"\\n用户停止了自动选课。总尝试次数: {attempt_count}")
+        
+        print(f"节奏统计: {pacer.describe()}")
+        if pacer.controller is not None:
+            print(pacer.controller.describe())
+
+
+def watch_course_flow(client: HUSTCourseClient, targets: List[Course], interval: float = None):
+    """空位监控流程：轮询余量，哪门课程有空位就选哪门，全部选上或无法继续时结束"""
+    interval = interval or Config.WATCH_INTERVAL
+    watcher = SeatWatcher(client)
+    pacer = Pacer(interval)
+    remaining = {course.course_id: course for course in targets}
+    attempt_count = 0
+    
+    print(f"\\n开始监控课程余量: 课程ID {', '.join(map(str, remaining))}，每 {interval} 秒检查一次")
+    print("按 Ctrl+C 停止\\n")
+    
+    try:
+        while remaining and pacer.begin():
+            try:
+                changed, vacant, missing = watcher.poll(list(remaining))
+            except Exception as e:
+                print(f"获取课程余量失败: {e}")
+                pacer.end(factor=Config.BACKOFF_FACTOR)
+                continue
+            pacer.end()
+            
+            # 课程可能在监控期间下架，找不到的课程不再监控，避免之后每次都翻完整个课程列表
+            if missing:
+                print(f"课程列表中找不到以下课程，已停止监控: {', '.join(map(str, missing))}")
+                for course_id in missing:
+                    remaining.pop(course_id, None)
+            
+            for course in changed:
+                print(f"[{time.strftime('%H:%M:%S')}] 余量变化: {course.course_name} {course.selected}/{course.optional}")
+            
+            for course in vacant:
+                target_course = remaining.get(course.course_id)
+                if target_course is None:
+                    continue
+                attempt_count += 1
+                outcome = client.try_select_course(target_course)
+                if outcome.ok:
+                    print(f"\\n选课成功: 课程ID {course.course_id}，总尝试次数: {attempt_count}")
+                    del remaining[course.course_id]
+                    continue
+                print(f"第{attempt_count}次尝试失败: 课程ID {course.course_id} - {outcome}, 耗时: {outcome.latency:.3f}s")
+                if outcome.should_stop:
+                    print("无法继续选课，已停止。")
+                    return
+        
+        if not remaining and attempt_count:
+            print("所有课程已选上。")
+    
+    except KeyboardInterrupt:
+        print(f"\\n用户停止了空位监控。总尝试次数: {attempt_count}")
+
+
+def placeholder_course(course_id: int) -> Course:
+    """只知道课程ID时构造的课程对象"""
+    return Course(
+        course_id=course_id,
+        course_code="",
+        course_name=f"课程{course_id}",
+        semester_name="",
+        major="",
+        optional=0,
+        selected=0,
+        c_start_date="",
+        c_end_date="",
+        status=0,
+        credit="",
+        credit_hour="",
+        chosen=0,
+        choosable=0
+    )
+
+
+def async_grab_flow(client: HUSTCourseClient, targets: List[Course], interval: float = None):
+    """用异步客户端同时抢多门课程"""
+    course_ids = ", ".join(str(course.course_id) for course in targets)
+    print(f"\\n开始异步抢课: 课程ID {course_ids}")
+    print("按 Ctrl+C 停止\\n")
+    
+    def log_callback(course, message):
+        prefix = f"[{course.course_id}] " if course is not None else ""
+        print(f"{prefix}{message}")
+    
+    async def run():
+        async_client = client.create_async_client()
+        try:
+            return await async_client.grab_many(targets, interval, callback=log_callback)
+        finally:
+            await async_client.close()
+    
+    try:
+        results = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\\n用户停止了异步抢课。")
+        return
+    
+    print("\\n抢课结果:")
+    for result in results:
+        state = "成功" if result.success else f"未成功（{result.last_outcome}）"
+        print(f"课程ID {result.course.course_id}: {state}, 尝试次数: {result.attempts}")
 
 
 def main():
@@ -235,11 +377,30 @@ def main():
     parser = argparse.ArgumentParser(description="华科选课助手命令行版本")
     parser.add_argument("--gui", action="store_true", help="启动GUI版本")
     parser.add_argument("--get-courses", action="store_true", help="获取课程列表")
-    parser.add_argument("--course-id", type=int, help="直接指定课程ID进行选课")
+    parser.add_argument("--course-id", type=int, nargs="+", help="直接指定课程ID进行选课（可指定多个）")
     parser.add_argument("--token", type=str, help="使用指定Token登录")
     parser.add_argument("--interval", type=float, help="设置选课间隔", default=Config.TIME_INTERVAL)
+    parser.add_argument("--watch", action="store_true",
+                        help="空位监控模式：配合--course-id使用，监控所有指定课程，有空位时才选课")
+    parser.add_argument("--adaptive", action="store_true", help="自适应间隔：服务器拥塞时放慢，恢复后回到设定间隔")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="使用异步客户端，在一个事件循环中同时抢所有指定课程（指定多个课程时自动启用）")
+    parser.add_argument("--base-url", type=str, help="服务器地址，如本地模拟服务器 http://127.0.0.1:8080")
+    parser.add_argument("--record", type=str, metavar="FILE", help="把所有请求和响应录制到JSONL文件（令牌和密码会被隐去）")
+    parser.add_argument("--replay", type=str, metavar="FILE",
+                        help="用录制文件代替网络重放一次会话（配合--token任意值），选课和监控间隔按0处理以尽快跑完")
+    parser.add_argument("--replay-realtime", action="store_true", help="回放时按录制的耗时等待，并保留设定的间隔")
+    parser.add_argument("--metrics-file", type=str, metavar="FILE", help="退出时把各接口的耗时统计写入JSON文件")
     
     args = parser.parse_args()
+    if args.watch and args.async_mode:
+        parser.error("--watch 与 --async 不能同时使用：空位监控只在有空位时选课，异步模式持续发送选课请求")
+    if (args.record or args.replay) and not args.watch and (args.async_mode or len(args.course_id or []) > 1):
+        # 异步客户端不经过requests会话，录制和回放都无法生效
+        parser.error("--record/--replay 不支持异步抢课：不能与 --async 或多个 --course-id 同时使用（--watch 除外）")
+    
+    if args.base_url:
+        Config.set_base_url(args.base_url)
     
     # 如果指定了GUI参数，启动GUI版本
     if args.gui:
@@ -251,12 +412,29 @@ def main():
     print("=" * 50)
     
     # 初始化客户端
+    rate_limiter.set_subsystem("命令行")
+    breakers.add_listener(print)
     client = HUSTCourseClient()
     courses = []
+    replay = None
+    if args.record:
+        client.record_to(args.record)
+        print(f"正在录制请求到: {args.record}")
+    if args.replay:
+        replay = client.replay_from(args.replay, realtime=args.replay_realtime)
+        rate_limiter.enabled = False  # 回放不访问服务器，无需限流
+        if not args.replay_realtime:
+            # 回放的响应与等待时长无关，不必按真实间隔等待
+            args.interval = 0
+            Config.WATCH_INTERVAL = 0
+            Config.AIMD_CLOSED_INTERVAL = 0
+        print(f"正在回放: {args.replay}")
     
     try:
         # 设置间隔
         Config.TIME_INTERVAL = args.interval
+        if args.adaptive:
+            Config.ADAPTIVE_PACING = True
         
         # 登录
         if args.token:
@@ -274,29 +452,21 @@ def main():
         # 获取课程列表
         if args.get_courses or args.course_id is None:
             courses = get_courses_flow(client)
-            if courses:
-                print_courses(courses)
         
         # 如果指定了课程ID，直接选课
         if args.course_id:
-            target_course = Course(
-                course_id=args.course_id,
-                course_code="",
-                course_name=f"课程{args.course_id}",
-                semester_name="",
-                major="",
-                optional=0,
-                selected=0,
-                c_start_date="",
-                c_end_date="",
-                status=0,
-                credit="",
-                credit_hour="",
-                chosen=0,
-                choosable=0
-            )
+            targets = [placeholder_course(course_id) for course_id in args.course_id]
+            target_course = targets[0]
+            
+            if args.watch:
+                watch_course_flow(client, targets)
+                return
+            
+            if args.async_mode or len(targets) > 1:
+                async_grab_flow(client, targets, args.interval)
+                return
             
-            print(f"\\n开始自动选课: 课程ID {args.course_id}")
+            print(f"\\n开始自动选课: 课程ID {target_course.course_id}")
             attempt_count = 0
             stop_requested = False
             
@@ -325,8 +495,6 @@ def main():
             
             if choice == "1":
                 courses = get_courses_flow(client)
-                if courses:
-                    print_courses(courses)
             
             elif choice == "2":
                 select_course_flow(client, courses)
@@ -339,6 +507,17 @@ def main():
                 print("无效的选择，请重新输入。")
     
     finally:
+        print()
+        print("请求统计:")
+        print(rate_limiter.describe())
+        print("请求耗时:")
+        print(request_metrics.describe())
+        if args.metrics_file:
+            with open(args.metrics_file, 'w', encoding='utf-8') as f:
+                json.dump(request_metrics.snapshot(), f, ensure_ascii=False, indent=2)
+            print(f"耗时统计已保存到: {args.metrics_file}")
+        if replay is not None:
+            print(replay.describe())
         client.close()
 
 
@@ -2,12 +2,18 @@
 主客户端类，整合所有功能
 """
 
+import contextvars
 import requests
-import time
+import threading
 import yaml
-from typing import List, Optional
+from typing import List, Optional, Iterator
 from auth import AuthManager
-from course import CourseManager, Course
+from course import CourseManager, Course, SelectOutcome, SelectStatus
+from clock import ServerClock
+from pacing import create_pacer
+from ratelimit import rate_limiter
+from breaker import breakers
+from api import create_session, mount_adapter, pool_adapter_kwargs, request_timeout
 from config import Config
 
 
@@ -15,13 +21,14 @@ class HUSTCourseClient:
     """NCC选课客户端"""
     
     def __init__(self):
-        self.session = requests.Session()
+        self.session = create_session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         })
         
         self.auth_manager = AuthManager(self.session)
         self.course_manager = CourseManager(self.session)
+        self.clock = ServerClock(self.session)
     
     def get_captcha(self):
         """获取验证码"""
@@ -51,10 +58,18 @@ class HUSTCourseClient:
         """注销登录"""
         return self.auth_manager.logout()
     
+    def ping(self) -> requests.Response:
+        """发送一次低优先级的保活请求"""
+        return self.auth_manager.ping()
+    
     def get_courses(self) -> List[Course]:
         """获取课程列表"""
         return self.course_manager.get_courses()
     
+    def iter_course_pages(self, page_size: int = None) -> Iterator[List[Course]]:
+        """按页流式获取课程列表"""
+        return self.course_manager.iter_course_pages(page_size)
+    
     def save_courses_to_file(self, courses: List[Course], filename: str = None):
         """保存课程列表到文件"""
         if filename is None:
@@ -119,61 +134,148 @@ class HUSTCourseClient:
         """选择课程"""
         return self.course_manager.select_course(course)
     
-    def auto_select_course(self, course: Course, callback=None, stop_flag=None) -> bool:
-        """自动选课（持续尝试）"""
+    def try_select_course(self, course: Course) -> SelectOutcome:
+        """选择课程，返回结构化结果而不抛出异常"""
+        return self.course_manager.try_select_course(course)
+    
+    def resolve_class_number(self, course: Course, refresh: bool = False) -> str:
+        """获取课堂编号（优先使用缓存）"""
+        return self.course_manager.resolve_class_number(course, refresh)
+    
+    def prefetch_class_numbers(self, courses: List[Course]) -> dict:
+        """预先解析课堂编号，返回获取失败的课程"""
+        return self.course_manager.prefetch_class_numbers(courses)
+    
+    def invalidate_class_number(self, course: Course):
+        """丢弃课堂编号缓存"""
+        self.course_manager.invalidate_class_number(course)
+    
+    def auto_select_course(self, course: Course, callback=None, stop_flag=None, adaptive: bool = None) -> bool:
+        """自动选课（持续尝试）；adaptive为True时根据服务器状况自动调整间隔"""
+        # 等待限流令牌时也检查停止标志，停止后不再发出排队中的请求
+        with rate_limiter.stopping(stop_flag):
+            return self._auto_select(course, callback, stop_flag, adaptive)
+    
+    def _auto_select(self, course: Course, callback, stop_flag, adaptive: Optional[bool]) -> bool:
         success = False
         attempt_count = 0
         
-        while not success:
-            # 检查停止标志
-            if stop_flag and stop_flag():
-                if callback:
-                    callback("用户停止了自动选课")
-                return False
-            
-            attempt_count += 1
-            start_time = time.time()
-            
-            try:
-                success = self.select_course(course)
-                if success:
+        # 提前解析课堂编号，第一次尝试只需一次往返
+        try:
+            self.resolve_class_number(course)
+        except Exception as e:
+            if callback:
+                callback(f"预取课堂编号失败: {str(e)}")
+        
+        if adaptive is None:
+            adaptive = Config.ADAPTIVE_PACING
+        pacer = create_pacer(Config.TIME_INTERVAL, adaptive, on_change=callback)
+        notice = rate_limiter.fit_rate("select", 1.0 / max(Config.TIME_INTERVAL, 0.01))
+        if notice and callback:
+            callback(notice)
+        if callback:
+            breakers.add_listener(callback)
+        
+        try:
+            while not success:
+                # 等到下一个计划时刻，期间检查停止标志
+                if not pacer.begin(stop_flag=stop_flag):
+                    if callback:
+                        callback("用户停止了自动选课")
+                    return False
+                
+                attempt_count += 1
+                outcome = self.try_select_course(course)
+                pacer.end(outcome)
+                if outcome.status == SelectStatus.CANCELLED:
+                    continue
+                
+                if outcome.ok:
+                    success = True
                     if callback:
                         callback(f"选课成功！尝试次数: {attempt_count}")
                     break
-            except Exception as e:
-                end_time = time.time()
-                elapsed = end_time - start_time
                 
                 if callback:
-                    callback(f"第{attempt_count}次尝试失败: {str(e)}, 耗时: {elapsed:.3f}s")
+                    callback(f"第{attempt_count}次尝试失败: {outcome}, 耗时: {outcome.latency:.3f}s")
                 
-                # 检查停止标志
-                if stop_flag and stop_flag():
+                if outcome.should_stop:
                     if callback:
-                        callback("用户停止了自动选课")
+                        callback(f"无法继续选课: {outcome}")
                     return False
-                
-                # 短暂延迟后重试
-                time.sleep(Config.TIME_INTERVAL)
+        finally:
+            if callback:
+                breakers.remove_listener(callback)
+            if callback and pacer.attempts:
+                callback(f"节奏统计: {pacer.describe()}")
+                if pacer.controller is not None:
+                    callback(pacer.controller.describe())
         
         return success
     
     def get_time_diff(self) -> float:
-        """获取客户端与服务器的时间差"""
+        """获取客户端与服务器的时间差（客户端 - 服务器）"""
         try:
-            client_time = time.time()
-            response = self.session.get(f"{Config.BASE_URL}/student/index", timeout=Config.REQUEST_TIMEOUT)
-            
-            if 'Date' in response.headers:
-                server_time_str = response.headers['Date']
-                server_time = time.mktime(time.strptime(server_time_str, '%a, %d %b %Y %H:%M:%S %Z'))
-                return client_time - server_time
-            else:
-                raise Exception("无法获取服务器时间")
-                
+            offset, _ = self.clock.sync()
+            return -offset
         except Exception as e:
             raise Exception(f"获取时间差失败: {str(e)}")
     
+    def warm_connections(self, count: int = None) -> int:
+        """并发发起轻量请求，预先建立连接池中的连接，返回成功的请求数"""
+        count = count or Config.WARMUP_CONNECTIONS
+        results = []
+        
+        def ping():
+            try:
+                rate_limiter.acquire("clock")
+                response = self.session.get(Config.CLOCK_SYNC_URL, timeout=request_timeout("clock"))
+                results.append(response.ok)
+            except requests.RequestException:
+                results.append(False)
+        
+        # 子线程沿用调用方的子系统标记
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(ping,), daemon=True)
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(results)
+    
+    def sync_clock(self, samples: int = None) -> ServerClock:
+        """同步服务器时钟"""
+        self.clock.sync(samples)
+        return self.clock
+    
+    def record_to(self, path: str):
+        """把之后所有同步请求和响应录制到JSONL文件"""
+        from recording import RecordingAdapter
+        
+        return mount_adapter(self.session, RecordingAdapter(path, **pool_adapter_kwargs()))
+    
+    def replay_from(self, path: str, realtime: bool = False):
+        """用录制文件代替网络，之后的同步请求都返回录制的响应"""
+        from recording import ReplayAdapter, restore_elapsed
+        
+        adapter = ReplayAdapter(path, realtime=realtime)
+        mount_adapter(self.session, adapter)
+        self.session.hooks["response"].append(restore_elapsed)
+        return adapter
+    
+    def create_async_client(self):
+        """创建共享令牌、课堂编号缓存和服务器时钟的异步客户端"""
+        from async_client import AsyncHUSTCourseClient
+        
+        async_client = AsyncHUSTCourseClient(
+            class_cache=self.course_manager.class_cache,
+            clock=self.clock,
+            user_agent=self.session.headers.get("User-Agent")
+        )
+        if self.auth_manager.token:
+            async_client.set_token(self.auth_manager.token)
+        return async_client
+    
     def close(self):
         """关闭会话"""
         self.session.close()
@@ -0,0 +1,281 @@
+"""
+服务器时钟同步
+
+HTTP Date头只有整秒精度，单次采样的误差可达1秒。这里对每次采样求出偏移量的
+可能区间 [服务器秒 - 接收时刻, 服务器秒 + 1 - 发送时刻]，多次采样取交集，
+并把后续请求安排在预测的服务器秒翻转时刻附近，每次采样都能把区间大约减半。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Tuple
+import requests
+from ratelimit import rate_limiter
+from api import request_timeout
+from config import Config
+
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+@dataclass
+class ClockSample:
+    """单次时钟采样"""
+    sent_at: float        # 本地发送时刻（epoch秒）
+    rtt: float            # 往返耗时（秒，perf_counter测量）
+    server_second: float  # Date头给出的服务器时间（整秒）
+    
+    @property
+    def bounds(self) -> Tuple[float, float]:
+        """此次采样给出的偏移量区间（服务器 - 本地）"""
+        return (self.server_second - (self.sent_at + self.rtt),
+                self.server_second + 1 - self.sent_at)
+
+
+class ServerClock:
+    """服务器时钟估计器"""
+    
+    def __init__(self, session: requests.Session, url: str = None):
+        self.session = session
+        self.url = url or Config.CLOCK_SYNC_URL
+        self.lock = threading.Lock()
+        
+        self.offset = 0.0  # 服务器时间 - 本地时间（秒）
+        self.uncertainty: Optional[float] = None  # 偏移量区间半宽（秒），None表示未同步
+        self.drift = 0.0  # 偏移量随时间的变化率（秒/秒）
+        self.synced_at: Optional[float] = None  # 最近一次同步的本地时刻
+        self.min_rtt: Optional[float] = None
+        self.history = deque(maxlen=Config.CLOCK_HISTORY_SIZE)  # (本地时刻, 偏移量)
+    
+    @property
+    def is_synced(self) -> bool:
+        """是否已完成同步"""
+        return self.uncertainty is not None
+    
+    def sample(self) -> ClockSample:
+        """采样一次服务器Date头"""
+        rate_limiter.acquire("clock")
+        sent_at = time.time()
+        start = time.perf_counter()
+        response = self.session.get(self.url, timeout=request_timeout("clock"), stream=True)
+        rtt = time.perf_counter() - start
+        try:
+            date_header = response.headers.get('Date')
+        finally:
+            # 读完响应体，让连接回到连接池
+            response.content
+            response.close()
+        
+        return self.make_sample(sent_at, rtt, date_header)
+    
+    def make_sample(self, sent_at: float, rtt: float, date_header: Optional[str]) -> ClockSample:
+        """由发送时刻、往返耗时和Date头构造采样"""
+        if not date_header:
+            raise Exception("无法获取服务器时间")
+        server_second = parsedate_to_datetime(date_header).timestamp()
+        
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        return ClockSample(sent_at, rtt, server_second)
+    
+    def sync(self, samples: int = None, stop_event: threading.Event = None) -> Tuple[float, float]:
+        """多次采样估计偏移量，返回 (偏移量, 区间半宽)"""
+        samples = samples or Config.CLOCK_SYNC_SAMPLES
+        sync_round = SyncRound(self)
+        
+        try:
+            for i in range(samples):
+                if i > 0:
+                    delay = sync_round.next_delay()
+                    if stop_event is not None:
+                        if stop_event.wait(delay):
+                            break
+                    else:
+                        time.sleep(delay)
+                
+                sync_round.add(self.sample())
+        except requests.RequestException as e:
+            if sync_round.is_empty:
+                raise Exception(f"网络请求失败: {str(e)}")
+        
+        return sync_round.finish()
+    
+    def _delay_to_rollover(self, offset: float) -> float:
+        """计算距离下一次合适的发送时刻还有多久"""
+        half_rtt = (self.min_rtt or 0.0) / 2
+        now = time.time()
+        boundary = math.floor(now + offset) + 1
+        send_at = boundary - offset - half_rtt
+        while send_at - now < Config.CLOCK_MIN_SAMPLE_GAP:
+            send_at += 1
+        return send_at - now
+    
+    def _update(self, offset: float, uncertainty: float):
+        """记录新的偏移量估计并更新漂移率"""
+        with self.lock:
+            now = time.time()
+            self.history.append((now, offset))
+            self.offset = offset
+            self.uncertainty = uncertainty
+            self.synced_at = now
+            self.drift = self._estimate_drift()
+    
+    def _estimate_drift(self) -> float:
+        """对历史偏移量做最小二乘拟合求漂移率"""
+        if len(self.history) < 2:
+            return 0.0
+        
+        first_time = self.history[0][0]
+        if self.history[-1][0] - first_time < Config.CLOCK_DRIFT_MIN_SPAN:
+            return 0.0
+        
+        xs = [t - first_time for t, _ in self.history]
+        ys = [offset for _, offset in self.history]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x == 0:
+            return 0.0
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        return max(-Config.CLOCK_MAX_DRIFT, min(Config.CLOCK_MAX_DRIFT, slope))
+    
+    def offset_at(self, local_time: float = None) -> float:
+        """给定本地时刻的偏移量（含漂移修正）"""
+        with self.lock:
+            if self.synced_at is None:
+                return self.offset
+            if local_time is None:
+                local_time = time.time()
+            return self.offset + self.drift * (local_time - self.synced_at)
+    
+    def confidence_interval(self, local_time: float = None) -> Tuple[float, float]:
+        """偏移量的置信区间"""
+        offset = self.offset_at(local_time)
+        uncertainty = self.uncertainty if self.uncertainty is not None else math.inf
+        return offset - uncertainty, offset + uncertainty
+    
+    def now(self) -> float:
+        """当前服务器时间（epoch秒）"""
+        local_time = time.time()
+        return local_time + self.offset_at(local_time)
+    
+    def now_datetime(self) -> datetime:
+        """当前服务器时间（北京时间，不带时区信息）"""
+        return datetime.fromtimestamp(self.now(), BEIJING_TZ).replace(tzinfo=None)
+    
+    def describe(self) -> str:
+        """同步状态描述"""
+        if not self.is_synced:
+            return "未同步"
+        return (f"偏移 {self.offset * 1000:+.1f}ms ±{self.uncertainty * 1000:.1f}ms, "
+                f"漂移 {self.drift * 1e6:+.1f}ppm, RTT {self.min_rtt * 1000:.1f}ms")
+
+
+class SyncRound:
+    """一轮同步：对多次采样的偏移量区间求交集
+    
+    采样方式（线程或协程）由调用方决定，这里只负责区间合并和安排下一次采样时刻。
+    """
+    
+    def __init__(self, clock: ServerClock):
+        self.clock = clock
+        self.lower = -math.inf
+        self.upper = math.inf
+    
+    @property
+    def is_empty(self) -> bool:
+        """是否还没有有效采样"""
+        return math.isinf(self.lower)
+    
+    def add(self, sample: ClockSample):
+        """合并一次采样"""
+        lo, hi = sample.bounds
+        if max(self.lower, lo) > min(self.upper, hi):
+            # 网络抖动或时钟跳变导致区间不相交，从这次采样重新开始
+            self.lower, self.upper = lo, hi
+        else:
+            self.lower, self.upper = max(self.lower, lo), min(self.upper, hi)
+    
+    def next_delay(self) -> float:
+        """距离下一次采样还需等待的秒数：让请求到达服务器的时刻落在预测的秒翻转处"""
+        return self.clock._delay_to_rollover((self.lower + self.upper) / 2)
+    
+    def finish(self) -> Tuple[float, float]:
+        """把本轮结果写入时钟，返回 (偏移量, 区间半宽)"""
+        if self.is_empty:
+            raise Exception("时钟同步被中断")
+        self.clock._update((self.lower + self.upper) / 2, (self.upper - self.lower) / 2)
+        return self.clock.offset, self.clock.uncertainty
+
+
+class OneShotTimer:
+    """单次高精度定时器
+    
+    目标时刻以服务器时间给出。远离目标时按粗粒度休眠，每一步都根据最新的时钟偏移
+    重新换算成单调时钟的截止时刻；最后几毫秒改为自旋等待，避免线程调度带来的延迟。
+    """
+    
+    def __init__(self, target_time: float, callback: Callable[[], None], clock: ServerClock = None,
+                 spin_window: float = None):
+        self.target_time = target_time  # 目标时刻（服务器时间，epoch秒）
+        self.callback = callback
+        self.clock = clock
+        self.spin_window = Config.TIMER_SPIN_WINDOW if spin_window is None else spin_window
+        
+        self.cancel_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.fired = False
+        self.fire_error: Optional[float] = None  # 实际触发时刻 - 目标时刻（秒，单调时钟测量）
+    
+    def start(self):
+        """启动定时器"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def cancel(self):
+        """取消定时器"""
+        self.cancel_event.set()
+    
+    @property
+    def is_pending(self) -> bool:
+        """是否仍在等待触发"""
+        return self.thread is not None and self.thread.is_alive() and not self.cancel_event.is_set()
+    
+    def remaining(self) -> float:
+        """距离目标时刻还有多少秒"""
+        return self.target_time - self._server_now()
+    
+    def _server_now(self) -> float:
+        """当前服务器时间"""
+        if self.clock is not None:
+            return self.clock.now()
+        return time.time()
+    
+    def _deadline(self) -> float:
+        """把目标时刻换算为perf_counter截止时刻"""
+        return time.perf_counter() + self.remaining()
+    
+    def _run(self):
+        """等待并触发"""
+        # 粗粒度休眠，每一步重新换算，吸收时钟偏移更新和系统时间跳变
+        while True:
+            remaining = self._deadline() - time.perf_counter()
+            if remaining <= self.spin_window:
+                break
+            if self.cancel_event.wait(min(remaining - self.spin_window, Config.TIMER_COARSE_STEP)):
+                return
+        
+        # 最后一段自旋等待
+        deadline = self._deadline()
+        while time.perf_counter() < deadline:
+            if self.cancel_event.is_set():
+                return
+            time.sleep(0)
+        
+        self.fire_error = time.perf_counter() - deadline
+        self.fired = True
+        self.callback()
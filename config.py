@@ -2,8 +2,11 @@
 配置文件
 """
 
+import os
+
+
 class Config:
-    # API 基础URL
+    # API 基础URL（可用环境变量 NCC_BASE_URL 或 Config.set_base_url 指向其他服务器，如本地模拟服务器）
     BASE_URL = "http://222.20.126.201"
     
     # API端点
@@ -15,19 +18,149 @@ class Config:
     COURSES_URL = f"{BASE_URL}/dev-api/xuanke/course/student/"
     CLASS_URL = f"{BASE_URL}/dev-api/xuanke/class"
     SELECT_URL = f"{BASE_URL}/dev-api/xuanke/course"
+    CLOCK_SYNC_URL = f"{BASE_URL}/student/index"
+    URL_NAMES = ("CAPTCHA_URL", "LOGIN_URL", "LOGOUT_URL", "PROFILE_URL", "USER_INFO_URL",
+                 "COURSES_URL", "CLASS_URL", "SELECT_URL", "CLOCK_SYNC_URL")
     
     # 默认配置
     DEFAULT_TOKEN = ""
     DEFAULT_COURSE_ID = -1
     TIME_INTERVAL = 0.97  # 选课间隔（秒）
+    BACKOFF_FACTOR = 2.0  # 服务器出错时间隔放大倍数
+    MAX_IMMEDIATE_RETRIES = 2  # 网络错误后连续立即重试的最大次数
+    PACER_LATE_POLICY = "immediate"  # 响应晚于下一个计划时刻时：immediate 立即发起，skip 跳到下一个计划时刻
+    STOP_POLL_INTERVAL = 0.2  # 等待期间检查停止标志的间隔（秒）
+    
+    # 自适应间隔（AIMD）
+    ADAPTIVE_PACING = False  # 是否默认启用自适应间隔
+    AIMD_BACKOFF = 1.5  # 拥塞时间隔放大倍数
+    AIMD_STEP = 0.1  # 服务器正常时每次减小的间隔（秒）
+    AIMD_MAX_INTERVAL = 8.0  # 间隔上限（秒）
+    AIMD_CLOSED_INTERVAL = 3.0  # 不在选课时段时的间隔（秒）
+    AIMD_CLOSED_THRESHOLD = 3  # 连续收到几次"不在选课时段"后才改用慢速间隔
+    AIMD_LATENCY_THRESHOLD = 1.0  # 平均延迟超过此值视为拥塞（秒）
+    AIMD_LATENCY_RATIO = 3.0  # 平均延迟超过正常水平的倍数视为拥塞
+    AIMD_LATENCY_ALPHA = 0.3  # 延迟移动平均的平滑系数
+    
+    # 课程列表分页
+    COURSE_PAGE_SIZE = 100  # 每页课程数
+    COURSE_PREFETCH_WORKERS = 2  # 预取后续页面的线程数（异步客户端为同时请求的页数）
+    
+    # 定时抢课预热
+    WARMUP_LEAD = 30  # 在计划时间前多少秒开始预热
+    WARMUP_CONNECTIONS = 2  # 预先建立的连接数
+    WARMUP_KEEPALIVE_INTERVAL = 5  # 预热后到开抢前的心跳间隔（秒）
+    
+    # 连接池
+    POOL_CONNECTIONS = 4  # 缓存的主机连接池数
+    POOL_MAXSIZE = 10  # 每个主机保留的连接数，应不小于并发抢课线程数
+    POOL_BLOCK = False  # 连接用完时是否等待空闲连接（False则临时新建，用完即关闭）
+    POOL_CONNECT_RETRIES = 1  # 建立连接失败的重试次数（请求发出后不重试，避免重复选课）
+    POOL_RETRY_BACKOFF = 0.0  # 连接重试的退避系数（秒）
+    
+    # 定时抢课等待期间的心跳
+    HEARTBEAT_ENABLED = True
+    HEARTBEAT_INTERVAL = 30.0  # 保持连接的请求间隔（秒），应小于服务器的空闲连接超时
+    HEARTBEAT_TOKEN_INTERVAL = 300.0  # 检查令牌的间隔（秒）
+    
+    # 并发抢课
+    GRAB_MAX_WORKERS = 4  # 并发线程数上限
+    GRAB_GLOBAL_RATE = None  # 所有课程共享的总请求速率（次/秒），None表示与顺序模式相同
+    
+    # 请求限流（进程内所有请求共享）
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_GLOBAL = 8.0  # 总请求速率上限（次/秒）
+    RATE_LIMIT_GLOBAL_BURST = 8  # 总请求的突发上限
+    RATE_LIMITS = {  # 接口类别 -> (速率 次/秒, 突发上限)；抢课间隔或GRAB_GLOBAL_RATE更快时select自动提高并写入日志
+        "select": (4.0, 4),
+        "class": (4.0, 4),
+        "auth": (2.0, 4),
+        "clock": (4.0, 4),
+        "profile": (1.0, 2),
+        "courses": (4.0, 4)
+    }
+    RATE_LIMIT_POLL = 0.05  # 等待令牌时的最长单次休眠（秒）
+    
+    # 异步客户端
+    ASYNC_MAX_CONNECTIONS = 8  # 连接池最大并发连接数
+    ASYNC_HEARTBEAT_INTERVAL = 60  # 抢课期间保持登录的心跳间隔（秒）
+    ASYNC_CLOCK_SYNC_INTERVAL = 300  # 抢课期间重新同步服务器时钟的间隔（秒）
+    
+    # 空位监控
+    WATCH_INTERVAL = 2.0  # 余量检查间隔（秒）
+    WATCH_PAGE_SIZE = 500  # 监控时每页课程数，尽量一次请求拿到全部
+    
+    # 服务器时钟同步
+    CLOCK_SYNC_SAMPLES = 6  # 每次同步的采样次数
+    CLOCK_MIN_SAMPLE_GAP = 0.05  # 两次采样的最小间隔（秒）
+    CLOCK_HISTORY_SIZE = 32  # 用于估计漂移的历史同步次数
+    CLOCK_DRIFT_MIN_SPAN = 60  # 估计漂移所需的最短历史跨度（秒）
+    CLOCK_MAX_DRIFT = 1e-3  # 漂移率上限（秒/秒）
+    
+    # 定时器
+    TIMER_SPIN_WINDOW = 0.02  # 目标时刻前改为自旋等待的时长（秒）
+    TIMER_COARSE_STEP = 1.0  # 粗粒度休眠的最长单步（秒）
+    
+    # 课堂编号缓存
+    CLASS_NUMBER_TTL = 6 * 3600  # 缓存有效期（秒）
+    CLASS_NUMBER_REJECT_KEYWORDS = ("课堂", "班级", "classNumber")  # 服务器拒绝课堂编号时消息中的关键字
     
     # 文件配置
     COURSE_LIST_FILE = "course_list.yaml"
     CONFIG_FILE = "user_config.yaml"
+    CLASS_NUMBER_CACHE_FILE = "class_number_cache.json"
+    QUEUE_FILE = "course_queue.json"
+    
+    # 日志窗口配置
+    LOG_DIR = "logs"  # 日志文件目录
+    LOG_MAX_LINES = 2000  # 日志窗口保留的最近行数
+    LOG_PAGE_LINES = 500  # 每次"加载更早"读回的行数
+    LOG_MAX_LOADED_LINES = 10000  # 读回的更早日志在窗口中最多保留的行数
+    LOG_FILE_MAX_BYTES = 5 * 1024 * 1024  # 单个日志文件的大小上限
+    LOG_FILE_BACKUPS = 5  # 轮转保留的日志文件数
+    
+    # 抢课队列持久化
+    QUEUE_FLUSH_INTERVAL = 0.5  # 日志最长写入间隔（秒）
+    QUEUE_FLUSH_SIZE = 64  # 缓冲区累积多少条事件立即写入
+    QUEUE_COMPACT_THRESHOLD = 500  # 日志累积多少条事件后压缩为快照
     
     # 请求超时时间
-    REQUEST_TIMEOUT = 10
+    REQUEST_TIMEOUT = 10  # 读取超时（秒）
+    CONNECT_TIMEOUT = 3.05  # 连接超时（秒）
+    HOT_PATH_ENDPOINTS = ("select", "class")  # 选课热路径上的接口类别
+    HOT_CONNECT_TIMEOUT = 1.0  # 热路径连接超时（秒）
+    HOT_READ_TIMEOUT = 3.0  # 热路径读取超时（秒）
+    
+    # 熔断器（每个接口类别一个）
+    BREAKER_ENABLED = True
+    BREAKER_WINDOW = 10  # 统计失败率的最近请求数
+    BREAKER_MIN_CALLS = 4  # 至少有多少次请求才判断失败率
+    BREAKER_FAILURE_RATE = 0.5  # 失败率达到此值时熔断
+    BREAKER_OPEN_TIME = 2.0  # 首次熔断时长（秒），探测失败后加倍
+    BREAKER_MAX_OPEN_TIME = 30.0  # 熔断时长上限（秒）
+    BREAKER_JITTER = 0.3  # 熔断时长的随机抖动比例
+    BREAKER_PROBE_WAIT = 0.5  # 探测请求进行中时其他请求的建议等待时间（秒）
+    
+    # 请求耗时统计（对数分桶直方图）
+    METRICS_MIN_VALUE = 0.0001  # 最小分桶边界（秒）
+    METRICS_MAX_VALUE = 60.0  # 最大分桶边界（秒）
+    METRICS_BUCKETS_PER_DOUBLING = 4  # 每翻一倍的桶数，桶宽约19%
     
     # GUI配置
     WINDOW_WIDTH = 1120
     WINDOW_HEIGHT = 955
+    SEARCH_DEBOUNCE_MS = 150  # 搜索框停止输入多久后执行查询（毫秒）
+    UI_FPS = 20  # 工作线程界面更新的合并帧率（每秒执行次数）
+    QUEUE_AGE_REFRESH_MS = 1000  # 抢课队列"距上次"列的刷新间隔（毫秒）
+    
+    @classmethod
+    def set_base_url(cls, base_url: str):
+        """切换服务器地址并重新生成所有接口地址（需在创建客户端之前调用）"""
+        base_url = base_url.rstrip("/")
+        for name in cls.URL_NAMES:
+            setattr(cls, name, base_url + getattr(cls, name)[len(cls.BASE_URL):])
+        cls.BASE_URL = base_url
+
+
+if os.environ.get("NCC_BASE_URL"):
+    Config.set_base_url(os.environ["NCC_BASE_URL"])
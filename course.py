@@ -2,10 +2,21 @@
 课程相关功能模块
 """
 
+import contextvars
 import json
+import math
+import os
+import threading
+import time
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterator, Tuple
 from dataclasses import dataclass
+from enum import Enum
+from api import ApiManager
+from breaker import CircuitOpenError
+from ratelimit import RequestCancelled
+from metrics import request_metrics
 from config import Config
 
 
@@ -30,54 +41,302 @@ class Course:
     
     def __str__(self):
         return f"[{self.course_id}] {self.course_name} - {self.course_code}"
+    
+    @classmethod
+    def from_api(cls, course_data: dict) -> 'Course':
+        """从接口返回的行数据创建"""
+        return cls(
+            course_id=course_data.get("courseId"),
+            course_code=course_data.get("courseCode", ""),
+            course_name=course_data.get("courseName", ""),
+            semester_name=course_data.get("semesterName", ""),
+            major=course_data.get("major", ""),
+            optional=course_data.get("optional", 0),
+            selected=course_data.get("selected", 0),
+            c_start_date=course_data.get("cStartDate", ""),
+            c_end_date=course_data.get("cEndDate", ""),
+            status=course_data.get("status", 0),
+            credit=course_data.get("credit", ""),
+            credit_hour=course_data.get("creditHour", ""),
+            chosen=course_data.get("chosen", 0),
+            choosable=course_data.get("choosable", 0)
+        )
+
+
+class SelectStatus(Enum):
+    """选课结果类型"""
+    SUCCESS = "success"                  # 选课成功
+    CAPACITY_FULL = "capacity_full"      # 人数已满
+    NOT_IN_WINDOW = "not_in_window"      # 不在选课时段
+    TOKEN_EXPIRED = "token_expired"      # 登录失效
+    CLASS_REJECTED = "class_rejected"    # 课堂编号被拒绝
+    CLASS_UNRESOLVED = "class_unresolved"  # 无法获取课堂编号
+    INVALID_COURSE = "invalid_course"    # 课程ID无效
+    REJECTED = "rejected"                # 服务器返回的其他错误
+    SERVER_ERROR = "server_error"        # 5xx或响应格式错误
+    TIMEOUT = "timeout"                  # 请求超时
+    NETWORK_ERROR = "network_error"      # 网络错误
+    CIRCUIT_OPEN = "circuit_open"        # 熔断中，请求未发出
+    CANCELLED = "cancelled"              # 等待限流时被停止，请求未发出
+
+
+@dataclass
+class SelectOutcome:
+    """单次选课尝试的结果"""
+    status: SelectStatus
+    code: Optional[int] = None          # 响应中的code字段
+    msg: str = ""                       # 响应中的msg字段或错误描述
+    latency: float = 0.0                # 请求耗时（秒）
+    http_status: Optional[int] = None   # HTTP状态码
+    retry_after: Optional[float] = None  # 熔断中时距离可以重试的秒数
+    
+    @property
+    def ok(self) -> bool:
+        """是否选课成功"""
+        return self.status == SelectStatus.SUCCESS
+    
+    @property
+    def should_stop(self) -> bool:
+        """继续尝试已无意义（需要用户介入）"""
+        return self.status in (SelectStatus.TOKEN_EXPIRED, SelectStatus.INVALID_COURSE)
+    
+    @property
+    def retry_now(self) -> bool:
+        """请求未到达服务器或超时，可立即重试"""
+        return self.status in (SelectStatus.TIMEOUT, SelectStatus.NETWORK_ERROR)
+    
+    @property
+    def should_back_off(self) -> bool:
+        """服务器过载，应放慢请求"""
+        return self.status == SelectStatus.SERVER_ERROR
+    
+    def __str__(self):
+        if self.status == SelectStatus.SUCCESS:
+            return "选课成功"
+        if self.status == SelectStatus.CAPACITY_FULL:
+            return "选课人数已达上限"
+        if self.status == SelectStatus.NOT_IN_WINDOW:
+            return "不在选课时段范围内"
+        if self.status == SelectStatus.TOKEN_EXPIRED:
+            return f"登录已失效: {self.msg}"
+        if self.status in (SelectStatus.TIMEOUT, SelectStatus.NETWORK_ERROR):
+            return f"网络请求失败: {self.msg}"
+        if self.status in (SelectStatus.INVALID_COURSE, SelectStatus.CLASS_UNRESOLVED):
+            return self.msg
+        if self.status == SelectStatus.SERVER_ERROR:
+            return f"服务器错误: {self.msg}"
+        if self.status in (SelectStatus.CIRCUIT_OPEN, SelectStatus.CANCELLED):
+            return self.msg
+        return f"选课失败: {self.msg}"
+
+
+def classify_select_response(http_status: int, data: Optional[dict], latency: float) -> SelectOutcome:
+    """根据HTTP状态码和响应体判断选课结果"""
+    if http_status == 401:
+        return SelectOutcome(SelectStatus.TOKEN_EXPIRED, None, "HTTP 401", latency, http_status)
+    if http_status >= 500:
+        return SelectOutcome(SelectStatus.SERVER_ERROR, None, f"HTTP {http_status}", latency, http_status)
+    if http_status >= 400:
+        return SelectOutcome(SelectStatus.REJECTED, None, f"HTTP {http_status}", latency, http_status)
+    if not isinstance(data, dict):
+        return SelectOutcome(SelectStatus.SERVER_ERROR, None, "响应数据格式错误", latency, http_status)
+    
+    code = data.get("code")
+    msg = data.get("msg", "未知错误")
+    if code == 200:
+        status = SelectStatus.SUCCESS
+    elif code == 401:
+        status = SelectStatus.TOKEN_EXPIRED
+    elif msg == "选课人数已达上限！":
+        status = SelectStatus.CAPACITY_FULL
+    elif msg == "不在选课时段范围内！":
+        status = SelectStatus.NOT_IN_WINDOW
+    elif is_class_number_rejection(msg):
+        status = SelectStatus.CLASS_REJECTED
+    else:
+        status = SelectStatus.REJECTED
+    return SelectOutcome(status, code, msg, latency, http_status)
+
+
+def parse_course_page(data: dict) -> Tuple[List[Course], int]:
+    """解析课程列表响应，返回(课程列表, 总数)"""
+    if data.get("code") != 200:
+        raise Exception(f"获取课程列表失败: {data.get('msg', '未知错误')}")
+    
+    courses = [Course.from_api(course_data) for course_data in data.get("rows", [])]
+    return courses, data.get("total", len(courses))
+
+
+def parse_class_number(data: dict) -> str:
+    """解析班级列表响应，返回第一个课堂编号"""
+    if data.get("code") != 200:
+        raise Exception(f"获取班级信息失败: {data.get('msg', '未知错误')}")
+    
+    rows = data.get("rows", [])
+    if not rows:
+        raise Exception("没有可选择的课堂")
+    
+    class_number = rows[0].get("classNumber", "")
+    if not class_number:
+        raise Exception("课堂编号为空")
+    return class_number
+
+
+def course_page_params(page_num: int, page_size: int) -> dict:
+    """课程列表请求参数"""
+    return {
+        "activeSemester": "true",
+        "chosen": "false", 
+        "choosable": "true",
+        "pageNum": page_num,
+        "pageSize": page_size
+    }
+
+
+def is_class_number_rejection(msg: str) -> bool:
+    """判断服务器消息是否表示课堂编号无效"""
+    return any(keyword in msg for keyword in Config.CLASS_NUMBER_REJECT_KEYWORDS)
+
+
+class ClassNumberCache:
+    """课堂编号缓存
+    
+    以course_id为键持久化到本地文件，条目超过TTL后失效，需要重新获取。
+    """
+    
+    def __init__(self, cache_file: str = None, ttl: float = None):
+        self.cache_file = cache_file or Config.CLASS_NUMBER_CACHE_FILE
+        self.ttl = Config.CLASS_NUMBER_TTL if ttl is None else ttl
+        self.entries: Dict[int, Tuple[str, float]] = {}  # course_id -> (classNumber, 获取时间)
+        self.lock = threading.Lock()
+        self.load()
+    
+    def get(self, course_id: int) -> Optional[str]:
+        """获取未过期的课堂编号"""
+        with self.lock:
+            entry = self.entries.get(course_id)
+            if entry is None:
+                return None
+            class_number, fetched_at = entry
+            if time.time() - fetched_at > self.ttl:
+                del self.entries[course_id]
+                return None
+            return class_number
+    
+    def put(self, course_id: int, class_number: str):
+        """写入课堂编号"""
+        with self.lock:
+            self.entries[course_id] = (class_number, time.time())
+            self.save()
+    
+    def invalidate(self, course_id: int) -> bool:
+        """使指定课程的缓存失效"""
+        with self.lock:
+            if self.entries.pop(course_id, None) is None:
+                return False
+            self.save()
+            return True
+    
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.save()
+    
+    def save(self):
+        """保存缓存到文件（调用方持有锁）"""
+        try:
+            data = {
+                str(course_id): {'class_number': class_number, 'fetched_at': fetched_at}
+                for course_id, (class_number, fetched_at) in self.entries.items()
+            }
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存课堂编号缓存失败: {e}")
+    
+    def load(self):
+        """从文件加载缓存，丢弃已过期条目"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            now = time.time()
+            self.entries = {
+                int(course_id): (item['class_number'], item['fetched_at'])
+                for course_id, item in data.items()
+                if item.get('class_number') and now - item.get('fetched_at', 0) <= self.ttl
+            }
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            print(f"加载课堂编号缓存失败: {e}")
+            self.entries = {}
 
 
-class CourseManager:
+class CourseManager(ApiManager):
     """课程管理器"""
     
-    def __init__(self, session: requests.Session):
-        self.session = session
+    def __init__(self, session: requests.Session, class_cache: ClassNumberCache = None):
+        super().__init__(session)
+        self.class_cache = class_cache or ClassNumberCache()
     
     def get_courses(self) -> List[Course]:
-        """获取可选课程列表"""
+        """获取可选课程列表（全部分页）"""
+        return list(self.iter_courses())
+    
+    def iter_courses(self, page_size: int = None) -> Iterator[Course]:
+        """逐条流式获取可选课程"""
+        for page in self.iter_course_pages(page_size):
+            yield from page
+    
+    def iter_course_pages(self, page_size: int = None) -> Iterator[List[Course]]:
+        """按页流式获取可选课程
+        
+        先请求第一页读取total，调用方处理当前页时在后台线程池中预取后续页面。
+        """
+        page_size = page_size or Config.COURSE_PAGE_SIZE
+        courses, total = self._fetch_course_page(1, page_size)
+        yield courses
+        
+        page_count = math.ceil(total / page_size) if total else 1
+        if page_count <= 1 or not courses:
+            return
+        
+        workers = max(1, Config.COURSE_PREFETCH_WORKERS)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="course-prefetch")
+        pending = []
+        next_page = 2
+        try:
+            while next_page <= page_count or pending:
+                # 保持最多 workers 个页面在途
+                while next_page <= page_count and len(pending) < workers:
+                    # 预取线程沿用调用方的子系统标记
+                    context = contextvars.copy_context()
+                    pending.append(executor.submit(context.run, self._fetch_course_page, next_page, page_size))
+                    next_page += 1
+                
+                courses, _ = pending.pop(0).result()
+                if not courses:
+                    break
+                yield courses
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def _fetch_course_page(self, page_num: int, page_size: int) -> Tuple[List[Course], int]:
+        """获取单页课程，返回(课程列表, 总数)"""
         url = Config.COURSES_URL
-        params = {
-            "activeSemester": "true",
-            "chosen": "false", 
-            "choosable": "true",
-            "pageNum": 1,
-            "pageSize": 100
-        }
+        params = course_page_params(page_num, page_size)
         
         try:
-            response = self.session.get(url, params=params, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("GET", url, "courses", params=params)
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"获取课程列表失败: {data.get('msg', '未知错误')}")
-            
-            courses = []
-            for course_data in data.get("rows", []):
-                course = Course(
-                    course_id=course_data.get("courseId"),
-                    course_code=course_data.get("courseCode", ""),
-                    course_name=course_data.get("courseName", ""),
-                    semester_name=course_data.get("semesterName", ""),
-                    major=course_data.get("major", ""),
-                    optional=course_data.get("optional", 0),
-                    selected=course_data.get("selected", 0),
-                    c_start_date=course_data.get("cStartDate", ""),
-                    c_end_date=course_data.get("cEndDate", ""),
-                    status=course_data.get("status", 0),
-                    credit=course_data.get("credit", ""),
-                    credit_hour=course_data.get("creditHour", ""),
-                    chosen=course_data.get("chosen", 0),
-                    choosable=course_data.get("choosable", 0)
-                )
-                courses.append(course)
-            
-            return courses
+            return parse_course_page(response.json())
             
         except requests.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
@@ -85,26 +344,16 @@ class CourseManager:
             raise Exception("响应数据格式错误")
     
     def get_course_class_number(self, course: Course) -> str:
-        """获取课程班级编号"""
+        """获取课程班级编号（请求服务器并写入缓存）"""
         url = f"{Config.CLASS_URL}/{course.course_id}/student"
         
         try:
-            response = self.session.get(url, timeout=Config.REQUEST_TIMEOUT)
+            response = self._request("GET", url, "class")
             response.raise_for_status()
             
-            data = response.json()
-            if data.get("code") != 200:
-                raise Exception(f"获取班级信息失败: {data.get('msg', '未知错误')}")
-            
-            rows = data.get("rows", [])
-            if not rows:
-                raise Exception("没有可选择的课堂")
-            
-            class_number = rows[0].get("classNumber", "")
-            if not class_number:
-                raise Exception("课堂编号为空")
-                
+            class_number = parse_class_number(response.json())
             course.course_class_number = class_number
+            self.class_cache.put(course.course_id, class_number)
             return class_number
             
         except requests.RequestException as e:
@@ -112,34 +361,91 @@ class CourseManager:
         except json.JSONDecodeError:
             raise Exception("响应数据格式错误")
     
+    def resolve_class_number(self, course: Course, refresh: bool = False) -> str:
+        """获取课堂编号，优先使用缓存"""
+        if not refresh:
+            class_number = self.class_cache.get(course.course_id)
+            if class_number:
+                course.course_class_number = class_number
+                return class_number
+        
+        return self.get_course_class_number(course)
+    
+    def prefetch_class_numbers(self, courses: List[Course]) -> Dict[int, str]:
+        """预先解析一批课程的课堂编号，返回获取失败的 {course_id: 错误信息}"""
+        errors = {}
+        for course in courses:
+            try:
+                self.resolve_class_number(course)
+            except Exception as e:
+                errors[course.course_id] = str(e)
+        return errors
+    
+    def invalidate_class_number(self, course: Course):
+        """丢弃课程的课堂编号缓存"""
+        self.class_cache.invalidate(course.course_id)
+        course.course_class_number = ""
+    
     def select_course(self, course: Course) -> bool:
-        """选课"""
+        """选课（失败时抛出异常）"""
+        outcome = self.try_select_course(course)
+        if not outcome.ok:
+            raise Exception(str(outcome))
+        return True
+    
+    def try_select_course(self, course: Course) -> SelectOutcome:
+        """选课，不抛出异常，返回结构化结果"""
         if course.course_id <= 0:
-            raise Exception("课程ID无效")
+            return SelectOutcome(SelectStatus.INVALID_COURSE, msg="课程ID无效")
         
-        if not course.course_class_number:
-            self.get_course_class_number(course)
+        try:
+            self.resolve_class_number(course)
+        except CircuitOpenError as e:
+            return SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            return SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except Exception as e:
+            return SelectOutcome(SelectStatus.CLASS_UNRESOLVED, msg=str(e))
+        
+        outcome = self._put_select(course)
+        if outcome.status != SelectStatus.CLASS_REJECTED:
+            return outcome
         
+        # 缓存的课堂编号被服务器拒绝，丢弃后重新获取一次
+        self.invalidate_class_number(course)
+        try:
+            self.resolve_class_number(course, refresh=True)
+        except CircuitOpenError as e:
+            return SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            return SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except Exception as e:
+            return SelectOutcome(SelectStatus.CLASS_UNRESOLVED, msg=str(e))
+        return self._put_select(course)
+    
+    def _put_select(self, course: Course) -> SelectOutcome:
+        """发送选课请求"""
         url = f"{Config.SELECT_URL}/{course.course_id}/select"
         params = {"classNumber": course.course_class_number}
         
+        start_time = time.perf_counter()
         try:
-            response = self.session.put(url, params=params, timeout=Config.REQUEST_TIMEOUT)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data.get("code") != 200:
-                msg = data.get("msg", "未知错误")
-                if msg == "选课人数已达上限！":
-                    raise Exception("选课人数已达上限")
-                elif msg == "不在选课时段范围内！":
-                    raise Exception("不在选课时段范围内")
-                else:
-                    raise Exception(f"选课失败: {msg}")
-            
-            return True
-            
+            response = self._request("PUT", url, "select", params=params)
+        except CircuitOpenError as e:
+            outcome = SelectOutcome(SelectStatus.CIRCUIT_OPEN, msg=str(e), retry_after=e.retry_after)
+        except RequestCancelled as e:
+            outcome = SelectOutcome(SelectStatus.CANCELLED, msg=str(e))
+        except requests.Timeout as e:
+            outcome = SelectOutcome(SelectStatus.TIMEOUT, msg=str(e), latency=time.perf_counter() - start_time)
         except requests.RequestException as e:
-            raise Exception(f"网络请求失败: {str(e)}")
-        except json.JSONDecodeError:
-            raise Exception("响应数据格式错误")
+            outcome = SelectOutcome(SelectStatus.NETWORK_ERROR, msg=str(e), latency=time.perf_counter() - start_time)
+        else:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            # 使用请求本身的耗时，不含限流等待
+            outcome = classify_select_response(response.status_code, data, response.elapsed.total_seconds())
+        
+        request_metrics.record_result("select", outcome.status.value)
+        return outcome
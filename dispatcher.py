@@ -0,0 +1,116 @@
+"""
+界面更新调度器
+
+工作线程不直接调用 root.after，而是把事件放进线程安全队列；主线程以固定帧率执行一次 after 回调，
+一次取完队列：同一日志窗口的多行合并为一次插入，重复的刷新请求（如抢课队列）合并为一次，
+带键的调用只执行最新的一个。抢课循环再快，每帧对Tk事件队列的压力也是固定的。
+"""
+
+import queue
+from typing import Callable, Dict, List, Optional
+from config import Config
+
+
+class UIDispatcher:
+    """把工作线程的界面更新合并到Tk主线程按帧执行"""
+    
+    LOG = "log"
+    REFRESH = "refresh"
+    CALL = "call"
+    
+    def __init__(self, root, fps: float = None):
+        self.root = root
+        self.interval_ms = max(1, int(1000 / (fps or Config.UI_FPS)))
+        self.events = queue.SimpleQueue()
+        self.log_sinks: Dict[str, Callable[[str], None]] = {}  # 日志名 -> 一次插入多行文本的函数
+        self.refreshers: Dict[str, Callable[[], None]] = {}  # 刷新名 -> 刷新函数
+        self.after_id = None
+        self.frames = 0  # 已执行的帧数（有事件的帧）
+        self.coalesced = 0  # 被合并掉的事件数
+    
+    def register_log(self, name: str, sink: Callable[[str], None]):
+        """注册日志窗口；sink 收到本帧所有新行拼接后的文本"""
+        self.log_sinks[name] = sink
+    
+    def register_refresh(self, name: str, callback: Callable[[], None]):
+        """注册可合并的刷新操作"""
+        self.refreshers[name] = callback
+    
+    def log(self, name: str, text: str):
+        """追加一行日志（任意线程）"""
+        self.events.put((self.LOG, name, text))
+    
+    def request(self, name: str):
+        """请求一次刷新，同一帧内的多次请求只执行一次（任意线程）"""
+        self.events.put((self.REFRESH, name, None))
+    
+    def call(self, func: Callable[[], None], key: str = None):
+        """在主线程执行func（任意线程）；给定key时同一帧内只执行该key最新的一个"""
+        self.events.put((self.CALL, key, func))
+    
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.root.after(self.interval_ms, self._tick)
+    
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+    
+    def flush(self):
+        """立即处理队列中的事件（主线程）"""
+        logs: Dict[str, List[str]] = {}
+        refreshes: Dict[str, None] = {}  # 按首次请求的顺序
+        calls: List[Callable[[], None]] = []
+        keyed: Dict[str, int] = {}  # key -> 在calls中的位置
+        count = 0
+        
+        while True:
+            try:
+                kind, name, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            if kind == self.LOG:
+                logs.setdefault(name, []).append(payload)
+            elif kind == self.REFRESH:
+                refreshes[name] = None
+            elif name is None:
+                calls.append(payload)
+            elif name in keyed:
+                calls[keyed[name]] = payload
+            else:
+                keyed[name] = len(calls)
+                calls.append(payload)
+        
+        if not count:
+            return
+        self.frames += 1
+        self.coalesced += count - len(logs) - len(refreshes) - len(calls)
+        
+        for func in calls:
+            self._run(func)
+        for name, lines in logs.items():
+            sink = self.log_sinks.get(name)
+            if sink is not None:
+                self._run(lambda: sink("".join(lines)))
+        for name in refreshes:
+            callback = self.refreshers.get(name)
+            if callback is not None:
+                self._run(callback)
+    
+    def _run(self, func: Optional[Callable[[], None]]):
+        try:
+            func()
+        except Exception as e:
+            # 单个更新出错不能让调度停下
+            print(f"界面更新出错: {e}")
+    
+    def _tick(self):
+        try:
+            self.flush()
+        finally:
+            self.after_id = self.root.after(self.interval_ms, self._tick)
+    
+    def describe(self) -> str:
+        return f"界面更新 {self.frames} 帧，合并 {self.coalesced} 个事件"
@@ -11,12 +11,37 @@ import io
 import time
 from typing import List, Optional
 from client import HUSTCourseClient
-from course import Course
+from course import Course, SelectStatus
 from config import Config
 from scheduler import CourseQueue, ScheduledCourseGrabber, CourseTask
+from ratelimit import rate_limiter
+from metrics import request_metrics
+from tableview import KeyedTreeview
+from catalog import CourseCatalog
+from dispatcher import UIDispatcher
+from logview import RingLogView
+from utils import format_elapsed
 from datetime import datetime, timedelta
 
 
+# 抢课队列"最近结果"列的简短说明
+OUTCOME_LABELS = {
+    SelectStatus.SUCCESS: "成功",
+    SelectStatus.CAPACITY_FULL: "已满",
+    SelectStatus.NOT_IN_WINDOW: "未开放",
+    SelectStatus.TOKEN_EXPIRED: "登录失效",
+    SelectStatus.CLASS_REJECTED: "课堂被拒",
+    SelectStatus.CLASS_UNRESOLVED: "无课堂编号",
+    SelectStatus.INVALID_COURSE: "课程无效",
+    SelectStatus.REJECTED: "被拒绝",
+    SelectStatus.SERVER_ERROR: "服务器错误",
+    SelectStatus.TIMEOUT: "超时",
+    SelectStatus.NETWORK_ERROR: "网络错误",
+    SelectStatus.CIRCUIT_OPEN: "熔断中",
+    SelectStatus.CANCELLED: "已停止"
+}
+
+
 class CourseSelectionGUI:
     """选课系统GUI"""
     
@@ -39,6 +64,8 @@ class CourseSelectionGUI:
         
         # 数据存储
         self.courses: List[Course] = []
+        self.catalog = CourseCatalog()  # 课程搜索索引，课程加载时重建
+        self.filter_after_id = None  # 搜索框防抖的after任务
         self.selected_course: Optional[Course] = None
         self.captcha_uuid: Optional[str] = None
         self.auto_select_running = False
@@ -50,9 +77,22 @@ class CourseSelectionGUI:
         self.scheduler = ScheduledCourseGrabber(self.client, self.course_queue)
         self.courses_loaded = False  # 是否已加载课程列表
         
+        # 工作线程的界面更新统一经调度器按帧合并执行
+        self.dispatcher = UIDispatcher(self.root)
+        
         # 创建界面
         self.create_widgets()
         
+        self.dispatcher.register_log("auto", self.auto_log.append)
+        self.dispatcher.register_log("scheduled", self.scheduled_log.append)
+        self.dispatcher.register_refresh("queue", self.update_queue_display)
+        self.dispatcher.register_refresh("queue_count", self.update_queue_count)
+        self.dispatcher.start()
+        
+        # 队列表格由任务变化事件驱动更新，"距上次"列由定时器只刷新可见行
+        self.course_queue.add_listener(self.on_queue_event)
+        self.queue_age_after_id = self.root.after(Config.QUEUE_AGE_REFRESH_MS, self.refresh_queue_ages)
+        
         # 绑定关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
@@ -450,6 +490,10 @@ class CourseSelectionGUI:
         # 绑定选择事件和右键菜单
         self.course_tree.bind("<<TreeviewSelect>>", self.on_course_select)
         self.course_tree.bind("<Button-3>", self.show_course_context_menu)
+        self.course_tree.tag_configure("in_queue", background="lightgreen")
+        
+        # 以course_id维护行，更新和过滤时只改动变化的行
+        self.course_rows = KeyedTreeview(self.course_tree)
         
         # 底部信息框架
         info_frame = ctk.CTkFrame(self.course_tab)
@@ -494,7 +538,16 @@ class CourseSelectionGUI:
             width=300,
             height=35
         )
-        self.interval_entry.pack(pady=(0, 20))
+        self.interval_entry.pack(pady=(0, 10))
+        
+        # 自适应间隔
+        self.adaptive_var = tk.BooleanVar(value=Config.ADAPTIVE_PACING)
+        adaptive_check = ctk.CTkCheckBox(
+            settings_frame,
+            text="自适应间隔（服务器拥塞时放慢，恢复后回到设定间隔）",
+            variable=self.adaptive_var
+        )
+        adaptive_check.pack(pady=(0, 20))
         
         # 控制按钮框架（居中）
         control_frame = ctk.CTkFrame(self.auto_select_tab)
@@ -536,16 +589,40 @@ class CourseSelectionGUI:
         # 日志文本框
         self.log_textbox = ctk.CTkTextbox(log_frame, height=200)
         self.log_textbox.pack(fill="both", expand=True, padx=15, pady=(0, 15))
+        self.auto_log = RingLogView(self.log_textbox, "auto_select")
+        
+        log_btn_frame = ctk.CTkFrame(log_frame, fg_color="transparent")
+        log_btn_frame.pack(pady=(0, 15))
         
         # 清空日志按钮
         clear_log_btn = ctk.CTkButton(
-            log_frame,
+            log_btn_frame,
             text="清空日志",
             width=100,
             height=30,
             command=self.clear_log
         )
-        clear_log_btn.pack(pady=(0, 15))
+        clear_log_btn.pack(side="left", padx=5)
+        
+        # 耗时统计按钮
+        metrics_btn = ctk.CTkButton(
+            log_btn_frame,
+            text="耗时统计",
+            width=100,
+            height=30,
+            command=self.show_request_metrics
+        )
+        metrics_btn.pack(side="left", padx=5)
+        
+        # 加载更早日志按钮
+        older_log_btn = ctk.CTkButton(
+            log_btn_frame,
+            text="加载更早",
+            width=100,
+            height=30,
+            command=lambda: self.load_older_log(self.auto_log)
+        )
+        older_log_btn.pack(side="left", padx=5)
     
     def create_scheduled_tab(self):
         """创建定时选课选项卡"""
@@ -672,6 +749,50 @@ class CourseSelectionGUI:
         )
         self.freq_entry.pack(side="left", padx=(0, 10))
         
+        ctk.CTkLabel(freq_frame, text="提前预热(秒):").pack(side="left", padx=(10, 5))
+        self.warmup_entry = ctk.CTkEntry(
+            freq_frame,
+            placeholder_text=str(Config.WARMUP_LEAD),
+            width=60
+        )
+        self.warmup_entry.pack(side="left", padx=(0, 10))
+        
+        # 空位监控模式
+        self.watch_mode_var = tk.BooleanVar(value=False)
+        watch_mode_check = ctk.CTkCheckBox(
+            time_frame,
+            text="空位监控模式（有空位时才选课）",
+            variable=self.watch_mode_var
+        )
+        watch_mode_check.pack(anchor="w", padx=20, pady=(5, 5))
+        
+        # 并发模式
+        self.worker_mode_var = tk.BooleanVar(value=False)
+        worker_mode_check = ctk.CTkCheckBox(
+            time_frame,
+            text="并发模式（每门课独立节奏，共享总速率）",
+            variable=self.worker_mode_var
+        )
+        worker_mode_check.pack(anchor="w", padx=20, pady=(0, 5))
+        
+        # 异步模式
+        self.async_mode_var = tk.BooleanVar(value=False)
+        async_mode_check = ctk.CTkCheckBox(
+            time_frame,
+            text="异步模式（所有课程在一个事件循环中同时进行）",
+            variable=self.async_mode_var
+        )
+        async_mode_check.pack(anchor="w", padx=20, pady=(0, 5))
+        
+        # 自适应间隔
+        self.scheduled_adaptive_var = tk.BooleanVar(value=Config.ADAPTIVE_PACING)
+        scheduled_adaptive_check = ctk.CTkCheckBox(
+            time_frame,
+            text="自适应间隔（根据服务器延迟和错误率调整）",
+            variable=self.scheduled_adaptive_var
+        )
+        scheduled_adaptive_check.pack(anchor="w", padx=20, pady=(0, 10))
+        
         # 控制按钮
         control_frame = ctk.CTkFrame(left_frame)
         control_frame.pack(fill="x", padx=10, pady=5)
@@ -725,6 +846,35 @@ class CourseSelectionGUI:
         )
         self.current_time_label.pack(pady=2, padx=10)
         
+        # 服务器时钟同步
+        clock_frame = ctk.CTkFrame(status_display_frame)
+        clock_frame.pack(pady=2, padx=10)
+        
+        self.clock_status_label = ctk.CTkLabel(
+            clock_frame,
+            text="时钟: 未同步",
+            font=ctk.CTkFont(size=11)
+        )
+        self.clock_status_label.pack(side="left", padx=(5, 5))
+        
+        sync_clock_btn = ctk.CTkButton(
+            clock_frame,
+            text="校准",
+            width=50,
+            height=24,
+            command=self.sync_server_clock
+        )
+        sync_clock_btn.pack(side="left", padx=(0, 5))
+        
+        usage_btn = ctk.CTkButton(
+            clock_frame,
+            text="请求统计",
+            width=70,
+            height=24,
+            command=self.show_request_usage
+        )
+        usage_btn.pack(side="left", padx=(0, 5))
+        
         self.scheduled_status_label = ctk.CTkLabel(
             status_display_frame,
             text="状态: 未设置",
@@ -805,7 +955,7 @@ class CourseSelectionGUI:
         queue_list_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
         # 创建队列Treeview
-        queue_columns = ("优先级", "课程ID", "课程名称", "状态", "尝试次数")
+        queue_columns = ("优先级", "课程ID", "课程名称", "状态", "尝试次数", "最近耗时", "最近结果", "距上次")
         self.queue_tree = ttk.Treeview(queue_list_frame, columns=queue_columns, show="headings", height=12)
         
         # 设置列标题和宽度
@@ -814,12 +964,23 @@ class CourseSelectionGUI:
         self.queue_tree.heading("课程名称", text="课程名称")
         self.queue_tree.heading("状态", text="状态")
         self.queue_tree.heading("尝试次数", text="尝试次数")
+        self.queue_tree.heading("最近耗时", text="最近耗时")
+        self.queue_tree.heading("最近结果", text="最近结果")
+        self.queue_tree.heading("距上次", text="距上次")
         
         self.queue_tree.column("优先级", width=60)
         self.queue_tree.column("课程ID", width=80)
         self.queue_tree.column("课程名称", width=200)
-        self.queue_tree.column("状态", width=80)
-        self.queue_tree.column("尝试次数", width=80)
+        self.queue_tree.column("状态", width=70)
+        self.queue_tree.column("尝试次数", width=70)
+        self.queue_tree.column("最近耗时", width=80)
+        self.queue_tree.column("最近结果", width=80)
+        self.queue_tree.column("距上次", width=80)
+        
+        self.queue_tree.tag_configure("success", background="lightgreen")
+        self.queue_tree.tag_configure("failed", background="lightcoral")
+        self.queue_tree.tag_configure("running", background="lightyellow")
+        self.queue_rows = KeyedTreeview(self.queue_tree)
         
         # 队列滚动条
         queue_scrollbar = ttk.Scrollbar(queue_list_frame, orient="vertical", command=self.queue_tree.yview)
@@ -836,10 +997,22 @@ class CourseSelectionGUI:
         log_frame = ctk.CTkFrame(self.scheduled_tab)
         log_frame.pack(fill="x", padx=20, pady=(0, 20))
         
-        ctk.CTkLabel(log_frame, text="抢课日志:", font=ctk.CTkFont(size=14, weight="bold")).pack(pady=(10, 5), anchor="w", padx=15)
+        log_header = ctk.CTkFrame(log_frame, fg_color="transparent")
+        log_header.pack(fill="x", padx=15, pady=(10, 5))
+        
+        ctk.CTkLabel(log_header, text="抢课日志:", font=ctk.CTkFont(size=14, weight="bold")).pack(side="left")
+        
+        ctk.CTkButton(
+            log_header,
+            text="加载更早",
+            width=80,
+            height=24,
+            command=lambda: self.load_older_log(self.scheduled_log)
+        ).pack(side="right")
         
         self.scheduled_log_textbox = ctk.CTkTextbox(log_frame, height=100)
         self.scheduled_log_textbox.pack(fill="x", padx=15, pady=(0, 15))
+        self.scheduled_log = RingLogView(self.scheduled_log_textbox, "scheduled")
         
         # 设置调度器回调
         self.scheduler.set_callbacks(self.log_scheduled_message, self.update_scheduled_status)
@@ -889,7 +1062,7 @@ class CourseSelectionGUI:
         
         about_text = """NCC选课助手 v1.0 
 作者：Cormac@CSE
-        
+
 基于Python重构的NCC选课系统助手
 功能包括：课程查询、自动选课、定时选课等
 
@@ -956,6 +1129,7 @@ class CourseSelectionGUI:
                 # 切换到用户信息界面
                 self.root.after(0, self.update_user_info_display)
                 self.root.after(0, self.show_user_info)
+                self.root.after(0, self.sync_server_clock)
                 
                 messagebox.showinfo("成功", "登录成功！")
                 
@@ -966,7 +1140,7 @@ class CourseSelectionGUI:
                 self.root.after(0, lambda: self.login_btn.configure(state="normal", text="登录"))
         
         # 在新线程中执行登录
-        threading.Thread(target=login_thread, daemon=True).start()
+        threading.Thread(target=rate_limiter.tagged("登录", login_thread), daemon=True).start()
     
     def token_login(self):
         """使用Token登录"""
@@ -988,6 +1162,7 @@ class CourseSelectionGUI:
                 # 切换到用户信息界面
                 self.root.after(0, self.update_user_info_display)
                 self.root.after(0, self.show_user_info)
+                self.root.after(0, self.sync_server_clock)
                 
                 messagebox.showinfo("成功", "Token登录成功！")
                 
@@ -995,7 +1170,7 @@ class CourseSelectionGUI:
                 messagebox.showerror("错误", f"Token登录失败: {str(e)}")
         
         # 在新线程中执行Token登录
-        threading.Thread(target=token_login_thread, daemon=True).start()
+        threading.Thread(target=rate_limiter.tagged("登录", token_login_thread), daemon=True).start()
     
     def logout(self):
         """注销登录"""
@@ -1025,7 +1200,7 @@ class CourseSelectionGUI:
                 messagebox.showerror("错误", f"注销失败: {str(e)}")
         
         # 在新线程中执行注销
-        threading.Thread(target=logout_thread, daemon=True).start()
+        threading.Thread(target=rate_limiter.tagged("登录", logout_thread), daemon=True).start()
     
     def show_course_context_menu(self, event):
         """显示课程右键菜单"""
@@ -1101,8 +1276,8 @@ class CourseSelectionGUI:
         
         success = self.course_queue.add_course(course, priority)
         if success:
-            self.update_course_list()  # 更新背景色
-            self.update_queue_display()
+            self.refresh_course_row(course)  # 更新背景色
+            self.scheduler.prepare_class_numbers()
             messagebox.showinfo("成功", f"已添加 {course.course_name} 到抢课队列")
         else:
             messagebox.showwarning("警告", "该课程已在抢课队列中")
@@ -1111,19 +1286,15 @@ class CourseSelectionGUI:
         """从抢课队列移除课程"""
         success = self.course_queue.remove_course(course.course_id)
         if success:
-            self.update_course_list()  # 更新背景色
-            self.update_queue_display()
+            self.refresh_course_row(course)  # 更新背景色
             messagebox.showinfo("成功", f"已从抢课队列移除 {course.course_name}")
         else:
             messagebox.showwarning("警告", "该课程不在抢课队列中")
     
     def adjust_priority(self, course: Course):
         """调整课程优先级"""
-        current_priority = None
-        for task in self.course_queue.get_all_tasks():
-            if task.course.course_id == course.course_id:
-                current_priority = task.priority
-                break
+        task = self.course_queue.get_task(course.course_id)
+        current_priority = task.priority if task else None
         
         if current_priority is None:
             messagebox.showwarning("警告", "该课程不在抢课队列中")
@@ -1135,7 +1306,6 @@ class CourseSelectionGUI:
         
         success = self.course_queue.update_priority(course.course_id, new_priority)
         if success:
-            self.update_queue_display()
             messagebox.showinfo("成功", f"已更新 {course.course_name} 的优先级为 {new_priority}")
     
     def get_priority_input(self, current_priority=1):
@@ -1191,14 +1361,24 @@ class CourseSelectionGUI:
         
         def get_courses_thread():
             try:
-                courses = self.client.get_courses()
+                courses = []
+                
+                # 逐页显示，首屏只需一次往返
+                for page in self.client.iter_course_pages():
+                    courses.extend(page)
+                    loaded_count = len(courses)
+                    self.root.after(0, lambda page=page: self.append_course_rows(page))
+                    self.root.after(0, lambda n=loaded_count: self.course_info_label.configure(
+                        text=f"正在获取课程... 已加载 {n} 门"
+                    ))
+                
+                self.catalog = CourseCatalog(courses)
                 self.courses = courses
                 
                 # 保存到文件
                 self.client.save_courses_to_file(courses)
                 
                 # 更新UI
-                self.root.after(0, self.update_course_list)
                 self.root.after(0, lambda: self.course_info_label.configure(
                     text=f"共获取到 {len(courses)} 门课程"
                 ))
@@ -1206,75 +1386,70 @@ class CourseSelectionGUI:
                 # 标记课程已加载并重建队列
                 self.courses_loaded = True
                 self.course_queue.rebuild_from_courses(courses)
-                self.root.after(0, self.update_queue_display)
+                self.root.after(0, self.update_course_list)
+                self.scheduler.prepare_class_numbers()
                 
                 messagebox.showinfo("成功", f"成功获取 {len(courses)} 门课程")
                 
             except Exception as e:
                 messagebox.showerror("错误", f"获取课程列表失败: {str(e)}")
         
-        threading.Thread(target=get_courses_thread, daemon=True).start()
+        threading.Thread(target=rate_limiter.tagged("课程列表", get_courses_thread), daemon=True).start()
+    
+    def course_row(self, course: Course):
+        """课程在列表中的 (键, 列值, 标签)；在抢课队列中的课程背景为绿色"""
+        values = (
+            course.course_id,
+            course.course_code,
+            course.course_name,
+            course.semester_name,
+            course.major,
+            course.credit,
+            f"{course.selected}/{course.optional}"
+        )
+        tags = ("in_queue",) if self.course_queue.contains_course(course.course_id) else ()
+        return course.course_id, values, tags
     
     def update_course_list(self):
-        """更新课程列表显示"""
-        # 清空现有数据
-        for item in self.course_tree.get_children():
-            self.course_tree.delete(item)
-        
-        # 添加新数据并设置背景色
-        for course in self.courses:
-            item_id = self.course_tree.insert("", "end", values=(
-                course.course_id,
-                course.course_code,
-                course.course_name,
-                course.semester_name,
-                course.major,
-                course.credit,
-                f"{course.selected}/{course.optional}"
-            ))
-            
-            # 如果课程在抢课队列中，设置背景色为绿色
-            if self.course_queue.contains_course(course.course_id):
-                # 使用tag设置背景色
-                self.course_tree.item(item_id, tags=("in_queue",))
-        
-        # 配置tag样式
-        self.course_tree.tag_configure("in_queue", background="lightgreen")
+        """更新课程列表显示（只改动变化的行）"""
+        self.course_rows.sync(self.course_row(course) for course in self.courses)
+        self.apply_course_filter()
+    
+    def refresh_course_row(self, course: Course):
+        """更新单个课程行，如加入或移出队列后的背景色"""
+        self.course_rows.upsert(*self.course_row(course))
+    
+    def clear_course_list(self):
+        """清空课程列表显示"""
+        self.course_rows.clear()
+    
+    def append_course_rows(self, courses: List[Course]):
+        """追加或更新课程行"""
+        for course in courses:
+            self.course_rows.upsert(*self.course_row(course))
     
     def filter_courses(self, event=None):
-        """过滤课程列表"""
-        search_text = self.search_entry.get().lower()
-        
-        # 清空现有显示
-        for item in self.course_tree.get_children():
-            self.course_tree.delete(item)
-        
-        # 添加过滤后的数据
-        for course in self.courses:
-            if (search_text in course.course_name.lower() or 
-                search_text in course.course_code.lower()):
-                item_id = self.course_tree.insert("", "end", values=(
-                    course.course_id,
-                    course.course_code,
-                    course.course_name,
-                    course.semester_name,
-                    course.major,
-                    course.credit,
-                    f"{course.selected}/{course.optional}"
-                ))
-                
-                # 如果课程在抢课队列中，设置背景色为绿色
-                if self.course_queue.contains_course(course.course_id):
-                    self.course_tree.item(item_id, tags=("in_queue",))
+        """搜索框输入事件：停止输入一小段时间后再查询，连续按键只查询一次"""
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(Config.SEARCH_DEBOUNCE_MS, self.apply_course_filter)
+    
+    def apply_course_filter(self):
+        """按搜索框内容过滤课程列表：匹配的行按相关度排列，其余隐藏"""
+        self.filter_after_id = None
+        search_text = self.search_entry.get().strip()
+        if not search_text:
+            self.course_rows.show(None)
+            return
         
-        # 配置tag样式
-        self.course_tree.tag_configure("in_queue", background="lightgreen")
+        self.course_rows.show(course.course_id for course in self.catalog.search(search_text))
     
     def refresh_courses(self):
         """刷新课程列表"""
         try:
             courses = self.client.load_courses_from_file()
             if courses:
+                self.catalog = CourseCatalog(courses)
                 self.courses = courses
                 self.update_course_list()
                 self.course_info_label.configure(text=f"从本地加载了 {len(courses)} 门课程")
@@ -1351,6 +1526,8 @@ class CourseSelectionGUI:
                 choosable=0
             )
         
+        adaptive = self.adaptive_var.get()
+        
         # 开始自动选课
         self.auto_select_running = True
         self.start_auto_btn.configure(state="disabled")
@@ -1360,21 +1537,20 @@ class CourseSelectionGUI:
             def log_callback(message):
                 timestamp = time.strftime("%H:%M:%S")
                 log_message = f"[{timestamp}] {message}\n"
-                self.root.after(0, lambda: self.log_textbox.insert("end", log_message))
-                self.root.after(0, lambda: self.log_textbox.see("end"))
+                self.dispatcher.log("auto", log_message)
             
             def stop_flag():
                 return not self.auto_select_running
             
             try:
                 log_callback(f"开始自动选课: {target_course.course_name} (ID: {course_id})")
-                log_callback(f"选课间隔: {Config.TIME_INTERVAL}秒")
+                log_callback(f"选课间隔: {Config.TIME_INTERVAL}秒" + ("（自适应）" if adaptive else ""))
                 
-                success = self.client.auto_select_course(target_course, log_callback, stop_flag)
+                success = self.client.auto_select_course(target_course, log_callback, stop_flag, adaptive)
                 
                 if success:
                     self.root.after(0, lambda: messagebox.showinfo("成功", "选课成功！"))
-                
+                    
             except Exception as e:
                 error_msg = f"自动选课出错: {str(e)}"
                 log_callback(error_msg)
@@ -1384,7 +1560,7 @@ class CourseSelectionGUI:
                 self.root.after(0, lambda: self.start_auto_btn.configure(state="normal"))
                 self.root.after(0, lambda: self.stop_auto_btn.configure(state="disabled"))
         
-        threading.Thread(target=auto_select_thread, daemon=True).start()
+        threading.Thread(target=rate_limiter.tagged("自动选课", auto_select_thread), daemon=True).start()
     
     def stop_auto_select(self):
         """停止自动选课"""
@@ -1392,8 +1568,7 @@ class CourseSelectionGUI:
             self.auto_select_running = False
             
             timestamp = time.strftime("%H:%M:%S")
-            self.log_textbox.insert("end", f"[{timestamp}] 正在停止自动选课...\n")
-            self.log_textbox.see("end")
+            self.auto_log.append(f"[{timestamp}] 正在停止自动选课...\n")
             
             # 立即更新按钮状态，让用户看到响应
             self.stop_auto_btn.configure(text="正在停止...", state="disabled")
@@ -1406,8 +1581,19 @@ class CourseSelectionGUI:
             self.root.after(1000, reset_buttons)  # 1秒后恢复按钮状态
     
     def clear_log(self):
-        """清空日志"""
-        self.log_textbox.delete("1.0", "end")
+        """清空日志（日志文件保留，可通过"加载更早"查看）"""
+        self.auto_log.clear()
+    
+    def load_older_log(self, view: RingLogView):
+        """从日志文件读回一页更早的日志"""
+        if not view.load_older():
+            messagebox.showinfo("提示", f"没有更早的日志可加载\n完整日志见: {view.path}")
+    
+    def show_request_metrics(self):
+        """在选课日志中输出各接口的耗时统计"""
+        timestamp = time.strftime("%H:%M:%S")
+        lines = [f"[{timestamp}] 请求耗时统计:"] + [f"  {line}" for line in request_metrics.describe().split("\n")]
+        self.auto_log.append("\n".join(lines) + "\n")
     
     def change_theme(self, theme):
         """更改主题"""
@@ -1425,15 +1611,8 @@ class CourseSelectionGUI:
             messagebox.showwarning("警告", "请输入搜索内容")
             return
         
-        # 搜索课程
-        found_courses = []
-        search_lower = search_text.lower()
-        
-        for course in self.courses:
-            if (search_lower in str(course.course_id) or
-                search_lower in course.course_name.lower() or
-                search_lower in course.course_code.lower()):
-                found_courses.append(course)
+        # 搜索课程（按相关度排序）
+        found_courses = self.catalog.search(search_text)
         
         if not found_courses:
             messagebox.showwarning("警告", "未找到匹配的课程")
@@ -1490,53 +1669,75 @@ class CourseSelectionGUI:
         cancel_btn.pack(side="right", padx=5)
     
     def update_queue_display(self):
-        """更新抢课队列显示"""
-        # 清空现有数据
-        for item in self.queue_tree.get_children():
-            self.queue_tree.delete(item)
-        
-        # 获取所有任务并显示
-        tasks = self.course_queue.get_all_tasks()
-        
-        for task in tasks:
-            # 状态文本
-            status_text = {
-                "pending": "待抢课",
-                "running": "抢课中",
-                "success": "已成功",
-                "failed": "已失败"
-            }.get(task.status, task.status)
-            
-            item_id = self.queue_tree.insert("", "end", values=(
-                task.priority,
-                task.course.course_id,
-                task.course.course_name,
-                status_text,
-                task.attempts
-            ))
-            
-            # 根据状态设置颜色
-            if task.status == "success":
-                self.queue_tree.item(item_id, tags=("success",))
-            elif task.status == "failed":
-                self.queue_tree.item(item_id, tags=("failed",))
-            elif task.status == "running":
-                self.queue_tree.item(item_id, tags=("running",))
-        
-        # 配置tag样式
-        self.queue_tree.tag_configure("success", background="lightgreen")
-        self.queue_tree.tag_configure("failed", background="lightcoral")
-        self.queue_tree.tag_configure("running", background="lightyellow")
-        
-        # 更新统计信息
-        total_count = len(tasks)
-        pending_count = len([t for t in tasks if t.status == "pending"])
-        success_count = len([t for t in tasks if t.status == "success"])
+        """按当前队列重新排列整个表格（只修改变化的行），用于加载、调整优先级等改变顺序的操作"""
+        self.queue_rows.sync(self.queue_row(task) for task in self.course_queue.get_all_tasks())
+        self.update_queue_count()
+    
+    def update_queue_count(self):
+        """更新队列统计信息"""
+        counts = self.course_queue.count_by_status()
+        total_count = len(self.course_queue)
+        pending_count = counts.get("pending", 0)
+        success_count = counts.get("success", 0)
         
         self.queue_count_label.configure(
             text=f"队列课程: {total_count} (待抢: {pending_count}, 成功: {success_count})"
         )
     
+    def on_queue_event(self, event: str, course_id: Optional[int]):
+        """队列任务变化回调（在修改队列的线程中调用）"""
+        if event in (CourseQueue.EVENT_ADD, CourseQueue.EVENT_REORDER):
+            # 新任务的位置取决于优先级，重新排列
+            self.dispatcher.request("queue")
+        else:
+            # 同一任务在一帧内的多次变化只更新一次
+            self.dispatcher.call(lambda: self.refresh_queue_row(course_id), key=f"queue:{course_id}")
+            self.dispatcher.request("queue_count")
+    
+    def refresh_queue_row(self, course_id: int):
+        """按任务的当前状态更新一行，任务已移除时删除该行"""
+        task = self.course_queue.get_task(course_id)
+        if task is None:
+            self.queue_rows.remove(course_id)
+        elif course_id in self.queue_rows.items:
+            self.queue_rows.upsert(*self.queue_row(task))
+    
+    def refresh_queue_ages(self):
+        """刷新可见行的"距上次"列"""
+        keys = self.queue_rows.visible
+        if keys:
+            first, last = self.queue_tree.yview()
+            start = int(first * len(keys))
+            end = min(len(keys), int(last * len(keys)) + 1)
+            for course_id in keys[start:end]:
+                self.refresh_queue_row(course_id)
+        self.queue_age_after_id = self.root.after(Config.QUEUE_AGE_REFRESH_MS, self.refresh_queue_ages)
+    
+    def queue_row(self, task: CourseTask):
+        """任务在队列表格中的 (键, 列值, 标签)"""
+        # 状态文本
+        status_text = {
+            "pending": "待抢课",
+            "running": "抢课中",
+            "success": "已成功",
+            "failed": "已失败"
+        }.get(task.status, task.status)
+        
+        values = (
+            task.priority,
+            task.course.course_id,
+            task.course.course_name,
+            status_text,
+            task.attempts,
+            f"{task.last_latency * 1000:.0f}ms" if task.last_latency is not None else "-",
+            OUTCOME_LABELS.get(task.last_outcome, "-"),
+            format_elapsed((datetime.now() - task.last_attempt).total_seconds()) if task.last_attempt else "-"
+        )
+        
+        # 根据状态设置颜色
+        tags = (task.status,) if task.status in ("success", "failed", "running") else ()
+        return task.course.course_id, values, tags
+    
     def show_queue_context_menu(self, event):
         """显示队列右键菜单"""
         item = self.queue_tree.identify_row(event.y)
@@ -1590,14 +1791,12 @@ class CourseSelectionGUI:
     def clear_completed_tasks(self):
         """清除已完成的任务"""
         self.course_queue.clear_completed()
-        self.update_queue_display()
         self.update_course_list()  # 更新背景色
         messagebox.showinfo("成功", "已清除已完成的任务")
     
     def reset_failed_tasks(self):
         """重置失败的任务"""
         self.course_queue.reset_failed_tasks()
-        self.update_queue_display()
         messagebox.showinfo("成功", "已重置失败任务为待处理状态")
     
     def set_scheduled_grab(self):
@@ -1627,7 +1826,8 @@ class CourseSelectionGUI:
             target_time = datetime(year, month, day, hour, minute, second)
             
             # 检查时间是否在未来
-            if target_time <= datetime.now():
+            now = self.client.clock.now_datetime() if self.client.clock.is_synced else datetime.now()
+            if target_time <= now:
                 messagebox.showwarning("警告", "计划时间必须在未来")
                 return
             
@@ -1645,7 +1845,26 @@ class CourseSelectionGUI:
             else:
                 grab_interval = 1.0
             
+            # 获取预热提前量
+            warmup_text = self.warmup_entry.get().strip()
+            if warmup_text:
+                try:
+                    warmup_lead = float(warmup_text)
+                    if warmup_lead < 0:
+                        messagebox.showwarning("警告", "预热提前量不能为负数")
+                        return
+                except ValueError:
+                    messagebox.showwarning("警告", "请输入有效的预热提前量")
+                    return
+            else:
+                warmup_lead = Config.WARMUP_LEAD
+            self.scheduler.warmup_lead = warmup_lead
+            
             # 设置定时任务
+            self.scheduler.watch_mode = self.watch_mode_var.get()
+            self.scheduler.worker_mode = self.worker_mode_var.get()
+            self.scheduler.async_mode = self.async_mode_var.get()
+            self.scheduler.adaptive = self.scheduled_adaptive_var.get()
             self.scheduler.schedule_grab(target_time, grab_interval)
             
             # 更新UI状态
@@ -1687,11 +1906,17 @@ class CourseSelectionGUI:
                 messagebox.showwarning("警告", "请输入有效的抢课间隔")
                 return
         
+        self.scheduler.watch_mode = self.watch_mode_var.get()
+        self.scheduler.worker_mode = self.worker_mode_var.get()
+        self.scheduler.async_mode = self.async_mode_var.get()
+        self.scheduler.adaptive = self.scheduled_adaptive_var.get()
         success = self.scheduler.start_immediate_grab()
         if success:
             self.start_now_btn.configure(state="disabled")
             self.stop_scheduled_btn.configure(state="normal", text="停止抢课")
-            self.scheduled_status_label.configure(text="状态: 抢课中")
+            self.scheduled_status_label.configure(
+                text="状态: 监控中" if self.scheduler.watch_mode else "状态: 抢课中"
+            )
         else:
             messagebox.showwarning("警告", "抢课已在进行中")
     
@@ -1705,15 +1930,13 @@ class CourseSelectionGUI:
                 self.start_now_btn.configure(state="normal")
                 self.stop_scheduled_btn.configure(state="disabled", text="停止抢课")
                 self.scheduled_status_label.configure(text="状态: 已停止")
-            self.update_queue_display()
         else:
             # 如果没有在抢课，说明是设置了定时但还没开始，清除定时设置
             self.clear_scheduled_timer()
     
     def clear_scheduled_timer(self):
         """清除定时设置"""
-        import schedule
-        schedule.clear()  # 清除所有定时任务
+        self.scheduler.cancel_schedule()
         
         # 重置UI状态
         self.schedule_btn.configure(state="normal")
@@ -1728,34 +1951,67 @@ class CourseSelectionGUI:
         """记录定时抢课日志"""
         timestamp = time.strftime("%H:%M:%S")
         log_message = f"[{timestamp}] {message}\n"
-        self.root.after(0, lambda: self.scheduled_log_textbox.insert("end", log_message))
-        self.root.after(0, lambda: self.scheduled_log_textbox.see("end"))
-        self.root.after(0, self.update_queue_display)  # 更新队列显示
+        self.dispatcher.log("scheduled", log_message)
     
     def update_scheduled_status(self, status):
         """更新定时抢课状态"""
-        self.root.after(0, lambda: self.scheduled_status_label.configure(text=f"状态: {status}"))
+        self.dispatcher.call(lambda: self.apply_scheduled_status(status), key="scheduled_status")
+    
+    def apply_scheduled_status(self, status):
+        """在主线程中更新定时抢课状态"""
+        self.scheduled_status_label.configure(text=f"状态: {status}")
         
         if status in ["已停止", "已完成"]:
-            self.root.after(0, lambda: self.schedule_btn.configure(state="normal"))
-            self.root.after(0, lambda: self.start_now_btn.configure(state="normal"))
-            self.root.after(0, lambda: self.stop_scheduled_btn.configure(state="disabled", text="停止抢课"))
+            self.schedule_btn.configure(state="normal")
+            self.start_now_btn.configure(state="normal")
+            self.stop_scheduled_btn.configure(state="disabled", text="停止抢课")
+    
+    def show_request_usage(self):
+        """在日志中输出各子系统的请求统计"""
+        self.log_scheduled_message("请求统计:")
+        for line in rate_limiter.describe().split("\n"):
+            self.log_scheduled_message(f"  {line}")
+        self.log_scheduled_message("请求耗时:")
+        for line in request_metrics.describe().split("\n"):
+            self.log_scheduled_message(f"  {line}")
+    
+    def sync_server_clock(self):
+        """后台同步服务器时钟"""
+        def sync_thread():
+            try:
+                self.root.after(0, lambda: self.clock_status_label.configure(text="时钟: 同步中..."))
+                clock = self.client.sync_clock()
+                description = clock.describe()
+                self.root.after(0, lambda: self.clock_status_label.configure(text=f"时钟: ±{clock.uncertainty * 1000:.0f}ms"))
+                self.log_scheduled_message(f"服务器时钟已同步: {description}")
+            except Exception as e:
+                self.root.after(0, lambda: self.clock_status_label.configure(text="时钟: 同步失败"))
+                self.log_scheduled_message(f"服务器时钟同步失败: {e}")
+        
+        threading.Thread(target=rate_limiter.tagged("时钟同步", sync_thread), daemon=True).start()
     
     def update_current_time(self):
         """更新当前时间显示"""
         try:
-            current_time = datetime.now()
+            # 同步过服务器时钟后显示服务器时间
+            if self.client.clock.is_synced:
+                current_time = self.client.clock.now_datetime()
+                source = "服务器时间"
+            else:
+                current_time = datetime.now()
+                source = "本地时间"
             time_str = current_time.strftime("%Y-%m-%d %H:%M:%S")
             
             # 添加北京时间标识
-            time_display = f"当前时间: {time_str} (北京时间)"
+            time_display = f"当前时间: {time_str} ({source})"
             
             # 如果在定时选课选项卡中，更新时间显示
             if hasattr(self, 'current_time_label'):
                 self.current_time_label.configure(text=time_display)
             
-            # 每秒更新一次时间
-            self.root.after(1000, self.update_current_time)
+            # 在整秒附近刷新，避免显示的秒数跳变不均匀
+            delay = 1000 - int(current_time.microsecond / 1000)
+            self.root.after(max(delay, 50), self.update_current_time)
             
         except Exception:
             # 如果出错，仍然继续更新
@@ -1763,7 +2019,7 @@ class CourseSelectionGUI:
     
     def use_current_time(self):
         """使用当前时间设置定时"""
-        now = datetime.now()
+        now = self.client.clock.now_datetime() if self.client.clock.is_synced else datetime.now()
         
         # 设置为当前时间
         self.year_var.set(str(now.year))
@@ -1775,7 +2031,7 @@ class CourseSelectionGUI:
         
         messagebox.showinfo("提示", f"已设置为当前时间: {now.strftime('%Y-%m-%d %H:%M:%S')}")
     
-
+    
     def on_closing(self):
         """窗口关闭事件"""
         # 检查是否有正在运行的任务
@@ -1792,6 +2048,12 @@ class CourseSelectionGUI:
                 self.scheduler.stop_grab()
         
         if should_close:
+            self.dispatcher.stop()
+            self.root.after_cancel(self.queue_age_after_id)
+            self.course_queue.remove_listener(self.on_queue_event)
+            self.auto_log.close()
+            self.scheduled_log.close()
+            self.course_queue.close()
             self.client.close()
             self.root.destroy()
     
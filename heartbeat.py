@@ -0,0 +1,135 @@
+"""
+定时抢课等待期间的保活心跳
+
+设置定时后到开抢前可能有几个小时，期间连接会被服务器按空闲超时关闭，令牌也可能失效。
+心跳以很低的频率发送轻量请求，让连接池中至少保留一条热连接，并定期检查令牌；
+预热之后到开抢前改用更短的间隔（set_interval）。
+同时统计心跳请求复用连接的比例，复用率低说明间隔超过了服务器的空闲超时。
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+import requests
+from breaker import CircuitOpenError
+from config import Config
+from ratelimit import RequestCancelled, rate_limiter
+
+
+class KeepAliveHeartbeat:
+    """保活心跳（后台线程）"""
+    
+    def __init__(self, client, interval: float = None, token_interval: float = None,
+                 on_event: Callable[[str], None] = None):
+        self.client = client
+        self.base_interval = interval or Config.HEARTBEAT_INTERVAL
+        self.interval = self.base_interval
+        self.token_interval = token_interval or Config.HEARTBEAT_TOKEN_INTERVAL
+        self.on_event = on_event  # 连接被关闭、令牌失效等事件的回调
+        
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()  # 间隔改变或停止时唤醒等待中的线程
+        self.thread: Optional[threading.Thread] = None
+        
+        self.beats = 0  # 心跳请求数
+        self.reused = 0  # 复用已有连接的次数
+        self.reconnects = 0  # 需要新建连接的次数
+        self.failures = 0  # 请求失败次数
+        self.token_ok: Optional[bool] = None  # 最近一次令牌检查结果
+        self.token_checked_at: Optional[float] = None
+    
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self):
+        """启动心跳（间隔恢复为默认值）；已在运行时不重复启动"""
+        if self.is_running and not self.stop_event.is_set():
+            return
+        self.interval = self.base_interval
+        # 每次启动使用新的停止事件，尚未退出的旧线程仍会在其请求结束后停止
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=rate_limiter.tagged("心跳", self._run, self.stop_event.is_set),
+                                       args=(self.stop_event,), daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止心跳"""
+        self.stop_event.set()
+        self.wake_event.set()
+    
+    def set_interval(self, interval: float):
+        """修改心跳间隔，正在等待的线程按新间隔重新计算下次心跳时刻"""
+        self.interval = interval
+        self.wake_event.set()
+    
+    def _run(self, stop_event: threading.Event):
+        next_token_check = time.monotonic()
+        while not stop_event.is_set():
+            if time.monotonic() >= next_token_check:
+                self.check_token()
+                next_token_check = time.monotonic() + self.token_interval
+            else:
+                self.beat()
+            last_beat = time.monotonic()
+            while not stop_event.is_set():
+                remaining = last_beat + self.interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.wake_event.wait(remaining)
+                self.wake_event.clear()
+    
+    def beat(self) -> bool:
+        """发送一次保活请求（经过熔断器和低优先级限流），返回是否成功"""
+        try:
+            response = self.client.ping()
+            ok = response.status_code < 500
+        except RequestCancelled:
+            return False
+        except (requests.RequestException, CircuitOpenError) as e:
+            self.failures += 1
+            self._emit(f"心跳请求失败: {e}")
+            return False
+        
+        self.beats += 1
+        if response.connect_time is None:
+            self.reused += 1
+        else:
+            self.reconnects += 1
+            if self.beats > 1:
+                self._emit(f"空闲连接已被服务器关闭并重新建立，可考虑缩短心跳间隔（当前 {self.interval:.0f} 秒）")
+        return ok
+    
+    def check_token(self) -> bool:
+        """检查令牌是否仍然有效（同时也保持了连接）"""
+        self.token_checked_at = time.time()
+        try:
+            self.client.get_profile()
+            valid = True
+        except Exception as e:
+            valid = False
+            if self.token_ok is not False:
+                self._emit(f"⚠️ 令牌检查失败，请在开抢前重新登录: {e}")
+        if valid and self.token_ok is False:
+            self._emit("令牌已恢复有效")
+        self.token_ok = valid
+        return valid
+    
+    def _emit(self, message: str):
+        if self.on_event:
+            self.on_event(message)
+    
+    def reuse_rate(self) -> float:
+        """心跳请求复用连接的比例"""
+        total = self.reused + self.reconnects
+        return self.reused / total if total else 0.0
+    
+    def describe(self) -> str:
+        """心跳统计"""
+        if self.token_ok is None:
+            token = "未检查"
+        else:
+            checked = time.strftime("%H:%M:%S", time.localtime(self.token_checked_at))
+            token = f"{'有效' if self.token_ok else '无效'}（{checked}检查）"
+        return (f"心跳 {self.beats} 次, 复用连接 {self.reused} / 新建 {self.reconnects} "
+                f"(复用率 {self.reuse_rate():.0%}), 失败 {self.failures} 次, 令牌{token}")
@@ -0,0 +1,143 @@
+"""
+固定行数的日志窗口
+
+每行日志先写入按大小轮转的日志文件，文本框只保留最近的若干行，超出的行从顶部删除，
+长时间运行时内存和插入耗时都不随日志总量增长。需要查看更早的日志时按页从文件中读回，
+插入到文本框顶部。
+
+文本框最早一行在文件中的位置记为"距日志末尾的字节数"：新日志只追加在末尾、轮转只是把文件改名，
+这个距离只随写入的字节数增加，因此读回一页时从该位置向前按块读取，耗时只与页大小有关。
+"""
+
+import logging
+import os
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Deque, List, Tuple
+from config import Config
+
+
+class RingLogView:
+    """只显示最近N行、完整内容写入轮转文件的日志文本框（只能在主线程调用）"""
+    
+    def __init__(self, textbox, name: str, max_lines: int = None, page_lines: int = None,
+                 max_loaded_lines: int = None, log_dir: str = None):
+        self.textbox = textbox
+        self.max_lines = max_lines or Config.LOG_MAX_LINES
+        self.page_lines = page_lines or Config.LOG_PAGE_LINES
+        self.max_loaded_lines = max_loaded_lines or Config.LOG_MAX_LOADED_LINES
+        self.capacity = self.max_lines  # 当前保留的行数，读回更早的日志后增大
+        self.shown = 0  # 文本框中的行数，这些行是文件中最新的shown行
+        self.line_bytes: Deque[int] = deque()  # 文本框中每一行在文件中占的字节数，从旧到新
+        self.top_offset = 0  # 文本框最早一行的起点距日志末尾的字节数
+        
+        log_dir = log_dir or Config.LOG_DIR
+        os.makedirs(log_dir, exist_ok=True)
+        self.path = os.path.join(log_dir, f"{name}.log")
+        self.handler = RotatingFileHandler(self.path, maxBytes=Config.LOG_FILE_MAX_BYTES,
+                                           backupCount=Config.LOG_FILE_BACKUPS, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger = logging.getLogger(f"ncc.log.{name}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self.handler)
+    
+    def append(self, text: str):
+        """追加以换行结尾的一行或多行日志"""
+        lines = text.splitlines()
+        if not lines:
+            return
+        for line in lines:
+            self.logger.info(line)
+            size = self._line_size(line)
+            self.line_bytes.append(size)
+            self.top_offset += size
+        
+        self.textbox.insert("end", "\n".join(lines) + "\n")
+        self.shown += len(lines)
+        excess = self.shown - self.capacity
+        if excess > 0:
+            self.textbox.delete("1.0", f"{excess + 1}.0")
+            self.shown = self.capacity
+            for _ in range(excess):
+                self.top_offset -= self.line_bytes.popleft()
+        self.textbox.see("end")
+    
+    @staticmethod
+    def _line_size(line: str) -> int:
+        """一行日志写入文件后占的字节数（文本模式下换行符按系统转换）"""
+        return len(line.encode("utf-8")) + len(os.linesep)
+    
+    def load_older(self) -> int:
+        """从文件读回一页更早的日志插入到顶部，返回读回的行数"""
+        room = self.max_lines + self.max_loaded_lines - self.shown
+        if room <= 0:
+            return 0
+        lines, sizes = self.read_older(self.top_offset, min(self.page_lines, room))
+        if not lines:
+            return 0
+        self.textbox.insert("1.0", "\n".join(lines) + "\n")
+        self.shown += len(lines)
+        self.line_bytes.extendleft(reversed(sizes))
+        self.top_offset += sum(sizes)
+        self.capacity = max(self.capacity, self.shown)
+        self.textbox.see("1.0")
+        return len(lines)
+    
+    def read_older(self, offset: int, count: int) -> Tuple[List[str], List[int]]:
+        """读取距日志末尾offset字节处之前的count行，返回 (各行文本, 各行字节数)，按时间顺序"""
+        self.handler.flush()
+        lines: List[str] = []
+        sizes: List[int] = []
+        for path in self._files():
+            if len(lines) >= count:
+                break
+            try:
+                size = os.path.getsize(path)
+                if offset >= size:
+                    # 起点在更早的文件中
+                    offset -= size
+                    continue
+                with open(path, "rb") as f:
+                    chunks = self._read_back(f, size - offset, count - len(lines))
+            except OSError:
+                continue
+            offset = 0
+            for chunk in chunks:
+                lines.insert(0, chunk.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+                sizes.insert(0, len(chunk))
+        return lines, sizes
+    
+    @staticmethod
+    def _read_back(f, end: int, count: int) -> List[bytes]:
+        """从文件的end位置向前按块读取，返回end之前最多count行（含换行符），从新到旧"""
+        block = max(4096, Config.LOG_PAGE_LINES * 128)
+        buffer = b""
+        pos = end
+        while pos > 0 and buffer.count(b"\n") <= count:
+            start = max(0, pos - block)
+            f.seek(start)
+            buffer = f.read(pos - start) + buffer
+            pos = start
+        
+        chunks = buffer.split(b"\n")[:-1]  # end处是一行的结尾
+        if pos > 0:
+            chunks = chunks[1:]  # 第一段可能不是完整的一行
+        return [chunk + b"\n" for chunk in reversed(chunks[-count:])]
+    
+    def _files(self) -> List[str]:
+        """当前文件和轮转出的备份文件，从新到旧"""
+        paths = [self.path] + [f"{self.path}.{i}" for i in range(1, Config.LOG_FILE_BACKUPS + 1)]
+        return [path for path in paths if os.path.exists(path)]
+    
+    def clear(self):
+        """清空文本框（文件中的日志保留）"""
+        self.textbox.delete("1.0", "end")
+        self.shown = 0
+        self.line_bytes.clear()
+        self.top_offset = 0
+        self.capacity = self.max_lines
+    
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
@@ -0,0 +1,257 @@
+"""
+请求耗时统计：按接口类别记录连接、首字节和总耗时的对数分桶直方图
+
+每个直方图的桶数固定，内存占用与请求数无关。连接耗时由 TimedHTTPAdapter 在建立新连接时测量，
+复用已有连接的请求没有连接阶段。
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import Config
+
+
+PHASES = ("connect", "ttfb", "total")
+PHASE_NAMES = {"connect": "连接", "ttfb": "首字节", "total": "总耗时"}
+
+
+class LogHistogram:
+    """对数分桶直方图（线程不安全，由调用方加锁）
+    
+    第一个桶收集小于min_value的值，最后一个桶收集大于max_value的值，
+    中间每翻一倍分为buckets_per_doubling个桶，分位数的相对误差不超过一个桶宽。
+    """
+    
+    def __init__(self, min_value: float = None, max_value: float = None, buckets_per_doubling: int = None):
+        self.min_value = min_value or Config.METRICS_MIN_VALUE
+        self.max_value = max_value or Config.METRICS_MAX_VALUE
+        self.per_doubling = buckets_per_doubling or Config.METRICS_BUCKETS_PER_DOUBLING
+        self.size = int(math.ceil(math.log2(self.max_value / self.min_value) * self.per_doubling)) + 2
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+    
+    def _index(self, value: float) -> int:
+        if value < self.min_value:
+            return 0
+        index = int(math.log2(value / self.min_value) * self.per_doubling) + 1
+        return min(index, self.size - 1)
+    
+    def _upper_bound(self, index: int) -> float:
+        """桶的上界"""
+        if index == 0:
+            return self.min_value
+        return self.min_value * 2 ** (index / self.per_doubling)
+    
+    def add(self, value: float):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+    
+    def percentile(self, p: float) -> float:
+        """估算分位数（p取0-100），返回所在桶的上界，不超过实际最大值"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+    
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+
+
+class EndpointMetrics:
+    """单个接口类别的统计"""
+    
+    def __init__(self):
+        self.histograms = {phase: LogHistogram() for phase in PHASES}
+        self.status_codes = Counter()  # HTTP状态码 -> 次数
+        self.outcomes = Counter()  # 传输层结果分类 -> 次数
+        self.results = Counter()  # 业务结果（如选课结果）-> 次数
+        self.new_connections = 0
+        self.reused_connections = 0
+
+
+class RequestMetrics:
+    """按接口类别汇总请求耗时（线程安全）"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        self.started = time.time()
+    
+    def _get(self, endpoint: str) -> EndpointMetrics:
+        """调用方持有锁"""
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = EndpointMetrics()
+            self.endpoints[endpoint] = metrics
+        return metrics
+    
+    def record(self, endpoint: str, outcome: str, total: float = None, ttfb: float = None,
+               connect: Optional[float] = None, status_code: int = None):
+        """记录一次请求；connect为None表示复用了已有连接"""
+        with self.lock:
+            metrics = self._get(endpoint)
+            metrics.outcomes[outcome] += 1
+            if status_code is not None:
+                metrics.status_codes[status_code] += 1
+            if total is not None:
+                metrics.histograms["total"].add(total)
+            if ttfb is not None:
+                metrics.histograms["ttfb"].add(ttfb)
+            if connect is not None:
+                metrics.histograms["connect"].add(connect)
+                metrics.new_connections += 1
+            elif total is not None:
+                metrics.reused_connections += 1
+    
+    def record_result(self, endpoint: str, result: str):
+        """记录业务结果，如选课结果分类"""
+        with self.lock:
+            self._get(endpoint).results[result] += 1
+    
+    def snapshot(self, endpoint: str = None) -> dict:
+        """查询统计：接口类别 -> {请求数, 状态码, 结果分类, 连接数, 各阶段分位数（秒）}"""
+        with self.lock:
+            names = [endpoint] if endpoint else sorted(self.endpoints)
+            result = {}
+            for name in names:
+                metrics = self.endpoints.get(name)
+                if metrics is None:
+                    continue
+                result[name] = {
+                    "requests": sum(metrics.outcomes.values()),
+                    "status_codes": dict(metrics.status_codes),
+                    "outcomes": dict(metrics.outcomes),
+                    "results": dict(metrics.results),
+                    "new_connections": metrics.new_connections,
+                    "reused_connections": metrics.reused_connections,
+                    "phases": {phase: histogram.summary() for phase, histogram in metrics.histograms.items()}
+                }
+            return result
+    
+    def describe(self) -> str:
+        """可读的统计文本，每个接口类别若干行"""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "无请求记录"
+        lines = []
+        for name, data in snapshot.items():
+            outcomes = ", ".join(f"{key} {count}" for key, count in sorted(data["outcomes"].items()))
+            lines.append(f"{name}: {data['requests']} 次 ({outcomes}), "
+                         f"新建连接 {data['new_connections']} / 复用 {data['reused_connections']}")
+            for phase in PHASES:
+                summary = data["phases"][phase]
+                if summary["count"]:
+                    lines.append(f"  {PHASE_NAMES[phase]}: p50 {summary['p50'] * 1000:.1f}ms, "
+                                 f"p90 {summary['p90'] * 1000:.1f}ms, p99 {summary['p99'] * 1000:.1f}ms, "
+                                 f"最大 {summary['max'] * 1000:.1f}ms")
+            if data["results"]:
+                lines.append("  结果: " + ", ".join(f"{key} {count}" for key, count in sorted(data["results"].items())))
+        return "\n".join(lines)
+    
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.started = time.time()
+
+
+def classify_exception(error: BaseException) -> str:
+    """请求异常的分类"""
+    if isinstance(error, requests.Timeout):
+        return "timeout"
+    return "network_error"
+
+
+def classify_status(status_code: int) -> str:
+    """HTTP状态码的分类"""
+    if status_code == 401:
+        return "unauthorized"
+    if status_code >= 500:
+        return "server_error"
+    if status_code >= 400:
+        return "client_error"
+    return "ok"
+
+
+# 当前线程最近一次建立连接的耗时，由计时连接写入，请求结束后读取
+_connect_timing = threading.local()
+
+
+def reset_connect_time():
+    _connect_timing.value = None
+
+
+def take_connect_time() -> Optional[float]:
+    """取出当前线程本次请求建立连接的耗时，复用连接时为None"""
+    value = getattr(_connect_timing, "value", None)
+    _connect_timing.value = None
+    return value
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_timing.value = time.perf_counter() - started
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_timing.value = time.perf_counter() - started
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """建立新连接时测量连接耗时的适配器"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool
+        }
+
+
+# 进程内共享的请求统计
+request_metrics = RequestMetrics()
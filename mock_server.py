@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+NCC选课系统本地模拟服务器
+
+实现验证码、登录、用户信息、课程列表、班级列表和选课接口，返回与真实系统相同结构的JSON
+（code / msg / rows / total / token）。可以模拟课程容量、选课时段、服务器时钟偏差、
+响应延迟分布、随机5xx和过载，用于离线开发和测试抢课策略。
+    
+    python mock_server.py --port 8080 --window-open 30
+    NCC_BASE_URL=http://127.0.0.1:8080 python cli.py
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+# 3x5点阵数字，用于生成验证码图片
+DIGIT_GLYPHS = {
+    "0": ("111", "101", "101", "101", "111"),
+    "1": ("010", "110", "010", "010", "111"),
+    "2": ("111", "001", "111", "100", "111"),
+    "3": ("111", "001", "111", "001", "111"),
+    "4": ("101", "101", "111", "001", "001"),
+    "5": ("111", "100", "111", "001", "111"),
+    "6": ("111", "100", "111", "101", "111"),
+    "7": ("111", "001", "001", "001", "001"),
+    "8": ("111", "101", "111", "101", "111"),
+    "9": ("111", "101", "111", "001", "111")
+}
+
+COURSE_NAMES = ["人工智能导论", "数据结构", "计算机网络", "操作系统", "机器学习", "数值分析", "软件工程",
+                "编译原理", "信息安全", "图像处理", "数据库系统", "分布式系统", "自然语言处理", "计算机视觉"]
+
+
+def render_captcha(code: str, scale: int = 6) -> bytes:
+    """把数字验证码渲染为灰度PNG"""
+    pad = scale
+    width = len(code) * 4 * scale - scale + pad * 2
+    height = 5 * scale + pad * 2
+    pixels = [[235] * width for _ in range(height)]
+    for index, char in enumerate(code):
+        glyph = DIGIT_GLYPHS[char]
+        left = pad + index * 4 * scale
+        for row, bits in enumerate(glyph):
+            for col, bit in enumerate(bits):
+                if bit == "1":
+                    for y in range(pad + row * scale, pad + (row + 1) * scale):
+                        for x in range(left + col * scale, left + (col + 1) * scale):
+                            pixels[y][x] = 40
+    
+    raw = b"".join(b"\x00" + bytes(row) for row in pixels)
+    
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+class LatencyModel:
+    """响应延迟分布
+    
+    规格写法: fixed:0.05 / uniform:0.02,0.2 / normal:0.1,0.03 / lognormal:-2.3,0.5 / exp:0.1（单位秒）
+    """
+    
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exp")
+    
+    def __init__(self, spec: str = "fixed:0", rng: random.Random = None):
+        kind, _, args = spec.partition(":")
+        if kind not in self.KINDS:
+            raise Exception(f"未知的延迟分布: {kind}")
+        self.kind = kind
+        self.spec = spec
+        self.args = [float(arg) for arg in args.split(",") if arg.strip()] or [0.0]
+        self.rng = rng or random.Random()
+    
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        args = self.args
+        if self.kind == "fixed":
+            value = args[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(args[0], args[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(args[0], args[1])
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(args[0], args[1])
+        else:
+            value = self.rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+@dataclass
+class MockCourse:
+    """模拟课程"""
+    course_id: int
+    course_code: str
+    course_name: str
+    capacity: int
+    selected: int
+    class_number: str
+    credit: str = "2.0"
+    credit_hour: str = "32"
+    major: str = "计算机科学与技术"
+    
+    def to_row(self, semester_name: str, chosen: bool) -> dict:
+        """课程列表中的一行"""
+        return {
+            "courseId": self.course_id,
+            "courseCode": self.course_code,
+            "courseName": self.course_name,
+            "semesterName": semester_name,
+            "major": self.major,
+            "optional": self.capacity,
+            "selected": self.selected,
+            "cStartDate": "2025-09-01",
+            "cEndDate": "2026-01-10",
+            "status": 0,
+            "credit": self.credit,
+            "creditHour": self.credit_hour,
+            "chosen": 1 if chosen else 0,
+            "choosable": 1
+        }
+
+
+class MockNCCState:
+    """模拟服务器的业务状态（线程安全）"""
+    
+    SEMESTER_NAME = "2025-2026学年第一学期"
+    
+    def __init__(self, courses: List[MockCourse], window_open: float = 0.0, window_duration: float = None,
+                 clock_offset: float = 0.0, password: str = None, captcha_enabled: bool = True):
+        self.lock = threading.Lock()
+        self.courses: Dict[int, MockCourse] = {course.course_id: course for course in courses}
+        self.clock_offset = clock_offset  # 服务器时钟 - 本地时钟（秒）
+        self.password = password  # None表示接受任意密码
+        self.captcha_enabled = captcha_enabled
+        
+        # 选课时段以服务器时间表示
+        self.window_open_at = self.server_time() + window_open
+        self.window_close_at = self.window_open_at + window_duration if window_duration else float("inf")
+        
+        self.captchas: Dict[str, str] = {}  # uuid -> 验证码
+        self.tokens: Dict[str, str] = {}  # token -> 用户名
+        self.chosen: Dict[str, Set[int]] = {}  # 用户名 -> 已选课程ID
+        self.requests: Dict[str, int] = {}  # 接口 -> 请求数
+        self.first_request_at: Dict[str, float] = {}  # 接口 -> 首次请求的服务器时间
+        self.successes: List[Tuple[str, int, float]] = []  # (用户名, 课程ID, 选课成功的服务器时间)
+    
+    @classmethod
+    def generate(cls, count: int, seed: int = 0, full_ratio: float = 0.2, **kwargs) -> 'MockNCCState':
+        """随机生成一批课程"""
+        rng = random.Random(seed)
+        courses = []
+        for index in range(count):
+            capacity = rng.randint(20, 120)
+            selected = capacity if rng.random() < full_ratio else rng.randint(0, capacity - 1)
+            courses.append(MockCourse(
+                course_id=1000 + index,
+                course_code=f"CS{2000 + index}",
+                course_name=f"{rng.choice(COURSE_NAMES)}（{index + 1}班）",
+                capacity=capacity,
+                selected=selected,
+                class_number=f"{202500 + index}{rng.randint(10, 99)}",
+                credit=rng.choice(["1.0", "2.0", "3.0", "4.0"]),
+                credit_hour=rng.choice(["16", "32", "48", "64"])
+            ))
+        return cls(courses, **kwargs)
+    
+    def server_time(self) -> float:
+        """服务器时间（epoch秒）"""
+        return time.time() + self.clock_offset
+    
+    def in_window(self) -> bool:
+        """当前是否在选课时段内"""
+        return self.window_open_at <= self.server_time() < self.window_close_at
+    
+    def count(self, endpoint: str):
+        now = self.server_time()
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.first_request_at.setdefault(endpoint, now)
+    
+    def new_captcha(self) -> Tuple[str, str]:
+        """生成验证码，返回 (uuid, 验证码)"""
+        captcha_uuid = uuid.uuid4().hex
+        code = "".join(random.choice("0123456789") for _ in range(4))
+        with self.lock:
+            self.captchas[captcha_uuid] = code
+        return captcha_uuid, code
+    
+    def login(self, username: str, password: str, code: str, captcha_uuid: str) -> Tuple[bool, str]:
+        """登录，返回 (是否成功, 令牌或错误信息)"""
+        with self.lock:
+            expected = self.captchas.pop(captcha_uuid, None)
+            if self.captcha_enabled and (expected is None or expected != code.strip()):
+                return False, "验证码错误"
+            if not username:
+                return False, "用户不存在/密码错误"
+            if self.password is not None and password != self.password:
+                return False, "用户不存在/密码错误"
+        return True, self.issue_token(username)
+    
+    def issue_token(self, username: str) -> str:
+        """直接为用户签发令牌（跳过验证码，供测试和基准使用）"""
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = username
+            self.chosen.setdefault(username, set())
+        return token
+    
+    def user_for(self, authorization: Optional[str]) -> Optional[str]:
+        """根据Authorization头找到用户"""
+        if not authorization or not authorization.startswith("Bearer "):
+            return None
+        with self.lock:
+            return self.tokens.get(authorization[len("Bearer "):].strip())
+    
+    def logout(self, authorization: Optional[str]):
+        if authorization and authorization.startswith("Bearer "):
+            with self.lock:
+                self.tokens.pop(authorization[len("Bearer "):].strip(), None)
+    
+    def list_courses(self, username: str, chosen_filter: Optional[bool], page_num: int, page_size: int) -> Tuple[List[dict], int]:
+        """分页查询课程，返回 (当前页, 总数)"""
+        with self.lock:
+            chosen = self.chosen.get(username, set())
+            courses = [course for course in sorted(self.courses.values(), key=lambda c: c.course_id)
+                       if chosen_filter is None or (course.course_id in chosen) == chosen_filter]
+            start = (page_num - 1) * page_size
+            rows = [course.to_row(self.SEMESTER_NAME, course.course_id in chosen)
+                    for course in courses[start:start + page_size]]
+            return rows, len(courses)
+    
+    def class_number(self, course_id: int) -> Optional[str]:
+        with self.lock:
+            course = self.courses.get(course_id)
+            return course.class_number if course else None
+    
+    def select(self, username: str, course_id: int, class_number: str) -> Tuple[int, str]:
+        """选课，返回 (code, msg)"""
+        if not self.in_window():
+            return 500, "不在选课时段范围内！"
+        with self.lock:
+            course = self.courses.get(course_id)
+            if course is None:
+                return 500, "课程不存在"
+            if class_number != course.class_number:
+                return 500, "课堂编号不存在"
+            chosen = self.chosen.setdefault(username, set())
+            if course_id in chosen:
+                return 500, "已选过该课程"
+            if course.selected >= course.capacity:
+                return 500, "选课人数已达上限！"
+            course.selected += 1
+            chosen.add(course_id)
+            self.successes.append((username, course_id, self.server_time()))
+            return 200, "选课成功"
+    
+    def release_seats(self, course_id: int, count: int = 1):
+        """模拟有人退课"""
+        with self.lock:
+            course = self.courses.get(course_id)
+            if course:
+                course.selected = max(0, course.selected - count)
+
+
+class MockNCCHandler(BaseHTTPRequestHandler):
+    """请求处理"""
+    
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1  # 缓冲写入，响应头和响应体一次发出，避免与延迟确认叠加出额外延迟
+    disable_nagle_algorithm = True
+    server: 'MockNCCServer'
+    
+    ROUTES = [
+        ("GET", re.compile(r"^/dev-api/captchaImage$"), "captcha"),
+        ("POST", re.compile(r"^/dev-api/login$"), "login"),
+        ("POST", re.compile(r"^/dev-api/logout$"), "logout"),
+        ("GET", re.compile(r"^/dev-api/getInfo$"), "get_info"),
+        ("GET", re.compile(r"^/dev-api/system/user/profile$"), "profile"),
+        ("GET", re.compile(r"^/dev-api/xuanke/course/student/?$"), "courses"),
+        ("GET", re.compile(r"^/dev-api/xuanke/class/(\d+)/student$"), "class_list"),
+        ("PUT", re.compile(r"^/dev-api/xuanke/course/(\d+)/select$"), "select"),
+        ("GET", re.compile(r"^/student/index$"), "index")
+    ]
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+    
+    def date_time_string(self, timestamp=None):
+        """Date头使用模拟的服务器时钟"""
+        return formatdate(self.server.state.server_time(), usegmt=True)
+    
+    def do_GET(self):
+        self._dispatch("GET")
+    
+    def do_POST(self):
+        self._dispatch("POST")
+    
+    def do_PUT(self):
+        self._dispatch("PUT")
+    
+    def _dispatch(self, method: str):
+        parts = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(parts.path)
+            if match and route_method == method:
+                self.server.state.count(name)
+                if not self.server.admit():
+                    self._send_status(503, "服务器繁忙")
+                    return
+                try:
+                    if self.server.should_fail():
+                        time.sleep(self.server.latency_for(name).sample())
+                        self._send_status(502, "Bad Gateway")
+                        return
+                    time.sleep(self.server.latency_for(name).sample())
+                    getattr(self, f"handle_{name}")(*match.groups())
+                finally:
+                    self.server.release()
+                return
+        
+        self._send_json({"code": 404, "msg": f"请求地址'{parts.path}'不存在"}, status=404)
+    
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_status(self, status: int, text: str):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _require_user(self) -> Optional[str]:
+        """校验令牌；无效时按真实系统的方式返回 code 401"""
+        username = self.server.state.user_for(self.headers.get("Authorization"))
+        if username is None:
+            self._send_json({"code": 401, "msg": f"请求访问：{urlsplit(self.path).path}，认证失败，无法访问系统资源"})
+        return username
+    
+    def _user_data(self, username: str) -> dict:
+        return {
+            "userName": username,
+            "nickName": f"模拟用户{username[-4:]}",
+            "email": f"{username}@hust.edu.cn",
+            "phonenumber": "",
+            "loginDate": time.strftime("%Y-%m-%dT%H:%M:%S+08:00"),
+            "pwdExpTime": ""
+        }
+    
+    def handle_captcha(self):
+        captcha_uuid, code = self.server.state.new_captcha()
+        if self.server.verbose:
+            print(f"验证码 {captcha_uuid[:8]}: {code}")
+        self._send_json({
+            "code": 200,
+            "msg": "操作成功",
+            "captchaEnabled": self.server.state.captcha_enabled,
+            "uuid": captcha_uuid,
+            "img": base64.b64encode(render_captcha(code)).decode("ascii")
+        })
+    
+    def handle_login(self):
+        try:
+            data = json.loads(self.body.decode("utf-8") or "{}")
+        except ValueError:
+            self._send_json({"code": 500, "msg": "请求数据格式错误"})
+            return
+        ok, result = self.server.state.login(data.get("username", ""), data.get("password", ""),
+                                             str(data.get("code", "")), data.get("uuid", ""))
+        if ok:
+            self._send_json({"code": 200, "msg": "操作成功", "token": result})
+        else:
+            self._send_json({"code": 500, "msg": result})
+    
+    def handle_logout(self):
+        self.server.state.logout(self.headers.get("Authorization"))
+        self._send_json({"code": 200, "msg": "退出成功"})
+    
+    def handle_get_info(self):
+        username = self._require_user()
+        if username is None:
+            return
+        self._send_json({
+            "code": 200,
+            "msg": "操作成功",
+            "user": self._user_data(username),
+            "roles": ["student"],
+            "permissions": []
+        })
+    
+    def handle_profile(self):
+        username = self._require_user()
+        if username is None:
+            return
+        self._send_json({
+            "code": 200,
+            "msg": "操作成功",
+            "data": self._user_data(username),
+            "roleGroup": "学生",
+            "postGroup": ""
+        })
+    
+    def handle_courses(self):
+        username = self._require_user()
+        if username is None:
+            return
+        chosen = self.query.get("chosen")
+        chosen_filter = None if chosen is None else chosen == "true"
+        try:
+            page_num = max(1, int(self.query.get("pageNum", 1)))
+            page_size = max(1, int(self.query.get("pageSize", 10)))
+        except ValueError:
+            self._send_json({"code": 500, "msg": "分页参数错误"})
+            return
+        rows, total = self.server.state.list_courses(username, chosen_filter, page_num, page_size)
+        self._send_json({"code": 200, "msg": "查询成功", "rows": rows, "total": total})
+    
+    def handle_class_list(self, course_id: str):
+        username = self._require_user()
+        if username is None:
+            return
+        class_number = self.server.state.class_number(int(course_id))
+        rows = [] if class_number is None else [{"classNumber": class_number, "courseId": int(course_id)}]
+        self._send_json({"code": 200, "msg": "查询成功", "rows": rows, "total": len(rows)})
+    
+    def handle_select(self, course_id: str):
+        username = self._require_user()
+        if username is None:
+            return
+        code, msg = self.server.state.select(username, int(course_id), self.query.get("classNumber", ""))
+        self._send_json({"code": code, "msg": msg})
+    
+    def handle_index(self):
+        body = "<!DOCTYPE html><html><head><title>NCC选课系统（模拟）</title></head><body></body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockNCCServer(ThreadingHTTPServer):
+    """模拟服务器"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), state: MockNCCState = None,
+                 latency: LatencyModel = None, select_latency: LatencyModel = None,
+                 error_rate: float = 0.0, max_inflight: int = None, verbose: bool = False):
+        super().__init__(address, MockNCCHandler)
+        self.state = state or MockNCCState.generate(30)
+        self.latency = latency or LatencyModel()
+        self.select_latency = select_latency  # None表示与其他接口相同
+        self.error_rate = error_rate  # 随机返回502的比例
+        self.max_inflight = max_inflight  # 同时处理的请求数上限，超出返回503，None表示不限
+        self.verbose = verbose
+        
+        self.inflight = 0
+        self.inflight_lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def latency_for(self, endpoint: str) -> LatencyModel:
+        if endpoint == "select" and self.select_latency is not None:
+            return self.select_latency
+        return self.latency
+    
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+    
+    def admit(self) -> bool:
+        """进入处理；超过并发上限返回False"""
+        with self.inflight_lock:
+            if self.max_inflight is not None and self.inflight >= self.max_inflight:
+                return False
+            self.inflight += 1
+            return True
+    
+    def release(self):
+        with self.inflight_lock:
+            self.inflight -= 1
+    
+    def start(self) -> 'MockNCCServer':
+        """在后台线程中运行"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """停止服务"""
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="NCC选课系统本地模拟服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    parser.add_argument("--courses", type=int, default=30, help="生成的课程数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--full-ratio", type=float, default=0.2, help="初始已满课程的比例")
+    parser.add_argument("--window-open", type=float, default=0.0, help="选课时段在启动后多少秒开放")
+    parser.add_argument("--window-duration", type=float, help="选课时段持续秒数，默认不关闭")
+    parser.add_argument("--clock-offset", type=float, default=0.0, help="服务器时钟相对本机的偏差（秒）")
+    parser.add_argument("--latency", default="fixed:0", help="响应延迟分布，如 uniform:0.02,0.2")
+    parser.add_argument("--select-latency", help="选课接口的延迟分布，默认与--latency相同")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回502的比例")
+    parser.add_argument("--max-inflight", type=int, help="同时处理的请求数上限，超出返回503")
+    parser.add_argument("--password", help="登录密码，默认接受任意密码")
+    parser.add_argument("--no-captcha", action="store_true", help="不校验验证码")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求和验证码")
+    args = parser.parse_args()
+    
+    state = MockNCCState.generate(
+        args.courses,
+        seed=args.seed,
+        full_ratio=args.full_ratio,
+        window_open=args.window_open,
+        window_duration=args.window_duration,
+        clock_offset=args.clock_offset,
+        password=args.password,
+        captcha_enabled=not args.no_captcha
+    )
+    server = MockNCCServer(
+        (args.host, args.port),
+        state=state,
+        latency=LatencyModel(args.latency),
+        select_latency=LatencyModel(args.select_latency) if args.select_latency else None,
+        error_rate=args.error_rate,
+        max_inflight=args.max_inflight,
+        verbose=args.verbose
+    )
+    
+    print(f"模拟服务器已启动: {server.base_url}")
+    print(f"课程数: {len(state.courses)}，选课时段: 启动后 {args.window_open} 秒开放")
+    print(f"使用方法: NCC_BASE_URL={server.base_url} python cli.py  或  python cli.py --base-url {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n请求统计: " + ", ".join(f"{name} {count}" for name, count in sorted(state.requests.items())))
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
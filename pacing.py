@@ -0,0 +1,282 @@
+"""
+请求节奏控制
+"""
+
+import asyncio
+import math
+import threading
+import time
+from typing import Callable, Optional
+from course import SelectStatus
+from config import Config
+
+
+class Pacer:
+    """按绝对截止时刻安排选课尝试
+    
+    第k次尝试的计划时刻为 start + k × interval（单调时钟），与每次请求的耗时无关，
+    因此实际周期不会随服务器变慢而漂移。一个Pacer对应一门课程（或一个串行循环），
+    上一次尝试结束前不允许开始下一次。
+    
+    响应晚到、已经错过下一个计划时刻时按late_policy处理：
+    - skip: 跳过错过的时刻，对齐到下一个未来的计划时刻
+    - immediate: 立即发起下一次尝试，并以此时刻重新对齐
+    """
+    
+    SKIP = "skip"
+    IMMEDIATE = "immediate"
+    
+    def __init__(self, interval: float, late_policy: str = None, controller: 'AimdController' = None):
+        self.interval = interval
+        self.controller = controller  # 自适应间隔控制器，None表示固定间隔
+        self.late_policy = late_policy or Config.PACER_LATE_POLICY
+        if self.late_policy not in (self.SKIP, self.IMMEDIATE):
+            raise Exception(f"未知的迟到处理策略: {self.late_policy}")
+        
+        self.lock = threading.Lock()
+        self.deadline: Optional[float] = None  # 下一次尝试的计划时刻（monotonic），None表示立即
+        self.in_flight = False
+        self.immediate_retries = 0  # 连续立即重试次数
+        
+        # 计时误差统计
+        self.attempts = 0
+        self.late_responses = 0  # 响应晚于下一个计划时刻的次数
+        self.skipped_slots = 0  # skip策略跳过的计划时刻数
+        self.last_error = 0.0  # 最近一次实际开始时刻 - 计划时刻（秒）
+        self.max_error = 0.0
+        self.error_sum = 0.0
+    
+    def delay(self) -> float:
+        """距离下一个计划时刻还有多少秒"""
+        if self.deadline is None:
+            return 0.0
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def _reserve(self):
+        """标记一次尝试开始等待，防止重叠"""
+        with self.lock:
+            if self.in_flight:
+                raise Exception("上一次请求尚未完成，不能开始新的尝试")
+            self.in_flight = True
+    
+    def _started(self):
+        """记录实际开始时刻与计划时刻的误差"""
+        with self.lock:
+            now = time.monotonic()
+            if self.deadline is None:
+                self.deadline = now
+            error = now - self.deadline
+            self.attempts += 1
+            self.last_error = error
+            self.max_error = max(self.max_error, error)
+            self.error_sum += error
+    
+    def begin(self, stop_event: threading.Event = None, stop_flag: Callable[[], bool] = None) -> bool:
+        """等到计划时刻并开始一次尝试；等待期间被停止返回False"""
+        self._reserve()
+        while True:
+            remaining = self.delay()
+            if (stop_flag is not None and stop_flag()) or (stop_event is not None and stop_event.is_set()):
+                self.cancel()
+                return False
+            if remaining <= 0:
+                break
+            if stop_flag is not None:
+                remaining = min(remaining, Config.STOP_POLL_INTERVAL)
+            if stop_event is not None:
+                if stop_event.wait(remaining):
+                    self.cancel()
+                    return False
+            else:
+                time.sleep(remaining)
+        
+        self._started()
+        return True
+    
+    async def begin_async(self, stop_flag: Callable[[], bool] = None) -> bool:
+        """begin的协程版本"""
+        self._reserve()
+        while True:
+            remaining = self.delay()
+            if stop_flag is not None and stop_flag():
+                self.cancel()
+                return False
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, Config.STOP_POLL_INTERVAL))
+        
+        self._started()
+        return True
+    
+    def cancel(self):
+        """放弃本次尝试（未发出请求）"""
+        with self.lock:
+            self.in_flight = False
+    
+    def end(self, outcome=None, factor: float = 1.0):
+        """结束本次尝试并安排下一个计划时刻
+        
+        outcome为SelectOutcome时按结果调整：请求未到达服务器时立即重试（连续次数有上限），
+        服务器过载时间隔放大BACKOFF_FACTOR倍；有自适应控制器时改由控制器决定间隔。
+        """
+        immediate = False
+        retry_after = None
+        if outcome is not None:
+            retry_after = outcome.retry_after
+            if self.controller is not None:
+                self.interval = self.controller.update(outcome)
+            if outcome.retry_now and self.immediate_retries < Config.MAX_IMMEDIATE_RETRIES:
+                immediate = True
+            elif outcome.should_back_off and self.controller is None:
+                factor *= Config.BACKOFF_FACTOR
+        
+        with self.lock:
+            self.in_flight = False
+            now = time.monotonic()
+            self.immediate_retries = self.immediate_retries + 1 if immediate else 0
+            if immediate:
+                self.deadline = now
+                return
+            if retry_after is not None:
+                # 熔断中：请求未发出，等到熔断器允许探测的时刻再试
+                self.deadline = now + retry_after
+                return
+            
+            base = self.deadline if self.deadline is not None else now
+            step = self.interval * factor  # 退避后跳过的时刻也按放大后的间隔排列
+            next_deadline = base + step
+            if next_deadline < now:
+                self.late_responses += 1
+                if self.late_policy == self.SKIP and step > 0:
+                    missed = math.floor((now - next_deadline) / step) + 1
+                    next_deadline += missed * step
+                    self.skipped_slots += missed
+                else:
+                    next_deadline = now
+            self.deadline = next_deadline
+    
+    def postpone(self, seconds: float):
+        """把下一个计划时刻推后"""
+        with self.lock:
+            base = self.deadline if self.deadline is not None else time.monotonic()
+            self.deadline = base + seconds
+    
+    def describe(self) -> str:
+        """计时误差统计"""
+        if not self.attempts:
+            return "尚未开始"
+        mean_error = self.error_sum / self.attempts
+        text = (f"{self.attempts} 次尝试, 计划误差 平均 {mean_error * 1000:.1f}ms / "
+                f"最大 {self.max_error * 1000:.1f}ms, 响应迟到 {self.late_responses} 次")
+        if self.skipped_slots:
+            text += f", 跳过 {self.skipped_slots} 个时刻"
+        return text
+
+
+class AimdController:
+    """自适应选课间隔（加性减小、乘性增大）
+    
+    出现拥塞信号（超时、5xx、响应延迟明显高于正常水平）时间隔乘以AIMD_BACKOFF，
+    服务器正常时每次减少AIMD_STEP，直到回到配置的最小间隔。间隔每经过一个当前间隔最多调整一次：
+    同一拥塞周期内的多个拥塞信号（如共享控制器的多个Pacer同时超时）只退避一次，恢复也不会一次连降多步。
+    连续AIMD_CLOSED_THRESHOLD次返回"不在选课时段范围内"时改用慢速间隔，选课时段开放后立即回到最小间隔；
+    开抢时刻附近偶尔的一两次时段未开放不会让节奏慢下来。多个Pacer可以共享一个控制器。
+    """
+    
+    def __init__(self, floor: float, ceiling: float = None, on_change: Callable[[str], None] = None):
+        self.floor = floor  # 配置的最小间隔
+        self.ceiling = max(ceiling or Config.AIMD_MAX_INTERVAL, floor)
+        self.on_change = on_change  # 状态变化时的回调，参数为状态描述
+        self.lock = threading.Lock()
+        
+        self.interval = floor
+        self.state = "正常"
+        self.window_open: Optional[bool] = None  # 选课时段是否开放，None表示未知
+        self.latency_avg: Optional[float] = None  # 响应延迟的指数移动平均（秒）
+        self.latency_base: Optional[float] = None  # 观察到的最低平均延迟，作为正常水平
+        self.congestion_count = 0
+        self.closed_count = 0  # 连续收到"不在选课时段"的次数
+        self.changed_at: Optional[float] = None  # 最近一次调整间隔的时刻（monotonic）
+        self.backoff_at: Optional[float] = None  # 最近一次拥塞退避的时刻（monotonic）
+    
+    def _is_congested(self, outcome) -> bool:
+        """判断结果是否为拥塞信号（调用方持有锁）"""
+        if outcome.status in (SelectStatus.TIMEOUT, SelectStatus.SERVER_ERROR):
+            return True
+        if outcome.http_status is None or self.latency_avg is None:
+            return False
+        threshold = max(Config.AIMD_LATENCY_THRESHOLD, (self.latency_base or 0.0) * Config.AIMD_LATENCY_RATIO)
+        return self.latency_avg > threshold
+    
+    def _epoch_elapsed(self, since: Optional[float], now: float) -> bool:
+        """距since是否已过了一个当前间隔（调用方持有锁）"""
+        return since is None or now - since >= self.interval
+    
+    def update(self, outcome) -> float:
+        """根据一次选课结果调整间隔，返回新的间隔"""
+        if outcome.status in (SelectStatus.CIRCUIT_OPEN, SelectStatus.CANCELLED):
+            # 请求没有发出，不反映服务器状况
+            return self.interval
+        
+        with self.lock:
+            if outcome.http_status is not None:
+                # 只统计得到HTTP响应的请求
+                alpha = Config.AIMD_LATENCY_ALPHA
+                if self.latency_avg is None:
+                    self.latency_avg = outcome.latency
+                else:
+                    self.latency_avg += alpha * (outcome.latency - self.latency_avg)
+                if self.latency_base is None or self.latency_avg < self.latency_base:
+                    self.latency_base = self.latency_avg
+            
+            now = time.monotonic()
+            state = self.state
+            if outcome.status == SelectStatus.NOT_IN_WINDOW:
+                self.closed_count += 1
+                if self.closed_count >= Config.AIMD_CLOSED_THRESHOLD:
+                    self.window_open = False
+                    self.interval = max(self.floor, Config.AIMD_CLOSED_INTERVAL)
+                    self.changed_at = now
+                    state = "等待选课时段"
+            else:
+                self.closed_count = 0
+                if self._is_congested(outcome):
+                    self.congestion_count += 1
+                    if self._epoch_elapsed(self.backoff_at, now):
+                        self.interval = min(self.ceiling, self.interval * Config.AIMD_BACKOFF)
+                        self.changed_at = self.backoff_at = now
+                    state = "拥塞退避"
+                elif self.window_open is False and outcome.http_status is not None:
+                    # 选课时段刚开放，立即回到最快节奏
+                    self.window_open = True
+                    self.interval = self.floor
+                    self.changed_at = now
+                    state = "选课时段已开放"
+                else:
+                    if self.interval > self.floor and self._epoch_elapsed(self.changed_at, now):
+                        self.interval = max(self.floor, self.interval - Config.AIMD_STEP)
+                        self.changed_at = now
+                    state = "正常" if self.interval <= self.floor else "恢复中"
+            
+            changed = state != self.state
+            self.state = state
+            interval = self.interval
+        
+        if changed and self.on_change:
+            self.on_change(self.describe())
+        return interval
+    
+    def describe(self) -> str:
+        """控制器状态描述"""
+        text = f"自适应节奏: {self.state}, 间隔 {self.interval:.2f}s"
+        if self.latency_avg is not None:
+            text += f", 平均延迟 {self.latency_avg * 1000:.0f}ms"
+        return text
+
+
+def create_pacer(interval: float, adaptive: bool = False, on_change: Callable[[str], None] = None,
+                 controller: AimdController = None) -> Pacer:
+    """创建Pacer；adaptive为True时附带自适应间隔控制器（可传入共享的控制器）"""
+    if adaptive and controller is None:
+        controller = AimdController(interval, on_change=on_change)
+    return Pacer(interval, controller=controller if adaptive else None)
@@ -0,0 +1,215 @@
+"""
+抢课队列持久化：追加写日志 + 定期快照
+
+队列的每次变更只记录为一条事件追加到内存缓冲区，由后台线程按时间或数量阈值批量写入
+日志文件。日志累积到一定条数后压缩为完整快照（写临时文件后原子替换），并清空日志。
+加载时先读快照，再按序重放日志中序号大于快照的事件。
+"""
+
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from config import Config
+
+
+class QueueJournal:
+    """队列事件日志"""
+    
+    def __init__(self, snapshot_file: str, journal_file: str = None,
+                 snapshot_provider: Callable[[], Optional[Tuple[List[dict], int]]] = None):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or f"{snapshot_file}.journal"
+        self.snapshot_provider = snapshot_provider  # 返回 (任务字典列表, 快照对应的事件序号)，未就绪时返回None
+        
+        self.flush_interval = Config.QUEUE_FLUSH_INTERVAL
+        self.flush_size = Config.QUEUE_FLUSH_SIZE
+        self.compact_threshold = Config.QUEUE_COMPACT_THRESHOLD
+        
+        self.lock = threading.Lock()  # 保护缓冲区和序号
+        self.io_lock = threading.Lock()  # 串行化文件写入
+        self.wakeup = threading.Event()
+        self.buffer: List[dict] = []
+        self.seq = 0
+        self.snapshot_seq = 0  # 最近一次快照对应的事件序号
+        self.journal_events = 0  # 日志文件中的事件数
+        self.closed = False
+        self.writer_thread: Optional[threading.Thread] = None
+        
+        # 从已有文件恢复序号，保证新事件的序号大于快照
+        _, self.seq, self.journal_events = self._read()
+        self.snapshot_seq = self.seq
+        atexit.register(self.close)
+    
+    def record(self, op: str, **fields):
+        """记录一条事件（调用方应持有队列锁，保证序号与状态一致）"""
+        with self.lock:
+            if self.closed:
+                return
+            self.seq += 1
+            event = {'seq': self.seq, 'op': op}
+            event.update(fields)
+            self.buffer.append(event)
+            should_wake = len(self.buffer) >= self.flush_size
+        
+        if self.writer_thread is None:
+            self._start_writer()
+        if should_wake:
+            self.wakeup.set()
+    
+    def _start_writer(self):
+        """启动后台写线程"""
+        with self.lock:
+            if self.writer_thread is not None:
+                return
+            self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+    
+    def _writer_loop(self):
+        """后台写线程"""
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+                if self.journal_events >= self.compact_threshold:
+                    self.compact()
+            except Exception as e:
+                print(f"保存队列失败: {e}")
+    
+    def flush(self):
+        """把缓冲区中的事件追加到日志文件"""
+        with self.io_lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        """写入缓冲区（调用方持有io_lock）"""
+        with self.lock:
+            batch = self.buffer
+            self.buffer = []
+        if not batch:
+            return
+        
+        lines = "".join(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n" for event in batch)
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_events += len(batch)
+    
+    def compact(self):
+        """写入完整快照并清空日志"""
+        if self.snapshot_provider is None:
+            return
+        
+        with self.io_lock:
+            self._flush_locked()
+            snapshot = self.snapshot_provider()
+            if snapshot is None:
+                return
+            tasks, seq = snapshot
+            if seq == self.snapshot_seq:
+                # 上次快照之后没有新事件
+                return
+            data = {
+                'tasks': tasks,
+                'seq': seq,
+                'saved_time': datetime.now().isoformat()
+            }
+            
+            tmp_file = f"{self.snapshot_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+            
+            # 日志里的事件都已写入快照；快照之后产生的事件还在缓冲区中
+            with open(self.journal_file, 'w', encoding='utf-8'):
+                pass
+            self.journal_events = 0
+            self.snapshot_seq = seq
+    
+    def close(self):
+        """停止后台线程并写入最终快照"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.wakeup.set()
+        if self.writer_thread is not None and self.writer_thread is not threading.current_thread():
+            self.writer_thread.join(timeout=5)
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"保存队列失败: {e}")
+    
+    def replay(self) -> List[dict]:
+        """读取快照并重放日志，返回任务字典列表"""
+        tasks, _, _ = self._read()
+        return tasks
+    
+    def _read(self) -> Tuple[List[dict], int, int]:
+        """读取快照和日志，返回 (任务字典列表, 最后的事件序号, 日志事件数)"""
+        tasks: Dict[int, dict] = {}
+        seq = 0
+        
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            seq = data.get('seq', 0)
+            for task_data in data.get('tasks', []):
+                tasks[task_data.get('course_id')] = task_data
+        except FileNotFoundError:
+            pass
+        
+        journal_events = 0
+        snapshot_seq = seq
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写入过程中崩溃留下的不完整行
+                        break
+                    journal_events += 1
+                    if event.get('seq', 0) <= snapshot_seq:
+                        continue
+                    apply_event(tasks, event)
+                    seq = event['seq']
+        except FileNotFoundError:
+            pass
+        
+        return list(tasks.values()), seq, journal_events
+
+
+def apply_event(tasks: Dict[int, dict], event: dict):
+    """把一条事件应用到 course_id -> 任务字典 的映射上"""
+    op = event.get('op')
+    course_id = event.get('course_id')
+    
+    if op == 'add':
+        task_data = event['task']
+        tasks[task_data['course_id']] = task_data
+    elif op == 'remove':
+        tasks.pop(course_id, None)
+    elif op == 'priority':
+        if course_id in tasks:
+            tasks[course_id]['priority'] = event['priority']
+    elif op == 'status':
+        if course_id in tasks:
+            tasks[course_id].update({
+                'status': event['status'],
+                'attempts': event['attempts'],
+                'last_attempt': event['last_attempt']
+            })
+    elif op == 'clear_completed':
+        for task_id in [task_id for task_id, data in tasks.items() if data.get('status') == 'success']:
+            del tasks[task_id]
+    elif op == 'reset_failed':
+        for data in tasks.values():
+            if data.get('status') == 'failed':
+                data['status'] = 'pending'
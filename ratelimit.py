@@ -0,0 +1,316 @@
+"""
+进程级请求限流
+
+所有发往选课系统的请求（同步会话、异步客户端、时钟采样）都先在这里取令牌：
+每个接口类别有自己的令牌桶，另有一个全局令牌桶限制总速率。全局令牌按优先级分配，
+有高优先级请求（选课PUT）在等待全局令牌时，低优先级请求（课程列表、用户信息等后台GET）让路；
+高优先级请求只是在等待自己接口的令牌时不占用全局令牌，低优先级请求照常放行。
+等待令牌时检查当前上下文的停止标志（stopping/tagged设置），用户停止后不再发出排队中的请求。
+同时按"子系统"统计各部分实际发出的请求数，便于发现叠加运行导致的请求翻倍。
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Callable, Dict, Optional, Tuple
+from config import Config
+
+
+class RequestCancelled(Exception):
+    """等待令牌期间被停止，请求未发出"""
+    pass
+
+
+class TokenBucket:
+    """令牌桶（线程安全）
+    
+    以固定速率补充令牌，最多积攒burst个。多个线程共享一个桶即可共享同一个速率预算。
+    """
+    
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate  # 每秒补充的令牌数
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        """按流逝时间补充令牌（调用方持有锁）"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """不取令牌，只返回还需等待的秒数（0表示现在就有）"""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (tokens - self.tokens) / self.rate
+    
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """尝试取令牌，成功返回0，否则返回还需等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (tokens - self.tokens) / self.rate
+    
+    def acquire(self, stop_event: threading.Event = None, timeout: float = None) -> bool:
+        """阻塞直到取得令牌；被停止或超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(wait_time, remaining)
+            if stop_event is not None:
+                if stop_event.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+    
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """调整速率"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            if burst is not None:
+                self.burst = burst
+                self.tokens = min(self.tokens, burst)
+
+
+class Priority(IntEnum):
+    """请求优先级（数值越小越优先）"""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# 接口类别的默认优先级
+ENDPOINT_PRIORITIES = {
+    "select": Priority.HIGH,
+    "class": Priority.HIGH,
+    "auth": Priority.NORMAL,
+    "clock": Priority.NORMAL,
+    "profile": Priority.LOW,
+    "courses": Priority.LOW
+}
+
+# 当前请求所属的子系统（线程和协程各自独立）
+_subsystem: contextvars.ContextVar = contextvars.ContextVar("subsystem", default="其他")
+# 当前上下文的停止标志，返回True时放弃等待令牌
+_stop_flag: contextvars.ContextVar = contextvars.ContextVar("stop_flag", default=None)
+
+
+class RateLimiter:
+    """按接口限流、按优先级分配全局速率的限流器"""
+    
+    def __init__(self, global_rate: float = None, global_burst: float = None, limits: Dict[str, Tuple[float, float]] = None):
+        self.global_bucket = TokenBucket(global_rate or Config.RATE_LIMIT_GLOBAL,
+                                         global_burst or Config.RATE_LIMIT_GLOBAL_BURST)
+        self.buckets: Dict[str, TokenBucket] = {
+            endpoint: TokenBucket(rate, burst)
+            for endpoint, (rate, burst) in (limits or Config.RATE_LIMITS).items()
+        }
+        self.enabled = Config.RATE_LIMIT_ENABLED
+        
+        self.cond = threading.Condition()
+        self.waiting: Dict[Priority, int] = defaultdict(int)  # 各优先级正在等待全局令牌的请求数
+        self.counts: Dict[Tuple[str, str], int] = defaultdict(int)  # (子系统, 接口) -> 请求数
+        self.waited: Dict[str, float] = defaultdict(float)  # 子系统 -> 累计等待秒数
+    
+    @contextmanager
+    def subsystem(self, name: str):
+        """在with块内发出的请求计入指定子系统"""
+        token = _subsystem.set(name)
+        try:
+            yield
+        finally:
+            _subsystem.reset(token)
+    
+    def set_subsystem(self, name: str):
+        """把当前线程（或协程）之后发出的请求都计入指定子系统"""
+        _subsystem.set(name)
+    
+    @contextmanager
+    def stopping(self, stop_flag: Optional[Callable[[], bool]]):
+        """在with块内发出的请求等待令牌时，stop_flag()为True即放弃（抛出RequestCancelled）"""
+        token = _stop_flag.set(stop_flag)
+        try:
+            yield
+        finally:
+            _stop_flag.reset(token)
+    
+    def set_stop_flag(self, stop_flag: Optional[Callable[[], bool]]):
+        """设置当前线程（或协程）之后发出的请求使用的停止标志"""
+        _stop_flag.set(stop_flag)
+    
+    def tagged(self, name: str, func: Callable, stop_flag: Callable[[], bool] = None) -> Callable:
+        """包装线程入口函数，使其中发出的请求计入指定子系统，并在stop_flag()为True时不再等待令牌"""
+        def run(*args, **kwargs):
+            with self.subsystem(name), self.stopping(stop_flag):
+                return func(*args, **kwargs)
+        return run
+    
+    @staticmethod
+    def current_subsystem() -> str:
+        """当前上下文所属的子系统"""
+        return _subsystem.get()
+    
+    def _try_acquire(self, endpoint: str, priority: Priority) -> Tuple[float, bool]:
+        """尝试同时取得接口令牌和全局令牌（调用方持有cond）
+        
+        返回 (建议等待的秒数, 是否在等待全局令牌)，成功时等待秒数为0。
+        只在等待自己接口令牌的请求不算在等待全局令牌，不会让低优先级请求让路。
+        """
+        bucket = self.buckets.get(endpoint)
+        wait = bucket.wait_time() if bucket else 0.0
+        if wait > 0:
+            return wait, False
+        
+        if any(self.waiting[p] for p in Priority if p < priority):
+            # 有更高优先级的请求在等待全局令牌，先留给它们
+            return Config.RATE_LIMIT_POLL, True
+        
+        wait = self.global_bucket.wait_time()
+        if wait > 0:
+            return wait, True
+        
+        if bucket:
+            bucket.try_acquire()
+        self.global_bucket.try_acquire()
+        return 0.0, False
+    
+    def _set_blocked(self, priority: Priority, was_blocked: bool, blocked: bool) -> bool:
+        """维护等待全局令牌的计数，返回新的状态（调用方持有cond）"""
+        if blocked and not was_blocked:
+            self.waiting[priority] += 1
+        elif was_blocked and not blocked:
+            self.waiting[priority] -= 1
+            self.cond.notify_all()
+        return blocked
+    
+    def fit_rate(self, endpoint: str, rate: float) -> Optional[str]:
+        """让接口令牌桶容纳计划的请求速率（如抢课间隔或并发总速率），返回需要告知用户的说明
+        
+        接口速率低于计划速率时提高到计划速率；全局上限不自动提高，超过时只给出提示。
+        """
+        if not self.enabled or rate <= 0:
+            return None
+        messages = []
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None and bucket.rate < rate:
+            messages.append(f"限流: {endpoint} 接口速率由 {bucket.rate:g} 提高到计划的 {rate:.2f} 次/秒")
+            bucket.set_rate(rate)
+        if rate > self.global_bucket.rate:
+            messages.append(f"⚠️ 限流: 计划速率 {rate:.2f} 次/秒超过全局上限 {self.global_bucket.rate:g} 次/秒"
+                            f"（Config.RATE_LIMIT_GLOBAL），实际速率不会超过该上限")
+        return "；".join(messages) or None
+    
+    def _record(self, endpoint: str, waited: float):
+        """记录一次放行（调用方持有cond）"""
+        name = _subsystem.get()
+        self.counts[(name, endpoint)] += 1
+        self.waited[name] += waited
+    
+    @staticmethod
+    def _stopped(stop_event: Optional[threading.Event]) -> bool:
+        """给定的停止事件或当前上下文的停止标志是否已触发"""
+        stop_flag = _stop_flag.get()
+        return (stop_event is not None and stop_event.is_set()) or (stop_flag is not None and stop_flag())
+    
+    def acquire(self, endpoint: str, priority: Priority = None, stop_event: threading.Event = None) -> bool:
+        """阻塞直到放行；被停止（stop_event或当前上下文的停止标志）返回False"""
+        priority = ENDPOINT_PRIORITIES.get(endpoint, Priority.NORMAL) if priority is None else priority
+        start = time.monotonic()
+        
+        with self.cond:
+            if not self.enabled:
+                self._record(endpoint, 0.0)
+                return True
+            
+            blocked = False
+            try:
+                while True:
+                    wait, global_blocked = self._try_acquire(endpoint, priority)
+                    blocked = self._set_blocked(priority, blocked, global_blocked)
+                    if wait == 0:
+                        self._record(endpoint, time.monotonic() - start)
+                        return True
+                    if self._stopped(stop_event):
+                        return False
+                    # 有令牌归还或高优先级请求放行时会被唤醒
+                    self.cond.wait(min(wait, Config.RATE_LIMIT_POLL))
+            finally:
+                self._set_blocked(priority, blocked, False)
+                self.cond.notify_all()
+    
+    async def acquire_async(self, endpoint: str, priority: Priority = None) -> bool:
+        """acquire的协程版本；当前上下文的停止标志触发时返回False"""
+        priority = ENDPOINT_PRIORITIES.get(endpoint, Priority.NORMAL) if priority is None else priority
+        start = time.monotonic()
+        
+        with self.cond:
+            if not self.enabled:
+                self._record(endpoint, 0.0)
+                return True
+        blocked = False
+        try:
+            while True:
+                with self.cond:
+                    wait, global_blocked = self._try_acquire(endpoint, priority)
+                    blocked = self._set_blocked(priority, blocked, global_blocked)
+                    if wait == 0:
+                        self._record(endpoint, time.monotonic() - start)
+                        return True
+                if self._stopped(None):
+                    return False
+                await asyncio.sleep(min(wait, Config.RATE_LIMIT_POLL))
+        finally:
+            with self.cond:
+                self._set_blocked(priority, blocked, False)
+                self.cond.notify_all()
+    
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """各子系统按接口统计的请求数"""
+        with self.cond:
+            result: Dict[str, Dict[str, int]] = defaultdict(dict)
+            for (name, endpoint), count in self.counts.items():
+                result[name][endpoint] = count
+            return dict(result)
+    
+    def describe(self) -> str:
+        """请求统计描述"""
+        usage = self.usage()
+        if not usage:
+            return "尚无请求"
+        lines = []
+        for name, endpoints in sorted(usage.items()):
+            total = sum(endpoints.values())
+            detail = ", ".join(f"{endpoint} {count}" for endpoint, count in sorted(endpoints.items()))
+            lines.append(f"{name}: {total} 次（{detail}），限流等待 {self.waited[name]:.2f}s")
+        return "\n".join(lines)
+    
+    def reset_usage(self):
+        """清空统计"""
+        with self.cond:
+            self.counts.clear()
+            self.waited.clear()
+
+
+# 进程内共享的限流器
+rate_limiter = RateLimiter()
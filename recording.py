@@ -0,0 +1,201 @@
+"""
+HTTP请求录制与回放
+
+RecordingAdapter 挂在 requests.Session 上，把每次请求和响应（时间、状态码、响应头、响应体）
+逐行写入JSONL文件，令牌、密码等敏感字段会被替换掉。
+ReplayAdapter 读取录制文件，按请求顺序返回录制的响应而不访问网络，
+用于离线复现和分析一次真实的抢课过程。
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from metrics import TimedHTTPAdapter
+
+
+REDACTED = "***"
+SENSITIVE_HEADERS = ("authorization", "cookie", "set-cookie")
+SENSITIVE_FIELDS = ("token", "password")
+
+
+def redact(value):
+    """递归替换JSON中的敏感字段"""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SENSITIVE_FIELDS and value[key] else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def redact_body(body) -> Optional[str]:
+    """请求体/响应体转为文本；JSON体去除敏感字段"""
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(redact(json.loads(body)), ensure_ascii=False, separators=(",", ":"))
+    except ValueError:
+        return body
+
+
+def redact_headers(headers) -> Dict[str, str]:
+    return {key: REDACTED if key.lower() in SENSITIVE_HEADERS else value for key, value in headers.items()}
+
+
+def request_key(method: str, url: str) -> Tuple[str, str]:
+    """回放匹配用的键：方法 + 路径 + 排序后的查询参数（与服务器地址无关）"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return method.upper(), f"{parts.path}?{query}" if query else parts.path
+
+
+def restore_elapsed(response, *args, **kwargs):
+    """响应钩子：Session.send 会用实际耗时覆盖elapsed，回放时改回录制的耗时"""
+    recorded = getattr(response, "recorded_elapsed", None)
+    if recorded is not None:
+        response.elapsed = recorded
+    return response
+
+
+class RecordingAdapter(TimedHTTPAdapter):
+    """录制适配器：正常发送请求，同时把请求和响应写入JSONL文件"""
+    
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+    
+    def send(self, request, **kwargs):
+        wall = time.time()
+        started = time.perf_counter()
+        entry = {
+            "wall": round(wall, 6),
+            "method": request.method,
+            "url": request_key(request.method, request.url)[1],
+            "request_headers": redact_headers(request.headers),
+            "request_body": redact_body(request.body)
+        }
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException as e:
+            entry["elapsed"] = round(time.perf_counter() - started, 6)
+            entry["error"] = type(e).__name__
+            entry["error_msg"] = str(e)
+            self._write(entry)
+            raise
+        
+        entry["elapsed"] = round(time.perf_counter() - started, 6)
+        entry["status"] = response.status_code
+        entry["reason"] = response.reason
+        entry["headers"] = redact_headers(response.headers)
+        entry["body"] = redact_body(response.content)
+        self._write(entry)
+        return response
+    
+    def _write(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+            self.count += 1
+    
+    def close(self):
+        super().close()
+        with self.lock:
+            self.file.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """回放适配器：按录制顺序返回响应，不访问网络
+    
+    同一请求按录制次数依次返回，超出后重复最后一次响应；录制中没有的请求抛出 ConnectionError。
+    realtime为True时按录制的耗时等待，否则立即返回。响应的Date头按录制时与本地时钟的差值平移到当前时间，
+    服务器时钟同步得到的偏差与录制时一致。
+    """
+    
+    def __init__(self, path: str, realtime: bool = False):
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+        self.lock = threading.Lock()
+        self.queues: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        self.last: Dict[Tuple[str, str], dict] = {}
+        self.total = 0
+        self.served = 0
+        self.misses = 0
+        
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                self.queues[(entry["method"], entry["url"])].append(entry)
+                self.total += 1
+    
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = request_key(request.method, request.url)
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue:
+                entry = queue.popleft()
+                self.last[key] = entry
+            else:
+                entry = self.last.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.served += 1
+        
+        if entry is None:
+            raise requests.ConnectionError(f"回放记录中没有该请求: {key[0]} {key[1]}", request=request)
+        
+        if self.realtime:
+            time.sleep(entry.get("elapsed", 0))
+        
+        if "error" in entry:
+            error_class = getattr(requests.exceptions, entry["error"], requests.ConnectionError)
+            raise error_class(entry.get("error_msg", ""), request=request)
+        
+        return self._build_response(request, entry)
+    
+    def _build_response(self, request, entry: dict) -> requests.Response:
+        headers = CaseInsensitiveDict(entry.get("headers", {}))
+        if "Date" in headers:
+            try:
+                recorded = parsedate_to_datetime(headers["Date"]).timestamp()
+                headers["Date"] = formatdate(time.time() + recorded - entry["wall"], usegmt=True)
+            except (TypeError, ValueError):
+                pass
+        
+        response = requests.Response()
+        response.status_code = entry.get("status", 200)
+        response.reason = entry.get("reason", "")
+        response.headers = headers
+        response._content = (entry.get("body") or "").encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.recorded_elapsed = timedelta(seconds=entry.get("elapsed", 0))
+        return response
+    
+    def describe(self) -> str:
+        """回放进度"""
+        return f"回放 {self.served} 次（录制 {self.total} 条），未命中 {self.misses} 次"
+    
+    def close(self):
+        pass
@@ -2,15 +2,25 @@
 定时选课调度器和抢课队列管理
 """
 
+import asyncio
+import bisect
+import heapq
 import time
 import threading
-import schedule
-from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional, Callable
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Iterable, Optional, Callable, Tuple, Set
 from dataclasses import dataclass, field
-from course import Course
+from course import Course, SelectStatus, SelectOutcome
 from config import Config
-import json
+from clock import OneShotTimer, BEIJING_TZ
+from watcher import SeatWatcher
+from persistence import QueueJournal
+from pacing import Pacer, AimdController, create_pacer
+from ratelimit import TokenBucket, rate_limiter
+from breaker import breakers
+from heartbeat import KeepAliveHeartbeat
 
 
 @dataclass
@@ -22,6 +32,8 @@ class CourseTask:
     status: str = "pending"  # pending, running, success, failed
     attempts: int = 0
     last_attempt: Optional[datetime] = None
+    last_latency: Optional[float] = None  # 最近一次选课请求耗时（秒），不持久化
+    last_outcome: Optional[SelectStatus] = None  # 最近一次选课结果，不持久化
     
     def to_dict(self) -> dict:
         """转换为字典"""
@@ -56,149 +68,266 @@ class CourseTask:
 
 
 class CourseQueue:
-    """抢课队列管理器"""
+    """抢课队列管理器
     
-    def __init__(self):
-        self.tasks: List[CourseTask] = []
+    以course_id为键的字典索引和按状态分组的集合保证查找、状态变更为O(1)；
+    优先级顺序由一个按 (优先级, 添加时间, course_id) 排好序的列表维护，
+    增删和修改优先级用二分查找定位，读取顺序时无需再排序。
+    
+    任务变化时通知监听者 (事件, course_id)：add、remove、update 针对单个任务，
+    reorder 表示顺序或整体内容变化（course_id为None），需要重新读取全部任务。
+    """
+    
+    EVENT_ADD = "add"
+    EVENT_REMOVE = "remove"
+    EVENT_UPDATE = "update"
+    EVENT_REORDER = "reorder"
+    
+    def __init__(self, save_file: str = None):
         self.lock = threading.Lock()
-        self.save_file = "course_queue.json"
+        self._index: Dict[int, CourseTask] = {}  # course_id -> 任务
+        self._by_status: Dict[str, Set[int]] = defaultdict(set)  # 状态 -> course_id集合
+        self._order: List[Tuple[int, float, int]] = []  # 排好序的 (优先级, 添加时间, course_id)
+        self._keys: Dict[int, Tuple[int, float, int]] = {}  # course_id -> 在_order中的键
+        self.listeners: List[Callable[[str, Optional[int]], None]] = []  # 任务变化回调列表
+        
+        self.save_file = save_file or Config.QUEUE_FILE
+        self.loaded = False  # 是否已根据课程列表重建，之前不写快照以免覆盖磁盘上的队列
+        self.journal = QueueJournal(self.save_file, snapshot_provider=self._snapshot)
         self.load_queue()
     
+    @property
+    def tasks(self) -> List[CourseTask]:
+        """按优先级排序的全部任务"""
+        with self.lock:
+            return self._ordered_tasks()
+    
+    def _place(self, task: CourseTask):
+        """按任务的当前优先级放入排序列表，已在列表中时先移出旧位置（调用方持有锁）"""
+        course_id = task.course.course_id
+        self._unplace(course_id)
+        key = (task.priority, task.added_time.timestamp(), course_id)
+        self._keys[course_id] = key
+        bisect.insort(self._order, key)
+    
+    def _unplace(self, course_id: int):
+        """从排序列表中移出（调用方持有锁）"""
+        key = self._keys.pop(course_id, None)
+        if key is not None:
+            del self._order[bisect.bisect_left(self._order, key)]
+    
+    def _insert(self, task: CourseTask):
+        """加入索引（调用方持有锁）"""
+        course_id = task.course.course_id
+        self._index[course_id] = task
+        self._by_status[task.status].add(course_id)
+        self._place(task)
+    
+    def _discard(self, course_id: int) -> Optional[CourseTask]:
+        """移出索引（调用方持有锁）"""
+        task = self._index.pop(course_id, None)
+        if task is None:
+            return None
+        self._by_status[task.status].discard(course_id)
+        self._unplace(course_id)
+        return task
+    
+    def _set_status(self, task: CourseTask, status: str):
+        """修改任务状态并维护状态集合（调用方持有锁）"""
+        course_id = task.course.course_id
+        self._by_status[task.status].discard(course_id)
+        task.status = status
+        self._by_status[status].add(course_id)
+    
+    def _ordered_ids(self) -> List[int]:
+        """按优先级排序的course_id（调用方持有锁）"""
+        return [key[2] for key in self._order]
+    
+    def _ordered_tasks(self, status: str = None) -> List[CourseTask]:
+        """按优先级排序的任务，可按状态过滤（调用方持有锁）"""
+        if status is None:
+            return [self._index[course_id] for course_id in self._ordered_ids()]
+        
+        members = self._by_status.get(status)
+        if not members:
+            return []
+        return [self._index[course_id] for course_id in self._ordered_ids() if course_id in members]
+    
+    def add_listener(self, callback: Callable[[str, Optional[int]], None]):
+        """注册任务变化回调，在修改队列的线程中调用"""
+        self.listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[str, Optional[int]], None]):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def _notify(self, event: str, course_id: Optional[int] = None):
+        """通知监听者（调用方不持有锁）"""
+        for callback in list(self.listeners):
+            callback(event, course_id)
+    
+    def _reset(self, tasks: List[CourseTask]):
+        """用给定任务替换全部内容（调用方持有锁）"""
+        self._index.clear()
+        self._by_status.clear()
+        self._order = []
+        self._keys.clear()
+        for task in tasks:
+            self._insert(task)
+    
     def add_course(self, course: Course, priority: int = 1) -> bool:
         """添加课程到队列"""
         with self.lock:
             # 检查是否已存在
-            for task in self.tasks:
-                if task.course.course_id == course.course_id:
-                    return False
+            if course.course_id in self._index:
+                return False
             
             task = CourseTask(course=course, priority=priority)
-            self.tasks.append(task)
-            self.sort_by_priority()
-            self.save_queue()
-            return True
+            self._insert(task)
+            self.journal.record('add', task=task.to_dict())
+        self._notify(self.EVENT_ADD, course.course_id)
+        return True
     
     def remove_course(self, course_id: int) -> bool:
         """从队列移除课程"""
         with self.lock:
-            for i, task in enumerate(self.tasks):
-                if task.course.course_id == course_id:
-                    self.tasks.pop(i)
-                    self.save_queue()
-                    return True
-            return False
+            if self._discard(course_id) is None:
+                return False
+            self.journal.record('remove', course_id=course_id)
+        self._notify(self.EVENT_REMOVE, course_id)
+        return True
     
     def update_priority(self, course_id: int, priority: int) -> bool:
         """更新课程优先级"""
         with self.lock:
-            for task in self.tasks:
-                if task.course.course_id == course_id:
-                    task.priority = priority
-                    self.sort_by_priority()
-                    self.save_queue()
-                    return True
-            return False
+            task = self._index.get(course_id)
+            if task is None:
+                return False
+            task.priority = priority
+            self._place(task)
+            self.journal.record('priority', course_id=course_id, priority=priority)
+        self._notify(self.EVENT_REORDER)
+        return True
     
-    def sort_by_priority(self):
-        """按优先级排序"""
-        self.tasks.sort(key=lambda x: (x.priority, x.added_time))
+    def get_task(self, course_id: int) -> Optional[CourseTask]:
+        """按课程ID获取任务"""
+        with self.lock:
+            return self._index.get(course_id)
     
     def get_pending_tasks(self) -> List[CourseTask]:
-        """获取待处理的任务"""
+        """获取待处理的任务（按优先级排序）"""
         with self.lock:
-            return [task for task in self.tasks if task.status == "pending"]
+            return self._ordered_tasks("pending")
     
     def get_all_tasks(self) -> List[CourseTask]:
         """获取所有任务"""
         with self.lock:
-            return self.tasks.copy()
+            return self._ordered_tasks()
     
-    def update_task_status(self, course_id: int, status: str, attempt_increment: bool = True):
-        """更新任务状态"""
+    def count_by_status(self) -> Dict[str, int]:
+        """各状态的任务数"""
         with self.lock:
-            for task in self.tasks:
-                if task.course.course_id == course_id:
-                    task.status = status
-                    task.last_attempt = datetime.now()
-                    if attempt_increment:
-                        task.attempts += 1
-                    self.save_queue()
-                    break
+            return {status: len(members) for status, members in self._by_status.items() if members}
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._index)
+    
+    def update_task_status(self, course_id: int, status: str, attempt_increment: bool = True,
+                           outcome: SelectOutcome = None):
+        """更新任务状态，outcome为本次选课的结果"""
+        with self.lock:
+            task = self._index.get(course_id)
+            if task is None:
+                return
+            self._set_status(task, status)
+            task.last_attempt = datetime.now()
+            if attempt_increment:
+                task.attempts += 1
+            if outcome is not None:
+                task.last_latency = outcome.latency
+                task.last_outcome = outcome.status
+            self.journal.record(
+                'status',
+                course_id=course_id,
+                status=status,
+                attempts=task.attempts,
+                last_attempt=task.last_attempt.isoformat()
+            )
+        self._notify(self.EVENT_UPDATE, course_id)
     
     def clear_completed(self):
         """清除已完成的任务"""
         with self.lock:
-            self.tasks = [task for task in self.tasks if task.status not in ["success"]]
-            self.save_queue()
+            removed = list(self._by_status.get("success", ()))
+            for course_id in removed:
+                self._discard(course_id)
+            self.journal.record('clear_completed')
+        for course_id in removed:
+            self._notify(self.EVENT_REMOVE, course_id)
     
     def reset_failed_tasks(self):
         """重置失败的任务为待处理状态"""
         with self.lock:
-            for task in self.tasks:
-                if task.status == "failed":
-                    task.status = "pending"
-            self.save_queue()
+            reset = list(self._by_status.get("failed", ()))
+            for course_id in reset:
+                self._set_status(self._index[course_id], "pending")
+            self.journal.record('reset_failed')
+        for course_id in reset:
+            self._notify(self.EVENT_UPDATE, course_id)
+    
+    def _snapshot(self):
+        """生成快照数据（由日志压缩时调用）"""
+        with self.lock:
+            if not self.loaded:
+                return None
+            return [task.to_dict() for task in self._ordered_tasks()], self.journal.seq
     
     def save_queue(self):
-        """保存队列到文件"""
+        """立即写入完整快照"""
         try:
-            data = {
-                'tasks': [task.to_dict() for task in self.tasks],
-                'saved_time': datetime.now().isoformat()
-            }
-            with open(self.save_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.journal.compact()
         except Exception as e:
             print(f"保存队列失败: {e}")
     
+    def close(self):
+        """写出所有未保存的变更"""
+        self.journal.close()
+    
     def load_queue(self):
         """从文件加载队列"""
-        try:
-            with open(self.save_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 注意：这里需要配合课程数据来重建Course对象
-            # 实际使用时需要传入课程列表
-            self.tasks = []  # 先清空，等GUI加载时重新构建
-            
-        except FileNotFoundError:
-            self.tasks = []
-        except Exception as e:
-            print(f"加载队列失败: {e}")
-            self.tasks = []
+        # 注意：这里需要配合课程数据来重建Course对象
+        # 实际使用时需要传入课程列表
+        with self.lock:
+            self._reset([])  # 先清空，等GUI加载时重新构建
     
     def rebuild_from_courses(self, courses: List[Course]):
-        """从课程列表重建队列"""
+        """从课程列表重建队列（快照 + 日志重放）"""
         try:
-            with open(self.save_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
             course_dict = {course.course_id: course for course in courses}
             new_tasks = []
             
-            for task_data in data.get('tasks', []):
+            self.journal.flush()
+            for task_data in self.journal.replay():
                 course_id = task_data.get('course_id')
                 if course_id in course_dict:
                     task = CourseTask.from_dict(task_data, course_dict[course_id])
                     new_tasks.append(task)
             
             with self.lock:
-                self.tasks = new_tasks
-                self.sort_by_priority()
+                self._reset(new_tasks)
+                self.loaded = True
                 
-        except FileNotFoundError:
-            # 文件不存在，这是正常的，不需要报错
-            with self.lock:
-                self.tasks = []
         except Exception as e:
             print(f"重建队列失败: {e}")
             with self.lock:
-                self.tasks = []
+                self._reset([])
+        self._notify(self.EVENT_REORDER)
     
     def contains_course(self, course_id: int) -> bool:
         """检查队列是否包含指定课程"""
         with self.lock:
-            return any(task.course.course_id == course_id for task in self.tasks)
+            return course_id in self._index
 
 
 class ScheduledCourseGrabber:
@@ -208,7 +337,10 @@ class ScheduledCourseGrabber:
         self.client = client
         self.course_queue = course_queue
         self.is_running = False
-        self.scheduler_thread = None
+        self.timer: Optional[OneShotTimer] = None
+        self.warmup_timer: Optional[OneShotTimer] = None
+        self.last_warmup: List[Tuple[str, bool, str]] = []  # (步骤, 是否成功, 说明)
+        self.heartbeat = KeepAliveHeartbeat(client, on_event=self._log)  # 等待开抢期间保持连接和检查令牌
         self.grab_thread = None
         self.stop_event = threading.Event()
         
@@ -216,6 +348,14 @@ class ScheduledCourseGrabber:
         self.grab_interval = 1.0  # 抢课间隔（秒）
         self.scheduled_time = None  # 计划开始时间
         self.auto_start = False  # 是否自动开始
+        self.watch_mode = False  # 空位监控模式：仅在有空位时选课
+        self.watch_interval = Config.WATCH_INTERVAL  # 余量检查间隔（秒）
+        self.warmup_lead = Config.WARMUP_LEAD  # 提前预热的秒数，0表示不预热
+        self.worker_mode = False  # 并发模式：每门课程独立节奏，共享总速率
+        self.max_workers = Config.GRAB_MAX_WORKERS  # 并发线程数上限
+        self.global_rate: Optional[float] = Config.GRAB_GLOBAL_RATE  # 总请求速率（次/秒），None表示1/grab_interval
+        self.async_mode = False  # 异步模式：所有课程、心跳和时钟同步在一个事件循环中进行
+        self.adaptive = Config.ADAPTIVE_PACING  # 自适应间隔：根据服务器延迟和错误率调整grab_interval
         
         # 回调函数
         self.log_callback: Optional[Callable[[str], None]] = None
@@ -227,27 +367,133 @@ class ScheduledCourseGrabber:
         self.status_callback = status_callback
     
     def schedule_grab(self, target_time: datetime, grab_interval: float = 1.0):
-        """设置定时抢课"""
+        """设置定时抢课（target_time为北京时间）"""
+        # 清除现有调度
+        self.cancel_schedule()
+        
         self.scheduled_time = target_time
         self.grab_interval = grab_interval
         
-        # 清除现有调度
-        schedule.clear()
+        # 以服务器时间为准设置单次定时器
+        target_timestamp = target_time.replace(tzinfo=BEIJING_TZ).timestamp()
+        clock = self.client.clock
+        self.timer = OneShotTimer(target_timestamp, rate_limiter.tagged("定时抢课", self._on_timer_fired), clock=clock)
+        self.timer.start()
         
-        # 设置定时任务
-        beijing_tz = timezone(timedelta(hours=8))
-        target_time_beijing = target_time.replace(tzinfo=beijing_tz)
+        # 计划时间前预热，来不及则立即预热
+        if self.warmup_lead > 0:
+            self.warmup_timer = OneShotTimer(target_timestamp - self.warmup_lead, rate_limiter.tagged("预热", self._warm_up),
+                                            clock=clock)
+            self.warmup_timer.start()
         
-        # 使用schedule库设置定时任务
-        target_time_str = target_time.strftime("%H:%M")
-        schedule.every().day.at(target_time_str).do(self._start_grabbing)
+        if Config.HEARTBEAT_ENABLED:
+            self.heartbeat.start()
         
-        self._log(f"已设置定时抢课: {target_time_beijing.strftime('%Y-%m-%d %H:%M:%S')} (北京时间)")
+        self._log(f"已设置定时抢课: {target_time.strftime('%Y-%m-%d %H:%M:%S')} (北京时间)")
+        if clock.is_synced:
+            self._log(f"按服务器时间触发，{clock.describe()}")
+        else:
+            self._log("⚠️ 服务器时钟未同步，将按本地时间触发")
+        self.prepare_class_numbers()
+    
+    def cancel_schedule(self) -> bool:
+        """取消尚未触发的定时"""
+        timer = self.timer
+        warmup_timer = self.warmup_timer
+        self.timer = None
+        self.warmup_timer = None
+        self.scheduled_time = None
+        self.heartbeat.stop()
+        if warmup_timer:
+            warmup_timer.cancel()
+        if timer and timer.is_pending:
+            timer.cancel()
+            return True
+        return False
+    
+    def warm_up(self) -> List[Tuple[str, bool, str]]:
+        """抢课前预检：令牌、课堂编号、连接和服务器时钟，返回各步骤结果"""
+        results = []
         
-        # 启动调度器线程
-        if not self.scheduler_thread or not self.scheduler_thread.is_alive():
-            self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-            self.scheduler_thread.start()
+        # 1. 检查令牌
+        try:
+            self.client.get_profile()
+            results.append(("令牌", True, "有效"))
+        except Exception as e:
+            results.append(("令牌", False, str(e)))
+        
+        # 2. 解析所有待抢任务的课堂编号
+        courses = [task.course for task in self.course_queue.get_pending_tasks()]
+        errors = self.client.prefetch_class_numbers(courses)
+        if errors:
+            detail = "; ".join(f"{course_id}: {msg}" for course_id, msg in errors.items())
+            results.append(("课堂编号", False, detail))
+        else:
+            results.append(("课堂编号", True, f"{len(courses)} 门课程已就绪"))
+        
+        # 3. 预先建立连接
+        opened = self.client.warm_connections()
+        results.append(("连接", opened > 0, f"{opened}/{Config.WARMUP_CONNECTIONS} 个连接可用"))
+        
+        # 4. 重新校准服务器时钟
+        try:
+            self.client.clock.sync()
+            results.append(("时钟", True, self.client.clock.describe()))
+        except Exception as e:
+            results.append(("时钟", False, str(e)))
+        
+        self.last_warmup = results
+        return results
+    
+    def _warm_up(self):
+        """预热定时器触发：执行预检，然后保持连接直到开抢"""
+        timer = self.timer
+        if timer is None or not timer.is_pending:
+            return
+        
+        self._log(f"开始预热，距离开抢 {timer.remaining():.1f} 秒")
+        results = self.warm_up()
+        for step, ok, detail in results:
+            self._log(f"{'✅' if ok else '❌'} 预热-{step}: {detail}")
+        
+        if all(ok for _, ok, _ in results):
+            self._status("预热完成")
+        else:
+            self._status("预热发现问题")
+            self._log("⚠️ 预热发现问题，请在开抢前处理")
+        
+        # 开抢前由心跳以更短的间隔保持连接，开抢时随心跳一起停止
+        if timer.is_pending:
+            self.heartbeat.start()
+            self.heartbeat.set_interval(Config.WARMUP_KEEPALIVE_INTERVAL)
+    
+    def _on_timer_fired(self):
+        """定时器触发"""
+        self.heartbeat.stop()
+        timer = self.timer
+        if timer is not None and timer.fire_error is not None:
+            self._log(f"定时触发，误差 {timer.fire_error * 1000:+.2f}ms")
+        if self.heartbeat.beats:
+            self._log(self.heartbeat.describe())
+        self._start_grabbing()
+    
+    def prepare_class_numbers(self, background: bool = True):
+        """为队列中所有待抢任务预先解析课堂编号"""
+        def prepare():
+            courses = [task.course for task in self.course_queue.get_pending_tasks()]
+            if not courses:
+                return
+            errors = self.client.prefetch_class_numbers(courses)
+            for course in courses:
+                if course.course_id in errors:
+                    self._log(f"⚠️ 预取课堂编号失败: {course.course_name} - {errors[course.course_id]}")
+            if len(errors) < len(courses):
+                self._log(f"已预取 {len(courses) - len(errors)} 门课程的课堂编号")
+        
+        if background:
+            threading.Thread(target=rate_limiter.tagged("预取课堂编号", prepare), daemon=True).start()
+        else:
+            prepare()
     
     def start_immediate_grab(self):
         """立即开始抢课"""
@@ -273,16 +519,6 @@ class ScheduledCourseGrabber:
         self._status("已停止")
         return True
     
-    def _scheduler_loop(self):
-        """调度器循环"""
-        while True:
-            try:
-                schedule.run_pending()
-                if self.stop_event.wait(1):  # 每秒检查一次
-                    break
-            except Exception as e:
-                self._log(f"调度器错误: {e}")
-    
     def _start_grabbing(self):
         """开始抢课"""
         if self.is_running:
@@ -297,15 +533,42 @@ class ScheduledCourseGrabber:
         self.is_running = True
         self.stop_event.clear()
         
-        self._log(f"开始抢课，队列中有 {len(pending_tasks)} 门课程")
-        self._status("抢课中")
+        if self.watch_mode:
+            self._log(f"开始空位监控，队列中有 {len(pending_tasks)} 门课程，每 {self.watch_interval} 秒检查一次余量")
+            self._status("监控中")
+            target = self._watch_loop
+        elif self.async_mode:
+            self._log(f"开始异步抢课，队列中有 {len(pending_tasks)} 门课程，在一个事件循环中同时进行")
+            self._status("抢课中")
+            target = self._async_loop
+        elif self.worker_mode:
+            self._log(f"开始并发抢课，队列中有 {len(pending_tasks)} 门课程，总速率 {self._global_rate():.2f} 次/秒")
+            self._status("抢课中")
+            target = self._worker_loop
+        else:
+            self._log(f"开始抢课，队列中有 {len(pending_tasks)} 门课程")
+            self._status("抢课中")
+            target = self._grab_loop
+        
+        # 异步模式在grab_many中按课程数调整，监控模式只在有空位时选课
+        if target in (self._grab_loop, self._worker_loop):
+            rate = self._global_rate() if self.worker_mode else 1.0 / max(self.grab_interval, 0.01)
+            notice = rate_limiter.fit_rate("select", rate)
+            if notice:
+                self._log(notice)
+        
+        # 抢课期间把熔断器状态变化写入日志
+        breakers.add_listener(self._log)
         
         # 启动抢课线程
-        self.grab_thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self.grab_thread = threading.Thread(target=rate_limiter.tagged("定时抢课", target, self.stop_event.is_set),
+                                            daemon=True)
         self.grab_thread.start()
     
     def _grab_loop(self):
         """抢课循环"""
+        pacer = create_pacer(self.grab_interval, self.adaptive, on_change=self._log)
+        
         try:
             round_count = 0
             
@@ -320,32 +583,13 @@ class ScheduledCourseGrabber:
                 self._log(f"第 {round_count} 轮抢课开始，待抢课程: {len(pending_tasks)}")
                 
                 for task in pending_tasks:
-                    if self.stop_event.is_set():
+                    # 按计划时刻依次尝试，请求耗时不会拉长周期
+                    if not pacer.begin(self.stop_event):
                         break
                     
-                    # 更新任务状态为运行中
-                    self.course_queue.update_task_status(task.course.course_id, "running")
-                    
-                    try:
-                        self._log(f"正在抢课: {task.course.course_name} (ID: {task.course.course_id}) [优先级: {task.priority}]")
-                        
-                        success = self.client.select_course(task.course)
-                        
-                        if success:
-                            self.course_queue.update_task_status(task.course.course_id, "success")
-                            self._log(f"✅ 抢课成功: {task.course.course_name}")
-                        else:
-                            self.course_queue.update_task_status(task.course.course_id, "pending")
-                            self._log(f"❌ 抢课失败: {task.course.course_name}")
-                    
-                    except Exception as e:
-                        self.course_queue.update_task_status(task.course.course_id, "pending")
-                        self._log(f"❌ 抢课出错: {task.course.course_name} - {str(e)}")
-                    
-                    # 等待间隔
-                    if not self.stop_event.wait(self.grab_interval):
-                        continue
-                    else:
+                    outcome = self._attempt_task(task)
+                    pacer.end(outcome)
+                    if outcome.status == SelectStatus.TOKEN_EXPIRED:
                         break
                 
                 # 检查是否还有待处理的任务
@@ -357,17 +601,256 @@ class ScheduledCourseGrabber:
                 self._log(f"第 {round_count} 轮完成，等待下一轮...")
                 
                 # 轮次间隔（稍长一些）
-                if self.stop_event.wait(self.grab_interval * 2):
-                    break
-        
+                pacer.postpone(self.grab_interval)
+                
         except Exception as e:
             self._log(f"抢课循环出错: {e}")
+            
+        finally:
+            self._log(f"节奏统计: {pacer.describe()}")
+            if pacer.controller is not None:
+                self._log(pacer.controller.describe())
+            breakers.remove_listener(self._log)
+            self.is_running = False
+            self._status("已停止")
+            self._log("抢课任务结束")
+    
+    def _global_rate(self) -> float:
+        """并发模式下的总请求速率"""
+        if self.global_rate:
+            return self.global_rate
+        return 1.0 / max(self.grab_interval, 0.01)
+    
+    def _worker_loop(self):
+        """并发抢课：每门课程一个节奏槽位，线程池中的工作线程取最早到期的槽位执行"""
+        budget = TokenBucket(self._global_rate(), burst=1)
+        # 自适应模式下所有课程共用一个控制器，总速率随间隔同比例调整
+        controller = AimdController(self.grab_interval, on_change=self._log) if self.adaptive else None
+        slots: List[Tuple[float, int, float, int]] = []  # (计划时刻, 优先级, 添加时间, course_id)
+        pacers: Dict[int, Pacer] = {}  # 每门课程独立的节奏，同时保证同一课程不会并发请求
+        scheduled: Set[int] = set()  # 在槽位中或正在执行的课程
+        cond = threading.Condition()
+        last_sync = [0.0]
         
+        def sync_slots():
+            """把新增的待抢任务放入槽位（调用方持有cond）"""
+            now = time.monotonic()
+            for task in self.course_queue.get_pending_tasks():
+                course_id = task.course.course_id
+                if course_id not in scheduled:
+                    scheduled.add(course_id)
+                    pacers[course_id] = create_pacer(self.grab_interval, self.adaptive, controller=controller)
+                    heapq.heappush(slots, (now, task.priority, task.added_time.timestamp(), course_id))
+            last_sync[0] = now
+        
+        def worker():
+            while not self.stop_event.is_set():
+                with cond:
+                    if time.monotonic() - last_sync[0] > 1.0:
+                        sync_slots()
+                    if not slots:
+                        if not scheduled:
+                            return
+                        cond.wait(0.1)
+                        continue
+                    _, priority, added, course_id = heapq.heappop(slots)
+                
+                task = self.course_queue.get_task(course_id)
+                if task is None or task.status not in ("pending", "running"):
+                    with cond:
+                        scheduled.discard(course_id)
+                    continue
+                
+                # 等到该课程的计划时刻，再从共享预算中取令牌
+                pacer = pacers[course_id]
+                if not pacer.begin(self.stop_event):
+                    return
+                if not budget.acquire(self.stop_event):
+                    pacer.cancel()
+                    return
+                
+                outcome = self._attempt_task(task)
+                pacer.end(outcome)
+                if controller is not None:
+                    budget.set_rate(self._global_rate() * controller.floor / controller.interval)
+                
+                with cond:
+                    if outcome.ok or outcome.should_stop:
+                        scheduled.discard(course_id)
+                        cond.notify_all()
+                    else:
+                        heapq.heappush(slots, (pacer.deadline, priority, added, course_id))
+                        cond.notify()
+        
+        try:
+            with cond:
+                sync_slots()
+            worker_count = max(1, min(self.max_workers, len(slots)))
+            with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="grab-worker") as executor:
+                futures = [executor.submit(rate_limiter.tagged("定时抢课", worker, self.stop_event.is_set)) for _ in range(worker_count)]
+                for future in futures:
+                    future.result()
+            
+            if not self.stop_event.is_set():
+                self._log_result(pacers)
+                
+        except Exception as e:
+            self._log(f"并发抢课出错: {e}")
+            
         finally:
+            for course_id, pacer in pacers.items():
+                if pacer.attempts:
+                    self._log(f"节奏统计 [{course_id}]: {pacer.describe()}")
+            if controller is not None:
+                self._log(controller.describe())
+            breakers.remove_listener(self._log)
             self.is_running = False
             self._status("已停止")
             self._log("抢课任务结束")
     
+    def _async_loop(self):
+        """异步抢课：用异步客户端在一个事件循环中同时抢队列中的所有课程"""
+        tasks_by_id = {task.course.course_id: task for task in self.course_queue.get_pending_tasks()}
+        
+        def on_outcome(course: Course, outcome: SelectOutcome):
+            # 先计入尝试次数，再按结果更新状态
+            self.course_queue.update_task_status(course.course_id, "running")
+            self._record_outcome(tasks_by_id[course.course_id], outcome)
+        
+        def log_callback(course: Optional[Course], message: str):
+            # 单门课程的结果已由on_outcome记录，这里只输出心跳、时钟等全局消息
+            if course is None:
+                self._log(message)
+        
+        async def run():
+            async_client = self.client.create_async_client()
+            try:
+                await async_client.grab_many(
+                    [task.course for task in tasks_by_id.values()],
+                    self.grab_interval,
+                    callback=log_callback,
+                    on_outcome=on_outcome,
+                    stop_flag=self.stop_event.is_set,
+                    adaptive=self.adaptive
+                )
+            finally:
+                await async_client.close()
+        
+        try:
+            asyncio.run(run())
+            
+            if not self.stop_event.is_set():
+                self._log_result(tasks_by_id)
+                
+        except Exception as e:
+            self._log(f"异步抢课出错: {e}")
+            
+        finally:
+            breakers.remove_listener(self._log)
+            self.is_running = False
+            self._status("已停止")
+            self._log("抢课任务结束")
+    
+    def _watch_loop(self):
+        """空位监控循环：只在课程出现空位时发起选课"""
+        watcher = SeatWatcher(self.client)
+        pacer = Pacer(self.watch_interval)
+        watched: Set[int] = set()  # 本次监控过的课程
+        
+        try:
+            while self.is_running and pacer.begin(self.stop_event):
+                pending_tasks = self.course_queue.get_pending_tasks()
+                if not pending_tasks:
+                    pacer.cancel()
+                    self._log_result(watched)
+                    break
+                
+                tasks_by_id = {task.course.course_id: task for task in pending_tasks}
+                watched.update(tasks_by_id)
+                try:
+                    changed, vacant, missing = watcher.poll(tasks_by_id.keys())
+                except Exception as e:
+                    self._log(f"获取课程余量失败: {e}")
+                    pacer.end(factor=Config.BACKOFF_FACTOR)
+                    continue
+                pacer.end()
+                
+                # 同步最新人数到队列中的课程对象
+                for course in changed:
+                    task = tasks_by_id[course.course_id]
+                    task.course.selected = course.selected
+                    task.course.optional = course.optional
+                    self._log(f"余量变化: {task.course.course_name} {course.selected}/{course.optional}")
+                
+                # 课程可能在监控期间下架，找不到的课程标记为失败，避免之后每次都翻完整个课程列表
+                if missing:
+                    self._log(f"⚠️ 课程列表中找不到以下课程，已移出待抢列表: {', '.join(map(str, missing))}")
+                    for course_id in missing:
+                        self.course_queue.update_task_status(course_id, "failed", attempt_increment=False)
+                
+                # 只对有空位的课程发起选课，按优先级顺序
+                vacant_tasks = sorted(
+                    (tasks_by_id[course.course_id] for course in vacant),
+                    key=lambda t: (t.priority, t.added_time)
+                )
+                for task in vacant_tasks:
+                    if self.stop_event.is_set():
+                        break
+                    self._log(f"发现空位: {task.course.course_name} ({task.course.selected}/{task.course.optional})")
+                    outcome = self._attempt_task(task)
+                    if outcome.status == SelectStatus.TOKEN_EXPIRED:
+                        break
+                        
+        except Exception as e:
+            self._log(f"空位监控出错: {e}")
+            
+        finally:
+            self._log(f"轮询节奏统计: {pacer.describe()}")
+            breakers.remove_listener(self._log)
+            self.is_running = False
+            self._status("已停止")
+            self._log("空位监控结束")
+    
+    def _attempt_task(self, task: CourseTask) -> SelectOutcome:
+        """对单个任务发起一次选课并更新队列状态"""
+        course_id = task.course.course_id
+        self.course_queue.update_task_status(course_id, "running")
+        self._log(f"正在抢课: {task.course.course_name} (ID: {course_id}) [优先级: {task.priority}]")
+        
+        outcome = self.client.try_select_course(task.course)
+        self._record_outcome(task, outcome)
+        return outcome
+    
+    def _record_outcome(self, task: CourseTask, outcome: SelectOutcome):
+        """根据选课结果更新队列状态并记录日志"""
+        course_id = task.course.course_id
+        if outcome.status == SelectStatus.CANCELLED:
+            # 已停止，请求没有发出
+            self.course_queue.update_task_status(course_id, "pending", attempt_increment=False)
+        elif outcome.ok:
+            self.course_queue.update_task_status(course_id, "success", attempt_increment=False, outcome=outcome)
+            self._log(f"✅ 抢课成功: {task.course.course_name}")
+        elif outcome.status == SelectStatus.TOKEN_EXPIRED:
+            self.course_queue.update_task_status(course_id, "pending", attempt_increment=False, outcome=outcome)
+            self._log(f"❌ {outcome}，请重新登录后再抢课")
+            self.stop_event.set()
+        elif outcome.should_stop:
+            self.course_queue.update_task_status(course_id, "failed", attempt_increment=False, outcome=outcome)
+            self._log(f"❌ 抢课失败: {task.course.course_name} - {outcome}，已移出待抢列表")
+        else:
+            self.course_queue.update_task_status(course_id, "pending", attempt_increment=False, outcome=outcome)
+            self._log(f"❌ 抢课失败: {task.course.course_name} - {outcome} ({outcome.latency:.3f}s)")
+    
+    def _log_result(self, course_ids: Iterable[int]):
+        """汇总本次抢课中各课程的最终结果"""
+        statuses = [task.status for task in map(self.course_queue.get_task, course_ids) if task is not None]
+        succeeded = statuses.count("success")
+        failed = statuses.count("failed")
+        if statuses and succeeded == len(statuses):
+            self._log(f"🎉 所有课程抢课成功！共 {succeeded} 门")
+        else:
+            self._log(f"抢课结束: 成功 {succeeded} 门，失败 {failed} 门")
+    
     def _log(self, message: str):
         """日志输出"""
         if self.log_callback:
@@ -382,15 +865,23 @@ class ScheduledCourseGrabber:
     
     def get_status(self) -> dict:
         """获取当前状态"""
-        pending_tasks = self.course_queue.get_pending_tasks()
-        all_tasks = self.course_queue.get_all_tasks()
+        counts = self.course_queue.count_by_status()
         
         return {
             'is_running': self.is_running,
             'scheduled_time': self.scheduled_time.isoformat() if self.scheduled_time else None,
-            'total_tasks': len(all_tasks),
-            'pending_tasks': len(pending_tasks),
-            'completed_tasks': len([t for t in all_tasks if t.status == "success"]),
-            'failed_tasks': len([t for t in all_tasks if t.status == "failed"]),
-            'grab_interval': self.grab_interval
+            'total_tasks': len(self.course_queue),
+            'pending_tasks': counts.get("pending", 0),
+            'completed_tasks': counts.get("success", 0),
+            'failed_tasks': counts.get("failed", 0),
+            'grab_interval': self.grab_interval,
+            'last_fire_error': self.timer.fire_error if self.timer else None,
+            'last_warmup': self.last_warmup,
+            'heartbeat': self.heartbeat.describe(),
+            'watch_mode': self.watch_mode,
+            'worker_mode': self.worker_mode,
+            'async_mode': self.async_mode,
+            'adaptive': self.adaptive,
+            'request_usage': rate_limiter.usage(),
+            'breakers': breakers.describe()
         }
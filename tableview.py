@@ -0,0 +1,136 @@
+"""
+按业务键增量维护 ttk.Treeview 的行
+
+每个键（如course_id）对应一个固定的item，更新时只修改值或标签发生变化的行；
+过滤时用 detach/move 隐藏和恢复行，不删除重建，行的选中状态也得以保留。
+"""
+
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+from tkinter import ttk
+
+
+Row = Tuple[Hashable, Sequence, Sequence]  # (键, 列值, 标签)
+
+
+class KeyedTreeview:
+    """键 -> 行 的增量视图"""
+    
+    def __init__(self, tree: ttk.Treeview):
+        self.tree = tree
+        self.items: Dict[Hashable, str] = {}  # 键 -> item_id
+        self.keys: Dict[str, Hashable] = {}  # item_id -> 键
+        self.rows: Dict[Hashable, Tuple[tuple, tuple]] = {}  # 键 -> 当前显示的 (列值, 标签)
+        self.order: List[Hashable] = []  # 所有行的默认顺序
+        self.visible: List[Hashable] = []  # 当前显示的行（按显示顺序）
+        self.shown_keys: Optional[List[Hashable]] = None  # 过滤结果，None表示显示全部
+    
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    def key_of(self, item_id: str) -> Optional[Hashable]:
+        """item_id 对应的键"""
+        return self.keys.get(item_id)
+    
+    def upsert(self, key: Hashable, values: Sequence, tags: Sequence = ()) -> bool:
+        """新增或更新一行，返回是否修改了界面"""
+        row = (tuple(values), tuple(tags))
+        item_id = self.items.get(key)
+        if item_id is None:
+            item_id = self.tree.insert("", "end", values=row[0], tags=row[1])
+            self.items[key] = item_id
+            self.keys[item_id] = key
+            self.rows[key] = row
+            self.order.append(key)
+            if self.shown_keys is None:
+                self.visible.append(key)
+            else:
+                self.tree.detach(item_id)
+            return True
+        
+        if self.rows[key] == row:
+            return False
+        old_values, old_tags = self.rows[key]
+        if old_values != row[0]:
+            self.tree.item(item_id, values=row[0])
+        if old_tags != row[1]:
+            self.tree.item(item_id, tags=row[1])
+        self.rows[key] = row
+        return True
+    
+    def remove(self, key: Hashable) -> bool:
+        """删除一行"""
+        item_id = self.items.pop(key, None)
+        if item_id is None:
+            return False
+        del self.keys[item_id]
+        del self.rows[key]
+        self.order.remove(key)
+        if key in self.visible:
+            self.visible.remove(key)
+        self.tree.delete(item_id)
+        return True
+    
+    def sync(self, rows: Iterable[Row]) -> int:
+        """使视图与给定的完整行列表一致：更新变化的行、插入新行、删除多余的行、按给定顺序排列
+        
+        返回修改的行数。
+        """
+        changed = 0
+        order = []
+        for key, values, tags in rows:
+            order.append(key)
+            if self.upsert(key, values, tags):
+                changed += 1
+        
+        wanted = set(order)
+        stale = [key for key in self.order if key not in wanted]
+        if stale:
+            stale_items = [self.items.pop(key) for key in stale]
+            for key, item_id in zip(stale, stale_items):
+                del self.keys[item_id]
+                del self.rows[key]
+            self.tree.delete(*stale_items)
+            changed += len(stale)
+        
+        if order != self.order:
+            self.order = order
+            self.visible = [key for key in self.visible if key in wanted]
+            self.show(self.shown_keys)
+        return changed
+    
+    def show(self, keys: Optional[Iterable[Hashable]] = None):
+        """只显示给定的行并按给定顺序排列；None表示按默认顺序显示全部"""
+        self.shown_keys = None if keys is None else [key for key in keys if key in self.items]
+        target = self.order if self.shown_keys is None else self.shown_keys
+        if target == self.visible:
+            return
+        
+        wanted = set(target)
+        hidden = [self.items[key] for key in self.visible if key not in wanted]
+        if hidden:
+            self.tree.detach(*hidden)
+        
+        # 仍显示的行保持相对顺序，只移动位置不对的行
+        kept = [key for key in self.visible if key in wanted]
+        moved = set()
+        j = 0
+        for index, key in enumerate(target):
+            while j < len(kept) and kept[j] in moved:
+                j += 1
+            if j < len(kept) and kept[j] == key:
+                j += 1
+                continue
+            self.tree.move(self.items[key], "", index)
+            moved.add(key)
+        self.visible = list(target)
+    
+    def clear(self):
+        """删除所有行"""
+        if self.items:
+            self.tree.delete(*self.items.values())
+        self.items.clear()
+        self.keys.clear()
+        self.rows.clear()
+        self.order = []
+        self.visible = []
+        self.shown_keys = None
@@ -144,6 +144,16 @@ def truncate_text(text: str, max_length: int = 50) -> str:
     return text[:max_length-3] + "..."
 
 
+def format_elapsed(seconds: float) -> str:
+    """经过的时间，如 5秒前、3分钟前、2小时前"""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds}秒前"
+    if seconds < 3600:
+        return f"{seconds // 60}分钟前"
+    return f"{seconds // 3600}小时前"
+
+
 def ensure_dir_exists(file_path: str):
     """确保目录存在"""
     dir_path = os.path.dirname(file_path)
@@ -0,0 +1,58 @@
+"""
+空位监控：轮询课程列表，只在出现空位时触发选课
+"""
+
+from typing import Dict, Iterable, List, Tuple
+from course import Course
+from config import Config
+
+
+class SeatWatcher:
+    """空位监控器
+    
+    通过课程列表接口一次性获取所有监控课程的已选/可选人数，
+    与上一次快照比较，只返回人数变化的课程和有空位的课程。
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self.snapshot: Dict[int, Tuple[int, int]] = {}  # course_id -> (selected, optional)
+        self.poll_count = 0
+    
+    def poll(self, course_ids: Iterable[int]) -> Tuple[List[Course], List[Course], List[int]]:
+        """拉取一次余量
+        
+        返回 (人数有变化的课程, 有空位的课程, 列表中找不到的课程ID)
+        """
+        watched = set(course_ids)
+        found: Dict[int, Course] = {}
+        
+        # 每页足够大时只需一次请求，找齐后不再翻页
+        for page in self.client.iter_course_pages(Config.WATCH_PAGE_SIZE):
+            for course in page:
+                if course.course_id in watched:
+                    found[course.course_id] = course
+            if len(found) == len(watched):
+                break
+        
+        self.poll_count += 1
+        changed = []
+        vacant = []
+        for course_id, course in found.items():
+            seats = (course.selected, course.optional)
+            if self.snapshot.get(course_id) != seats:
+                changed.append(course)
+                self.snapshot[course_id] = seats
+            if course.selected < course.optional:
+                vacant.append(course)
+        
+        missing = [course_id for course_id in watched if course_id not in found]
+        for course_id in missing:
+            self.snapshot.pop(course_id, None)
+        
+        return changed, vacant, missing
+    
+    def reset(self):
+        """清空快照"""
+        self.snapshot.clear()
+        self.poll_count = 0